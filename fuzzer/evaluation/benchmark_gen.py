@@ -0,0 +1,267 @@
+'''
+Micro-benchmarks of the generator: random(), mutate() and sql() of every SQLNode class
+(and a whole randomQueryGen group) under a fixed seed for each probability table.
+Reports ops/sec and allocations and saves/compares a baseline JSON.
+
+Run from the fuzzer folder:
+    python -m evaluation.benchmark_gen --save       # writes the baseline
+    python -m evaluation.benchmark_gen --compare    # exit code 1 on a regression
+'''
+import argparse
+import gc
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from typing import Callable, Optional
+import src.generator as gen
+from src.config import PROB_TABLE, PROB_TABLE2
+
+VARIANTS = {"default": None, "PROB_TABLE": PROB_TABLE, "PROB_TABLE2": PROB_TABLE2}
+BASELINE = "evaluation/benchmark_baseline.json"
+SEED = 0
+SAMPLES = 300
+REPEAT = 5 # best of, like timeit
+TOLERANCE = 0.25 # relative slowdown reported as regression, timings need a quiet machine
+MEMORY_TOLERANCE = 0.05 # allocations are deterministic for a seed
+METRICS = ["random", "mutate", "sql"] # ops/sec, higher is better
+MEMORY = ["bytes", "blocks"] # retained per node, lower is better
+
+Case = Callable[[gen.Table, list[gen.Table], Optional[dict]], gen.SQLNode]
+
+def col(table: gen.Table) -> gen.Column:
+    return gen.rng.choice(table.columns)
+
+CASES: dict[str, Case] = {
+    "Column":             lambda t, ts, p: gen.Column.random(param_prob=p),
+    "Table":              lambda t, ts, p: gen.Table.random(param_prob=p),
+    "Comparison":         lambda t, ts, p: gen.Comparison.random(col(t), param_prob=p, table_name=t.name),
+    "Between":            lambda t, ts, p: gen.Between.random(col(t), param_prob=p, table_name=t.name),
+    "Like":               lambda t, ts, p: gen.Like.random(col(t), param_prob=p, table_name=t.name),
+    "InList":             lambda t, ts, p: gen.InList.random(col(t), param_prob=p, table_name=t.name),
+    "NullCheck":          lambda t, ts, p: gen.NullCheck.random(col(t), param_prob=p, table_name=t.name),
+    "Exists":             lambda t, ts, p: gen.Exists.random(t, param_prob=p),
+    "Literal":            lambda t, ts, p: gen.Literal.random(param_prob=p),
+    "Time":               lambda t, ts, p: gen.Time.random(param_prob=p),
+    "ColumnExpression":   lambda t, ts, p: gen.ColumnExpression.random(t, param_prob=p),
+    "Case":               lambda t, ts, p: gen.Case.random(t, param_prob=p),
+    "Where":              lambda t, ts, p: gen.Where.random(t, max_depth=3, other_tables=ts, param_prob=p),
+    "InSubquery":         lambda t, ts, p: gen.InSubquery.random(t, ts, param_prob=p),
+    "AlterTable":         lambda t, ts, p: gen.AlterTable.random(t),
+    "Insert":             lambda t, ts, p: gen.Insert.random(t, param_prob=p),
+    "Update":             lambda t, ts, p: gen.Update.random(t, param_prob=p),
+    "Delete":             lambda t, ts, p: gen.Delete.random(t, param_prob=p),
+    "Replace":            lambda t, ts, p: gen.Replace.random(t, param_prob=p),
+    "Join":               lambda t, ts, p: gen.Join.random(t, gen.rng.choice(ts)),
+    "Select":             lambda t, ts, p: gen.Select.random(t, other_tables=ts, param_prob=p),
+    "With":               lambda t, ts, p: gen.With.random(t, param_prob=p),
+    "View":               lambda t, ts, p: gen.View.random(t, other_tables=ts, param_prob=p),
+    "VirtualTable":       lambda t, ts, p: gen.VirtualTable.random(),
+    "Index":              lambda t, ts, p: gen.Index.random(t, param_prob=p),
+    "Trigger":            lambda t, ts, p: gen.Trigger.random(t, param_prob=p),
+    "DropTable":          lambda t, ts, p: gen.DropTable.random(t, param_prob=p),
+    "Pragma":             lambda t, ts, p: gen.Pragma.random(),
+    "TransactionControl": lambda t, ts, p: gen.TransactionControl.random(param_prob=p),
+    "Optimization":       lambda t, ts, p: gen.Optimization.random(t),
+}
+
+def fixture(seed: int, prob: Optional[dict]) -> list[gen.Table]:
+    '''
+    Seeds the generator and returns the schema the nodes are built on
+    '''
+    random.seed(seed)
+    return [gen.Table.random(min_cols=2, param_prob=prob) for _ in range(8)]
+
+def build(case: Case, seed: int, prob: Optional[dict], samples: int) -> tuple[list[gen.SQLNode], int, float]:
+    '''
+    Calls random() samples times, returns the nodes, the number of failed calls and the time
+    '''
+    schema = fixture(seed, prob)
+    picks = [random.choice(schema) for _ in range(samples)]
+    nodes, errors = [], 0
+    start = time.perf_counter()
+    for table in picks:
+        try:
+            node = case(table, schema, prob)
+        except Exception:
+            errors += 1
+            continue
+        if node is not None:
+            nodes.append(node)
+    return nodes, errors, time.perf_counter() - start
+
+def rate(n: int, seconds: float) -> float:
+    return round(n / seconds, 1) if seconds > 0 and n else 0.0
+
+def mutate_all(nodes: list[gen.SQLNode], seed: int) -> tuple[int, int, float]:
+    '''
+    Mutates every node once, returns the number of mutants, the number of failed calls and the time
+    '''
+    random.seed(seed)
+    mutated, errors = 0, 0
+    start = time.perf_counter()
+    for node in nodes:
+        if not hasattr(node, "mutate"):
+            continue
+        try:
+            if node.mutate() is not None:
+                mutated += 1
+        except Exception:
+            errors += 1
+    return mutated, errors, time.perf_counter() - start
+
+def time_case(name: str, seed: int, prob: Optional[dict], samples: int) -> dict:
+    '''
+    One timed run of a class: ops/sec of random(), sql() (first render) and mutate()
+    '''
+    nodes, errors, t_random = build(CASES[name], seed, prob, samples)
+
+    start = time.perf_counter() # the cache of the new nodes is empty
+    for node in nodes:
+        node.sql()
+    t_sql = time.perf_counter() - start
+
+    mutated, mutate_errors, t_mutate = mutate_all(nodes, seed)
+    return {
+        "random": rate(samples, t_random),
+        "mutate": rate(mutated, t_mutate),
+        "sql": rate(len(nodes), t_sql),
+        "errors": errors + mutate_errors,
+    }
+
+def memory_case(name: str, seed: int, prob: Optional[dict], samples: int) -> dict:
+    '''
+    Bytes and blocks allocated by random() that stay alive with the node
+    '''
+    tracemalloc.start() # separate run, tracing slows the timed loops down
+    before = tracemalloc.take_snapshot()
+    nodes, _, _ = build(CASES[name], seed, prob, samples)
+    stats = tracemalloc.take_snapshot().compare_to(before, "filename")
+    tracemalloc.stop()
+    n = max(len(nodes), 1)
+    return {
+        "bytes": round(sum(s.size_diff for s in stats) / n, 1),
+        "blocks": round(sum(s.count_diff for s in stats) / n, 2),
+    }
+
+def time_group(seed: int, prob: Optional[dict], samples: int) -> dict:
+    '''
+    randomQueryGen groups (cycle=3), one per 10 samples
+    '''
+    groups = max(samples // 10, 1)
+    random.seed(seed)
+    start = time.perf_counter()
+    for _ in range(groups):
+        gen.randomQueryGen(param_prob=prob, cycle=3)
+    return {"random": rate(groups, time.perf_counter() - start), "mutate": 0.0, "sql": 0.0, "errors": 0}
+
+def memory_group(seed: int, prob: Optional[dict], samples: int) -> dict:
+    '''
+    Peak of the traced memory while generating the groups
+    '''
+    random.seed(seed)
+    tracemalloc.start()
+    for _ in range(max(samples // 10, 1)):
+        gen.randomQueryGen(param_prob=prob, cycle=3)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"bytes": float(peak), "blocks": 0.0}
+
+def run(variants: list[str], classes: list[str], seed: int = SEED, samples: int = SAMPLES, repeat: int = REPEAT) -> dict:
+    '''
+    The repeats go round robin over all cases, so a slow phase of the machine hits one run
+    of many cases instead of all runs of one case. The fastest run of a case counts.
+    '''
+    cases = [(variant, name) for variant in variants for name in classes + ["QueryGroup"]]
+    best: dict[tuple[str, str], dict] = {}
+    for _ in range(repeat):
+        for variant, name in cases:
+            gc.collect()
+            gc.disable() # like timeit, collections would land in random places
+            if name == "QueryGroup":
+                r = time_group(seed, VARIANTS[variant], samples)
+            else:
+                r = time_case(name, seed, VARIANTS[variant], samples)
+            gc.enable()
+            if (variant, name) in best:
+                r.update({m: max(r[m], best[variant, name][m]) for m in METRICS})
+            best[variant, name] = r
+
+    results = {variant: {} for variant in variants}
+    for variant, name in cases:
+        if name == "QueryGroup":
+            memory = memory_group(seed, VARIANTS[variant], samples)
+        else:
+            memory = memory_case(name, seed, VARIANTS[variant], samples)
+        results[variant][name] = {**best[variant, name], **memory}
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "seed": seed,
+        "samples": samples,
+        "results": results,
+    }
+
+def report(run_results: dict):
+    for variant, rows in run_results["results"].items():
+        print(f"\n{variant} (seed {run_results['seed']}, {run_results['samples']} samples)")
+        print(f"{'class':<20}{'random/s':>12}{'mutate/s':>12}{'sql/s':>12}{'B/node':>10}{'blocks':>9}{'errors':>8}")
+        for name, r in rows.items():
+            print(f"{name:<20}{r['random']:>12.0f}{r['mutate']:>12.0f}{r['sql']:>12.0f}{r['bytes']:>10.0f}{r['blocks']:>9.1f}{r['errors']:>8}")
+
+def compare(current: dict, baseline: dict, tolerance: float = TOLERANCE, memory_tolerance: float = MEMORY_TOLERANCE) -> list[str]:
+    '''
+    Regressions of current against baseline: ops/sec below (1 - tolerance) x baseline,
+    memory above (1 + memory_tolerance) x baseline
+    '''
+    regressions = []
+    for variant, rows in current["results"].items():
+        for name, r in rows.items():
+            base = baseline["results"].get(variant, {}).get(name)
+            if base is None:
+                continue
+            for metric in METRICS:
+                if base[metric] and r[metric] < base[metric] * (1 - tolerance):
+                    regressions.append(f"{variant}/{name} {metric}: {base[metric]:.0f} -> {r[metric]:.0f} ops/s")
+            for metric in MEMORY:
+                if base[metric] > 0 and r[metric] > base[metric] * (1 + memory_tolerance):
+                    regressions.append(f"{variant}/{name} {metric}: {base[metric]:.0f} -> {r[metric]:.0f}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Generator micro-benchmarks")
+    parser.add_argument("--variant", help="Probability table, all by default", choices=list(VARIANTS), action="append")
+    parser.add_argument("--cls", help="SQLNode class, all by default", choices=list(CASES), action="append")
+    parser.add_argument("--samples", help="Nodes per class", default=SAMPLES, type=int)
+    parser.add_argument("--repeat", help="Runs per class, the fastest counts", default=REPEAT, type=int)
+    parser.add_argument("--seed", default=SEED, type=int)
+    parser.add_argument("--save", help="Write the results as baseline", nargs="?", const=BASELINE)
+    parser.add_argument("--compare", help="Compare with a baseline, exit code 1 on a regression", nargs="?", const=BASELINE)
+    parser.add_argument("--tolerance", help="Allowed relative slowdown", default=TOLERANCE, type=float)
+    parser.add_argument("--memory-tolerance", help="Allowed relative growth of the allocations", default=MEMORY_TOLERANCE, type=float)
+    args = parser.parse_args()
+
+    results = run(args.variant or list(VARIANTS), args.cls or list(CASES), args.seed, args.samples, args.repeat)
+    report(results)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nBaseline written to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if (baseline["seed"], baseline["samples"]) != (results["seed"], results["samples"]):
+            print("\nWarning: baseline was taken with another seed/sample count")
+        regressions = compare(results, baseline, args.tolerance, args.memory_tolerance)
+        print(f"\n{len(regressions)} regression(s) against {args.compare}")
+        for line in regressions:
+            print("  " + line)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
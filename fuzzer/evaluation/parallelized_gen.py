@@ -1,31 +1,52 @@
 import os
-import sys
 import time
 import glob
-import shutil
 import multiprocessing
+import numpy as np
 import src.generator as gen
+from src.helper.random_stream import RandomStream, GROUP_BLOCK, group_seed
+from src.helper.query_store import ChunkWriter, chunk_files, merge_chunks, index_path
 
-def worker(prob, stop_event, worker_id, output_dir):
-    text_path = os.path.join(output_dir, f"worker_{worker_id}.txt")
+CYCLE = 3
+
+def worker(prob, stop_event, worker_id, output_dir, seed, save_queries=True):
     count_path = os.path.join(output_dir, f"worker_{worker_id}.count")
     count = 0
 
-    with open(text_path, "w", encoding="utf-8") as f:
-        while not stop_event.is_set():
-            query, _ = gen.randomQueryGen(prob, cycle=3)
-            f.write(" ".join(query) + "\n")
-            count += 1
+    # compressed chunks with the hash of every group, merged and deduplicated at the end
+    writer = ChunkWriter(os.path.join(output_dir, f"worker_{worker_id}")) if save_queries else None
+    while not stop_event.is_set():
+        # every group has its own substream, gen.regenerate(seed, worker_id, count) gives it back
+        stream = RandomStream(group_seed(seed, worker_id, count), block=GROUP_BLOCK)
+        statements = gen.iterQueryGen(param_prob=prob, cycle=CYCLE, stream=stream)
+        if writer:
+            writer.write(" ".join(statements))
+        else:
+            for _ in statements:
+                pass
+        count += 1
+    if writer:
+        writer.close()
 
     with open(count_path, "w") as c:
         c.write(str(count))
 
-def parallelized_query_gen(param_prob, duration_seconds, num_workers, output_dir="temp_output"):
+def parallelized_query_gen(param_prob, duration_seconds, num_workers, output_dir="temp_output", seed=None, save_queries=True):
+    '''
+    seed: campaign seed, a fresh one is drawn and logged if None
+    save_queries: False keeps only the seed and the group counts in the log, the groups are
+    regenerated on demand with gen.regenerate(seed, worker, index, param_prob, CYCLE)
+
+    The unique groups are saved to all_queries.txt.gz (one group per line, zcat gives the old
+    all_queries.txt) with an index for random access, see helper.query_store.QueryStore.
+    '''
     os.makedirs(output_dir, exist_ok=True)
     stop_event = multiprocessing.Event()
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
 
     workers = [
-        multiprocessing.Process(target=worker, args=(param_prob, stop_event, i, output_dir))
+        multiprocessing.Process(target=worker, args=(param_prob, stop_event, i, output_dir, seed, save_queries))
         for i in range(num_workers)
     ]
 
@@ -39,10 +60,11 @@ def parallelized_query_gen(param_prob, duration_seconds, num_workers, output_dir
         w.join()
 
 
-    with open("all_queries.txt", "w", encoding="utf-8") as outfile:
-        for file in sorted(glob.glob(os.path.join(output_dir, "worker_*.txt"))):
-            with open(file, "r", encoding="utf-8") as infile:
-                shutil.copyfileobj(infile, outfile)
+    unique = duplicates = 0
+    if save_queries:
+        merge_start = time.time()
+        unique, duplicates = merge_chunks(chunk_files(output_dir), "all_queries.txt.gz")
+        merge_time = time.time() - merge_start
 
     total = 0
     worker_counts = []
@@ -61,14 +83,20 @@ def parallelized_query_gen(param_prob, duration_seconds, num_workers, output_dir
         log.write(f"Duration (seconds): {duration_seconds:.2f}\n")
         log.write(f"Number of workers: {num_workers}\n")
         log.write(f"Total query groups: {total}\n")
-        log.write(f"Throughput: {queries_per_minute:.2f} groups/minute\n\n")
+        log.write(f"Throughput: {queries_per_minute:.2f} groups/minute\n")
+        log.write(f"Seed: {seed}\n")
+        log.write(f"Cycle: {CYCLE}\n")
+        if save_queries:
+            size = os.path.getsize("all_queries.txt.gz") + os.path.getsize(index_path("all_queries.txt.gz"))
+            log.write(f"Unique query groups: {unique} ({duplicates} duplicates dropped)\n")
+            log.write(f"Output size: {size / 1e6:.2f} MB compressed\n")
+            log.write(f"Merge time (seconds): {merge_time:.2f}\n")
+        log.write("\n")
         log.write("Worker breakdown:\n")
         for worker_id, count in worker_counts:
             log.write(f"  Worker {worker_id}: {count} query groups\n")
     
-    for file in glob.glob(os.path.join(output_dir, "worker_*.txt")):
-        os.remove(file)
-    for file in glob.glob(os.path.join(output_dir, "worker_*.count")):
+    for file in glob.glob(os.path.join(output_dir, "worker_*")):
         os.remove(file)
     os.rmdir(output_dir)
 
@@ -77,9 +105,8 @@ def estimate_average_size(param_prob=None, num_samples=10000):
     start = time.time()
 
     for _ in range(num_samples):
-        result = gen.randomQueryGen(param_prob)
-        result_bytes = sys.getsizeof(result.encode('utf-8'))
-        total_bytes += result_bytes
+        query, _ = gen.randomQueryGen(param_prob=param_prob)
+        total_bytes += len(" ".join(query).encode('utf-8')) # one line of all_queries.txt
 
     avg_size = total_bytes / num_samples
     stop = time.time()
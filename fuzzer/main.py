@@ -10,7 +10,9 @@ def generate_dir():
         "data/test/stats",
         "data/test/bugs",
         "data/test/errors",
-        "data/db"
+        "data/test/checkpoints",
+        "data/db",
+        "data/workspaces"
     ]
 
     for dir in dirs:
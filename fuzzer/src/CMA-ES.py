@@ -1,7 +1,11 @@
 import cma
-import random, argparse
+import multiprocessing as mp
+import random, argparse, os, shutil, tempfile, time
+from . import test
 from .fuzzing import random_query
-from .config import PROB_TABLE, SEED, STATS_FOLDER
+from .config import PROB_TABLE, PROB_TABLE2, SEED, STATS_FOLDER, WORKSPACE_FOLDER, CMA_STORE
+from .helper.random_stream import group_seed, python_seed
+from .helper.eval_store import EvalStore
 
 random.seed(SEED)
 
@@ -13,55 +17,127 @@ def dict_to_vector(prob_dict):
 def vector_to_dict(prob_vector):
     return {key: float(prob_vector[i]) for i, key in enumerate(PROB_KEYS)}
 
-def fuzz_optimize(prob: dict, popsize: int = 4, num_iterations: int = 6):
+def _init_worker(root: str):
+    # own database and coverage counters, so that the candidates can run at the same time
+    test.set_workspace(os.path.join(root, f"worker_{os.getpid()}"))
+
+def _evaluate(task: tuple[dict, int]) -> tuple[float, tuple, float]:
+    # the query is not sent back, _replay regenerates the best one from its seed
+    prob_dict, seed = task
+    random.seed(seed)
+    start = time.time()
+    cov, c, query, tables = random_query(repeat=10, save=False, param_prob=prob_dict)
+    return cov, c, time.time() - start
+
+def _replay(task: tuple[dict, int]) -> tuple[tuple, list[str]]:
+    prob_dict, seed = task
+    random.seed(seed)
+    cov, c, query, tables = random_query(repeat=10, save=False, param_prob=prob_dict)
+    return c, query
+
+def warm_start(start: str, prob: dict, store: EvalStore = None) -> dict:
+    '''
+    Initial mean of the search: prob, the tuned PROB_TABLE2, or the best table in the store
+    '''
+    if start == "table2":
+        return {**prob, **{k: v for k, v in PROB_TABLE2.items() if k in prob}} # PROB_TABLE2 lacks newer keys
+    if start == "store" and store is not None:
+        best = store.best(1)
+        if best:
+            return {**prob, **best[0][1]}
+    return prob
+
+def fuzz_optimize(prob: dict, popsize: int = 4, num_iterations: int = 6, workers: int = None, repeats: int = 1,
+                  store: EvalStore = None, start: str = "none"):
     """
-    CMA-ES evolution to tweak the probability values 
+    CMA-ES evolution to tweak the probability values
+    workers: processes that evaluate the population members at the same time (default: popsize)
+    repeats: evaluations per member with different seeds, its reward is the mean coverage
+    store: evaluations of earlier runs, members that (nearly) equal a stored table only run the missing repeats
+    start: none (prob), table2 (PROB_TABLE2) or store (best stored tables, injected into the first population)
     """
-    init_vector = dict_to_vector(prob)
+    init_vector = dict_to_vector(warm_start(start, prob, store))
     es = cma.CMAEvolutionStrategy(init_vector, 0.3, {'bounds': [0.0, 1.0], 'popsize': popsize})
+    if start == "store" and store is not None:
+        # the runner-ups are tried as they are, es.tell gets their coverage from the store
+        es.inject([dict_to_vector(p) for _, p in store.best(popsize // 2)[1:]], force=True)
 
     best_cov = -1
     best_query = ""
     best_params = None
-    cov = 0
+    best_run = None # (probabilities, seed) of the run with the highest coverage of the best member
     c = (0, 0, 0, 0)
-
-    for i in range(num_iterations):
-        solutions = es.ask()
-        rewards = []
-
-        for j, sol in enumerate(solutions):
-            prob_dict = vector_to_dict(sol)
-
-            print(f"CMA-ES: {i+1:<2}/{num_iterations:<2} it {j+1:<2}/{popsize:<2} pop, Coverage: {cov:<5.2f}, Best: {best_cov:<5.2f}")
-            
-            cov, c, query, tables = random_query(repeat=10, save=False, param_prob = prob_dict)
-            rewards.append(-cov) 
-
-            if cov > best_cov:
-                best_cov = cov
-                best_query = query
-                best_params = sol
-                c = c
-
-        es.tell(solutions, rewards)
-        #es.disp()
+    reused = evaluated = 0
+
+    test.native_gcov() # parse the .gcno once before forking
+    os.makedirs(WORKSPACE_FOLDER, exist_ok=True)
+    root = tempfile.mkdtemp(prefix="cma_", dir=WORKSPACE_FOLDER)
+    try:
+        with mp.get_context("fork").Pool(workers or popsize, initializer=_init_worker, initargs=(root,)) as pool:
+            for i in range(num_iterations):
+                solutions = es.ask()
+                members = [vector_to_dict(sol) for sol in solutions]
+                stored = [store.get(member)[:repeats] if store is not None else [] for member in members]
+                # seeds depend on (iteration, member, repeat) only, not on the worker that runs them
+                pending = [[(member, python_seed(group_seed(SEED, i, j * repeats + r))) for r in range(len(stored[j]), repeats)]
+                           for j, member in enumerate(members)]
+                results = iter(pool.map(_evaluate, [task for tasks in pending for task in tasks]))
+                reused += sum(len(runs) for runs in stored)
+                evaluated += sum(len(tasks) for tasks in pending)
+
+                rewards = []
+                for j, (sol, member) in enumerate(zip(solutions, members)):
+                    runs = [next(results) for _ in pending[j]]
+                    if store is not None:
+                        for (cov, _, runtime), (_, seed) in zip(runs, pending[j]):
+                            store.add(member, cov, runtime, seed)
+                    covs = [(e.coverage, e.seed, e.prob) for e in stored[j]] + [(run[0], seed, member) for run, (_, seed) in zip(runs, pending[j])]
+                    cov = sum(run[0] for run in covs) / repeats
+                    rewards.append(-cov)
+
+                    if cov > best_cov:
+                        best_cov = cov
+                        best_params = sol
+                        _, seed, run_prob = max(covs, key=lambda run: run[0])
+                        best_run = (run_prob, seed)
+
+                print(f"CMA-ES: {i+1:<2}/{num_iterations:<2} it, Coverage: {-min(rewards):<5.2f}, Best: {best_cov:<5.2f}")
+                es.tell(solutions, rewards)
+                #es.disp()
+            if best_run is not None:
+                c, best_query = pool.apply(_replay, (best_run,))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
 
     with open(F"{STATS_FOLDER}CMA-ES_{popsize}_{num_iterations}.txt", "w") as f:
         f.write("\n=== BEST RESULT ===")
         f.write(f"Best Coverage: {best_cov}, {c}\n")
         f.write(f"Best Query: {best_query}\n")
-        f.write(f"Best Probs: {vector_to_dict(best_params)}")
+        f.write(f"Best Probs: {vector_to_dict(best_params)}\n")
+        f.write(f"Evaluations: {evaluated} run, {reused} from the store\n")
 
 def main():
     parser = argparse.ArgumentParser(description="CMA-ES Fuzzing Optimizer")
     parser.add_argument("popsize", help="CMA-ES population size")
     parser.add_argument("iter", help="CMA-ES iterations")
+    parser.add_argument("--workers", help="Parallel evaluation processes (default: popsize)", default=None, type=int)
+    parser.add_argument("--repeats", help="Evaluations per population member, averaged against noise", default=1, type=int)
+    parser.add_argument("--store", help=f"Evaluation store, results are reused across runs (default: {CMA_STORE})", default=CMA_STORE)
+    parser.add_argument("--no-store", help="Evaluate every member, do not read or write the store", action="store_true")
+    parser.add_argument("--warm-start", help="Initial probabilities: 0.5 (none), PROB_TABLE2 (table2) or the best stored tables (store)",
+                        choices=["none", "table2", "store"], default="none")
 
     args = parser.parse_args()
 
     prob = {k: 0.5 for k in PROB_TABLE}
-    fuzz_optimize(prob, popsize=int(args.popsize), num_iterations=int(args.iter))
+    # coverage is only comparable between runs of the same backend and query length
+    store = None if args.no_store else EvalStore(args.store, PROB_KEYS, f"{test.BACKEND}:repeat=10")
+    if store is not None and store.loaded:
+        print(f"CMA-ES: {store.loaded} stored evaluations in {args.store}")
+    fuzz_optimize(prob, popsize=int(args.popsize), num_iterations=int(args.iter), workers=args.workers, repeats=args.repeats,
+                  store=store, start=args.warm_start)
+    if store is not None:
+        store.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,123 @@
+import os, pickle, time
+from dataclasses import fields
+from .corpus import Corpus, CorpusEntry
+
+INTERVAL = 600 # seconds between two checkpoints of a run
+
+ENTRY_STATS = [f.name for f in fields(CorpusEntry) if f.name != "node"]
+
+class Checkpoint:
+    """
+    Checkpoints of one run_pipeline run in a folder, taken at the end of a loop:
+      log.pkl   append-only, per checkpoint one record with the statements added to the
+                query and the corpus nodes added since the checkpoint before
+      state.pkl everything else (coverage, schema, bitmap, test.db, coverage counters,
+                random state, corpus statistics, ...), replaced atomically
+    state.pkl holds the length of the log it belongs to, a record written by a checkpoint
+    that did not finish is cut off on load.
+    """
+    def __init__(self, path: str, interval: float = INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.last = time.time()
+        self.query_len = 0 # statements already in the log
+        self.seq = 0 # corpus entries already in the log
+        self.saves = 0
+        os.makedirs(path, exist_ok=True)
+
+    @property
+    def log_path(self) -> str:
+        return os.path.join(self.path, "log.pkl")
+
+    @property
+    def state_path(self) -> str:
+        return os.path.join(self.path, "state.pkl")
+
+    def exists(self) -> bool:
+        return os.path.exists(self.state_path)
+
+    def settings(self) -> dict:
+        '''
+        Arguments the run was started with (repeat, backend, prefilter), None without a checkpoint
+        '''
+        if not self.exists():
+            return None
+        with open(self.state_path, "rb") as f:
+            return pickle.load(f).get("settings")
+
+    def due(self) -> bool:
+        return time.time() - self.last >= self.interval
+
+    def save(self, state: dict, query: list[str], corpus: Corpus):
+        '''
+        state: picklable values of the run, restored as they are by load()
+        '''
+        record = {"query": query[self.query_len:], "nodes": [(e.seq, e.node) for e in corpus.entries if e.seq >= self.seq]}
+        with open(self.log_path, "ab") as f:
+            pickle.dump(record, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+            log_size = f.tell()
+
+        state = {**state,
+                 "log_size": log_size,
+                 "query_len": len(query),
+                 "corpus": {"budget": corpus.budget, "size": corpus.size, "added": corpus.added, "evicted": corpus.evicted,
+                            "clock": corpus.clock, "total_cost": corpus.total_cost, "total_runs": corpus.total_runs,
+                            "entries": [tuple(getattr(e, name) for name in ENTRY_STATS) for e in corpus.entries]}}
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.state_path)
+
+        self.query_len = len(query)
+        self.seq = corpus.added
+        self.last = time.time()
+        self.saves += 1
+
+    def load(self) -> tuple[dict, list[str], Corpus]:
+        '''
+        Returns the state, the query and the corpus of the last checkpoint
+        '''
+        with open(self.state_path, "rb") as f:
+            state = pickle.load(f)
+        with open(self.log_path, "r+b") as f:
+            f.truncate(state["log_size"])
+
+        query, nodes = [], {}
+        with open(self.log_path, "rb") as f:
+            while f.tell() < state["log_size"]:
+                record = pickle.load(f)
+                query.extend(record["query"])
+                nodes.update(record["nodes"])
+
+        stats = state.pop("corpus")
+        corpus = Corpus(budget=stats.pop("budget"))
+        for values in stats.pop("entries"):
+            entry = dict(zip(ENTRY_STATS, values))
+            corpus.entries.append(CorpusEntry(nodes[entry["seq"]], **entry))
+        for name, value in stats.items():
+            setattr(corpus, name, value)
+        corpus.update_energy()
+
+        self.query_len = state["query_len"]
+        self.seq = corpus.added
+        return state, query[:self.query_len], corpus
+
+def save_files(paths: list[str]) -> dict[str, bytes]:
+    '''
+    Content of the files that exist, e.g. test.db and the coverage counters
+    '''
+    files = {}
+    for path in paths:
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                files[path] = f.read()
+    return files
+
+def restore_files(files: dict[str, bytes]):
+    for path, content in files.items():
+        with open(path, "wb") as f:
+            f.write(content)
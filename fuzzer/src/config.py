@@ -4,7 +4,14 @@ QUERY_FOLDER = TEST_FOLDER + "queries/" # save queries from fuzzer
 STATS_FOLDER = TEST_FOLDER + "stats/" # fuzzing results statistics
 BUGS_FOLDER = TEST_FOLDER + "bugs/" # bugs results
 ERROR_FOLDER = TEST_FOLDER + "errors/"
+WORKSPACE_FOLDER = "data/workspaces/" # working directories of parallel workers
+CHECKPOINT_FOLDER = TEST_FOLDER + "checkpoints/" # checkpoints of running PIPELINE campaigns
+CMA_STORE = TEST_FOLDER + "cma_evaluations.jsonl" # coverage of the probability tables evaluated by CMA-ES
 SQLITE_VERSIONS = ["sqlite3-3.26.0", "sqlite3-3.39.4"]
+SQLITE_DIR = "/home/test/sqlite" # instrumented sqlite3 build with gcov files
+SQLITE_BIN = "./sqlite3" # instrumented binary, relative to SQLITE_DIR
+GCNO_FILE = "sqlite3-sqlite3.gcno" # gcov graph of the amalgamation, relative to SQLITE_DIR
+GCDA_FILE = "sqlite3-sqlite3.gcda" # gcov counters written by the instrumented binary
 
 # databases used to test queries
 DB = "data/db/test.db"
@@ -193,7 +200,7 @@ SQL_KEYWORDS = [
     "VIRTUAL", "VIEW", "BETWEEN", "AS", "IN", "LIKE", "AND", "OR",
     "MATCH", "EXISTS", "EXPLAIN", "BEGIN", "END", "COMMIT", "ROLLBACK",
     "IS", "NOT", "NULL", "CASE", "WHEN", "THEN", "ELSE", "RENAME", "COLUMN",
-    "VALUES", "TO", "INSERT", "INTO", "UPDATE", "DELETE", "DEFAULT", "SET"
+    "VALUES", "TO", "INSERT", "INTO", "UPDATE", "DELETE", "DEFAULT", "SET",
     "REPLACE", "WITH", "USING", "INDEX", "ON", "UNIQUE", "TRIGGER",
     "BEFORE", "AFTER", "TEMP", "IF", "FOR", "EACH", "ROW", "PRAGMA", "",
     "PRIMARY", "KEY", "INTEGER", "TEXT", "REAL", "CHECK"
@@ -0,0 +1,165 @@
+import random
+import numpy as np
+from dataclasses import dataclass, field
+from . import generator as gen
+
+BUDGET = 1 << 22 # bytes kept in the corpus, an entry is approximated by the length of its SQL and its new-bit positions
+EVICT_TO = 0.9 # an eviction frees the budget down to this fraction
+FRESH = 200 # candidate runs during which a new entry gets a bonus
+COST_RANGE = (0.1, 3) # bounds of the speed factor (average cost / cost of the entry)
+REFRESH = 1000 # candidate runs between two recomputations of all energies with the new average cost
+
+@dataclass(eq=False)
+class CorpusEntry:
+    node: gen.SQLNode
+    seq: int # position in the order of addition
+    added: int # candidate runs of the corpus when added
+    size: int
+    chosen: int = 0 # times picked as mutation base
+    gained: int = 0 # new bits found by the entry and its mutants
+    cost: float = 0 # run time of the entry and its mutants, SQL length in reproducible runs
+    runs: int = 0 # number of runs in cost
+    energy: float = field(default=0, repr=False)
+    bits: np.ndarray = field(default=None, repr=False) # positions of the new bits of the candidate that brought it in
+    pos: int = field(default=0, repr=False) # index in Corpus.entries and Corpus.weights
+
+class Corpus:
+    """
+    Mutation bases of a pipeline run with their statistics. A base is drawn with
+    probability proportional to its energy (AFL-style power schedule): cheap entries and
+    entries whose mutants covered new bits get more, entries that were picked often without
+    paying off get less, and new entries get a bonus for a while. When the SQL of all
+    entries exceeds the budget, the entries with the lowest energy are evicted.
+    The cost is what the caller measures: run_pipeline passes the run time, or the SQL
+    length of the candidate in seeded runs so that the draws do not depend on timing.
+
+    The energies are kept in a numpy array. An entry's energy is updated when it is
+    added, picked, credited or its bonus runs out, all of them every REFRESH runs when
+    the average cost has moved, so a draw does not go over the entries in Python.
+    Keeps the list interface the pipeline used (append, extend, len, iteration over nodes).
+    """
+    def __init__(self, nodes: list[gen.SQLNode] = None, budget: int = BUDGET):
+        self.budget = budget
+        self.entries: list[CorpusEntry] = []
+        self.weights = np.zeros(64) # energy of entries[i] at i, doubled when full
+        self.size = 0
+        self.added = 0 # entries added so far, evicted ones included
+        self.evicted = 0
+        self.clock = 0 # candidate runs credited so far
+        self.total_cost = 0
+        self.total_runs = 0
+        self.avg_cost = 0 # of the last refresh
+        self.stale = 0 # entries before it lost their fresh bonus
+        self.extend(nodes or [])
+
+    def add(self, node: gen.SQLNode, gained: int = 0, cost: float = None, bits: np.ndarray = None) -> CorpusEntry:
+        '''
+        gained, cost, bits: new bits, run time and new bit positions of the candidate that brought the node in
+        '''
+        size = len(node.sql()) + (bits.nbytes if bits is not None else 0)
+        entry = CorpusEntry(node, self.added, self.clock, size, bits=bits, pos=len(self.entries))
+        if cost is not None:
+            entry.gained, entry.cost, entry.runs = gained, cost, 1
+        self.entries.append(entry)
+        if len(self.entries) > len(self.weights):
+            self.weights = np.concatenate([self.weights, np.zeros_like(self.weights)])
+        self._update(entry)
+        self.size += entry.size
+        self.added += 1
+        if self.size > self.budget:
+            self.evict()
+        return entry
+
+    def append(self, node: gen.SQLNode):
+        self.add(node)
+
+    def extend(self, nodes: list[gen.SQLNode]):
+        for node in nodes:
+            self.add(node)
+
+    def since(self, seq: int) -> list[CorpusEntry]:
+        '''
+        Entries added after the first seq ones that are still in the corpus
+        '''
+        return [e for e in self.entries if e.seq >= seq]
+
+    def energy(self, e: CorpusEntry) -> float:
+        low, high = COST_RANGE
+        speed = min(max(self.avg_cost * e.runs / e.cost, low), high) if e.cost > 0 and self.avg_cost > 0 else 1
+        payoff = (1 + e.gained) / (1 + e.chosen)
+        fresh = 2 if self.clock - e.added < FRESH else 1
+        return speed * payoff * fresh
+
+    def _update(self, e: CorpusEntry):
+        if e.pos < len(self.entries) and self.entries[e.pos] is e: # not evicted
+            e.energy = self.weights[e.pos] = self.energy(e)
+
+    def update_energy(self):
+        '''
+        Recomputes all energies with the current average cost
+        '''
+        self.avg_cost = self.total_cost / self.total_runs if self.total_runs else 0
+        if len(self.weights) < len(self.entries):
+            self.weights = np.zeros(2 * len(self.entries))
+        for i, e in enumerate(self.entries):
+            e.pos = i
+            e.energy = self.weights[i] = self.energy(e)
+        self.stale = 0
+        self._expire()
+
+    def _expire(self):
+        # entries are in the order they were added, so the ones whose bonus ran out are a prefix
+        while self.stale < len(self.entries) and self.clock - self.entries[self.stale].added >= FRESH:
+            self._update(self.entries[self.stale])
+            self.stale += 1
+
+    def choose(self) -> CorpusEntry:
+        '''
+        Draws a base by energy, the caller counts it with picked() once the mutant is used
+        '''
+        if not self.entries:
+            return None
+        cumulative = np.cumsum(self.weights[:len(self.entries)])
+        idx = int(np.searchsorted(cumulative, random.random() * cumulative[-1], side="right"))
+        return self.entries[min(idx, len(self.entries) - 1)]
+
+    def picked(self, entry: CorpusEntry):
+        entry.chosen += 1
+        self._update(entry)
+
+    def credit(self, entry: CorpusEntry, gained: int, cost: float):
+        '''
+        Records a candidate run, entry: its mutation base or None
+        '''
+        self.clock += 1
+        self.total_cost += cost
+        self.total_runs += 1
+        if entry is not None:
+            entry.gained += gained
+            entry.cost += cost
+            entry.runs += 1
+            self._update(entry)
+        if self.clock % REFRESH == 1: # from the first run on
+            self.update_energy()
+        else:
+            self._expire()
+
+    def evict(self):
+        self.update_energy()
+        ranked = sorted(self.entries, key=lambda e: e.energy)
+        target = self.budget * EVICT_TO
+        drop = set()
+        for e in ranked:
+            if self.size <= target or len(drop) == len(ranked) - 1:
+                break
+            drop.add(e.seq)
+            self.size -= e.size
+        self.entries = [e for e in self.entries if e.seq not in drop]
+        self.evicted += len(drop)
+        self.update_energy() # new positions
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __iter__(self):
+        return (e.node for e in self.entries)
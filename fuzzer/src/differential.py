@@ -0,0 +1,103 @@
+import os
+from .config import SQLITE_VERSIONS, DB
+from .session import SQLiteSession, StatementResult
+from .helper.results import ResultSink
+
+def version_db(i: int) -> str:
+    '''
+    Database of the i-th version: data/db/test1.db, data/db/test2.db, ...
+    '''
+    return os.path.join(os.path.dirname(DB), f"test{i + 1}.db")
+
+class DifferentialRunner:
+    """
+    One live sqlite3 shell per version. Every statement is sent to all versions before
+    any output is read, so the versions execute it at the same time, and the outputs
+    are compared as soon as they are in. Every output goes to a buffered ResultSink and
+    the diff log stays open for the whole run.
+    """
+    def __init__(self, versions: list[str] = SQLITE_VERSIONS, dbs: list[str] = None, timeout: float = 10,
+                 bin_dir: str = "/usr/bin"):
+        self.versions = versions
+        self.dbs = dbs or [version_db(i) for i in range(len(versions))]
+        self.timeout = timeout
+        self.sessions = [SQLiteSession(os.path.join(bin_dir, v), db) for v, db in zip(versions, self.dbs)]
+        self.sink = None
+        self.name = ""
+        self.index = 0
+        self.diff = None
+        self.diff_path = None
+        self.errors = [0] * len(versions)
+        self.bugs = 0
+
+    def open_logs(self, results_path: str, diff_path: str, name: str = ""):
+        self.sink = ResultSink(results_path)
+        self.name = name
+        self.diff_path = diff_path # opened on the first difference
+
+    def execute(self, query: str) -> list[StatementResult]:
+        pending = [session.send(query) for session in self.sessions]
+        return [session.receive(p, self.timeout) for session, p in zip(self.sessions, pending)]
+
+    def check(self, query: str) -> int:
+        '''
+        Runs a statement on all versions, logs the outputs and returns the number of differences
+        '''
+        results = self.execute(query)
+        outputs = []
+        for i, r in enumerate(results):
+            out, err = r.stdout.strip(), r.stderr.strip()
+            if err: # like a failing `sqlite3 db "<stmt>"`, partial output is not compared
+                self.errors[i] += 1
+                out = ""
+            outputs.append((out, err))
+            if self.sink:
+                self.sink.add(self.name, self.index, query, self.versions[i], r.stdout, r.stderr, r.returncode, r.duration)
+        self.index += 1
+
+        bugs = 0
+        for i in range(len(outputs)):
+            for j in range(i + 1, len(outputs)):
+                (out1, err1), (out2, err2) = outputs[i], outputs[j]
+                if not err1 and not err2 and out1 != out2:
+                    self._log_diff(query, i, out1, j, out2)
+                elif err2 and out1:
+                    self._log_diff(query, i, out1, j, err2)
+                elif err1 and out2:
+                    self._log_diff(query, i, err1, j, out2)
+                else:
+                    continue
+                bugs += 1
+        self.bugs += bugs
+        return bugs
+
+    def _log_diff(self, query: str, i: int, output1: str, j: int, output2: str):
+        if self.diff is None:
+            self.diff = open(self.diff_path, "a") if self.diff_path else None
+            if self.diff is None:
+                return
+        f = self.diff
+        f.write(query + "\n")
+        f.write(f"{self.versions[i]} Output:\n")
+        for line in output1.splitlines():
+            f.write(f"-- {line}\n")
+        f.write("\n")
+        f.write(f"{self.versions[j]} Output:\n")
+        for line in output2.splitlines():
+            f.write(f"-- {line}\n")
+
+    def close(self):
+        for session in self.sessions:
+            session.close()
+        if self.sink:
+            self.sink.close()
+        if self.diff:
+            self.diff.close()
+        self.sink = None
+        self.diff = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
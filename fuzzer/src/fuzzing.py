@@ -1,13 +1,34 @@
-import random, re, time, argparse
-from .config import QUERY_FOLDER, ERROR_FOLDER, STATS_FOLDER, SEED, PROB_TABLE, SQL_KEYWORDS, SQL_OPERATORS
+import asyncio, random, time, argparse, os, shutil
+from collections import deque
+from itertools import islice
+from typing import Callable
+from .config import QUERY_FOLDER, ERROR_FOLDER, STATS_FOLDER, CHECKPOINT_FOLDER, GCDA_FILE, SEED, PROB_TABLE
 from . import generator as gen
-from .test import run_coverage, reset, LOCAL
+from . import test
+from .test import run_coverage, run_coverage_async, coverage_bits, reset, work_dir, binary_version, LOCAL
 from .helper.helper import coverage_score, save_error
+from .helper.bitmap import CoverageBitmap
+from .helper.random_stream import worker_seed, python_seed
+from .helper.outcome_cache import OutcomeCache, Outcome
+from .snapshot import DBSnapshot, DB_SUFFIXES
+from .corpus import Corpus
+from .mutator import mutate_query
+from .scheduler import StageScheduler
+from .checkpoint import Checkpoint, save_files, restore_files, INTERVAL
+from .prefilter import Prefilter
 from .helper.metric import extract_metric
 from tqdm import tqdm
+import numpy as np
 
 #random.seed(SEED)
 
+SNAPSHOT = True # LOCAL: roll test.db back after rejected candidates instead of replaying the query every loop
+PREFILTER = False # drop candidates with syntax/schema errors in process before the coverage run
+OUTCOME_CACHE = 100000 # outcomes of past candidates, exact repeats on the same state are not run again (0: off)
+SCHEDULER = True # after the first loop stages are picked by a bandit on coverage per second, else at random
+OVERLAP = 2 # LOCAL sqlite3 shell: candidates generated ahead while one runs (0: one after another)
+REPRODUCIBLE = False # set by --seed: the corpus and the scheduler use the SQL length of candidates instead of their run time
+
 FUZZING_PIPELINE = lambda x: [
     Fuzzing("View", gen.View, gen_table=True, other_tables=True, prob=x),
     Fuzzing("VirtualTable", gen.VirtualTable, gen_table=True, needs_table=False, need_prob=False),
@@ -23,56 +44,13 @@ FUZZING_PIPELINE = lambda x: [
     Fuzzing("DropTable", gen.DropTable, rem_table=True, prob=x),
 ]
 
-def mutate_query(query: str) -> str:
-    mutations = [mutate_keyword, mutate_values, mutate_operator]
-    mutation = random.choice(mutations)
-    return mutation(query)
-
-def mutate_keyword(query: str) -> str:
-    mutation_type = random.choice(["replace", "remove", "add"])
-
-    if mutation_type == "replace":
-        words = [w for w in SQL_KEYWORDS if w in query]
-        if words:
-            old_w = random.choice(words)
-            new_w = random.choice(SQL_KEYWORDS)
-            return re.sub(rf"\b{re.escape(old_w)}\b", new_w, query)
-
-    elif mutation_type == "remove":
-        words = [w for w in SQL_KEYWORDS if w in query]
-        if words:
-            remove = random.choice(words)
-            return re.sub(rf"\b{re.escape(remove)}\b", '', query).strip()
-
-    elif mutation_type == "add":
-        word = random.choice(SQL_KEYWORDS)
-        pos = random.randint(0, len(query))
-        return query[:pos] + " " + word + " " + query[pos:]
-
-    return query
-
-def mutate_values(query: str) -> str:
-    values = re.findall(r'\b(?:[a-z_][a-z0-9_]*\.[a-z_][a-z0-9_]*|[a-z_][a-z0-9_]*|\d+)\b', query)
-    if values:
-        old_val = random.choice(values)
-        new_val = random.choice(values)
-        return re.sub(old_val, new_val, query)
-    return query
-
-def mutate_operator(sql: str) -> str:
-    for op in SQL_OPERATORS:
-        if op in sql:
-            new_op = random.choice(SQL_OPERATORS)
-            return sql.replace(op, new_op, 1)
-    return sql
-
 class Fuzzing:
     """
     Fuzzing pipeline 
     """
     def __init__(self, name: str, gen_fn: gen.SQLNode, threshold=10, max=100, needs_table=True, other_tables=False, 
                  gen_table=False, rem_table=False, need_prob=True, no_virt=False, mod_table=False, 
-                 commit=False, prob=None, corpus: list[gen.SQLNode] = []):
+                 commit=False, prob=None, corpus: Corpus = None):
         self.name = name
         self.gen_fn = gen_fn
         self.threshold = threshold
@@ -87,6 +65,9 @@ class Fuzzing:
         self.commit = commit
         self.prob = prob
         self.corpus = corpus
+        self.parent = None # corpus entry the last node was mutated from
+        self.picks = [] # corpus entries chosen while proposing the last candidate
+        self.work = 0 # summed cost of the candidates run by the last generate call
         self.valid = 0
         self.invalid = 0
 
@@ -116,6 +97,7 @@ class Fuzzing:
         '''
         for _ in range(self.max):
             mut_q = False
+            self.parent = None
             if self.corpus and mut and random.random() < 0.5:
                 node = self.mutate() # runs mutation in the second run
             else:
@@ -129,9 +111,10 @@ class Fuzzing:
                 self.invalid += 1
                 continue
 
+            stmt = node.sql()
             if self.commit or active:
                 new_transact = random.choices([gen.TransactionControl.random(transaction_active=active, param_prob=self.prob).sql() + ";", ""], weights=[0.2, 0.8], k=1)[0]
-                new_query = random.choices(["EXPLAIN " + node.sql() + ";", node.sql() + ";"], weights=[0.1, 0.9], k=1)[0]
+                new_query = random.choices(["EXPLAIN " + stmt + ";", stmt + ";"], weights=[0.1, 0.9], k=1)[0]
                 if active and new_transact:
                     new_query += " " + new_transact
                     active = False
@@ -139,7 +122,7 @@ class Fuzzing:
                     new_query = new_transact + " " + new_query
                     active = True
             else:
-                new_query = random.choices(["EXPLAIN " + node.sql() + ";", node.sql() + ";"], weights=[0.1, 0.9], k=1)[0]
+                new_query = random.choices(["EXPLAIN " + stmt + ";", stmt + ";"], weights=[0.1, 0.9], k=1)[0]
             
             if self.corpus and mut and mut_q:
                 new_query = mutate_query(new_query) # mutate on string
@@ -149,16 +132,65 @@ class Fuzzing:
 
         return [], None, active
 
-    def generate(self, cov: float, c: tuple[float], init_query: list[str], tables: list[gen.Table], corpus: list[gen.SQLNode], threshold_overwrite: int,
-                 desc: str = "", mut: bool = False, active: bool = False) -> tuple[float, tuple[float], list[str], list[gen.Table], list[gen.SQLNode], str, bool]:
+    def propose(self, tables: list[gen.Table], mut: bool, active: bool) -> tuple:
+        '''
+        Next candidate: (table, valid_query, node, val_active, parent corpus entry, counts).
+        counts (valid, invalid, chosen corpus entries) are recorded by use(): a candidate
+        generated ahead is dropped without a run if the one before is accepted.
+        '''
+        valid, invalid = self.valid, self.invalid
+        self.picks = []
+        table = None
+        if tables:
+            table = random.choice(tables)
+            #while ((self.mod_table and (isinstance(table, gen.View) or (isinstance(table, gen.VirtualTable) and table.vtype == "dbstat"))) or 
+            #       (self.no_virt and isinstance(table, gen.VirtualTable))):
+            #    table = random.choice(tables)
+            valid_query, node, val_active = self.gen_valid_query(table, tables, mut, active)
+            valid_query = valid_query + random.choices([[gen.Optimization.random(table).sql() + ";"], []], weights=[0.05, 0.95], k=1)[0]
+        else:
+            valid_query, node, val_active = self.gen_valid_query(None, tables, mut, active)
+        counts = (self.valid - valid, self.invalid - invalid, self.picks)
+        self.valid, self.invalid = valid, invalid
+        return table, valid_query, node, val_active, self.parent, counts
+
+    def use(self, counts: tuple[int, int, list]):
+        valid, invalid, picks = counts
+        self.valid += valid
+        self.invalid += invalid
+        for entry in picks:
+            self.corpus.picked(entry)
+
+    @staticmethod
+    async def overlap(test_query: list[str], ahead: deque, propose: Callable[[], tuple], depth: int, fill: bool = False):
+        '''
+        Runs a candidate and generates up to depth next candidates while the shell executes it
+        fill: always generates depth candidates, so the random draws do not depend on the run time
+        '''
+        task = asyncio.ensure_future(run_coverage_async(test_query))
+        while len(ahead) < depth and (fill or not task.done()):
+            await asyncio.sleep(0) # lets the task start the shell and feed it
+            ahead.append(propose())
+        return await task
+
+    def generate(self, cov: float, c: tuple[float], init_query: list[str], tables: list[gen.Table], corpus: Corpus, threshold_overwrite: int,
+                 desc: str = "", mut: bool = False, active: bool = False, bitmap: CoverageBitmap = None, 
+                 snapshot: DBSnapshot = None, prefilter: Prefilter = None, cache: OutcomeCache = None) -> tuple[float, tuple[float], list[str], list[gen.Table], Corpus, str, bool]:
         '''
         mut == False: creates/takes random table and then call random function in generator.py with table 
-        mut == True : randomly select a SQLNode from the corpus and mutate it 
+        mut == True : select a SQLNode from the corpus by its energy and mutate it 
             structural (on SQLNode): self.mutate()
             syntax     (on String) : mutate_query(new_query)
+        bitmap: a candidate is accepted if it covers a new line/branch, else if the coverage score increases
+        snapshot: state of test.db with the accepted queries, saved on accept and restored on reject
+        prefilter: candidates it drops count as a try without running them
+        cache: outcomes of earlier candidates, a repeat on the same accepted query counts as a try without running it
+        OVERLAP: the next candidates are generated while the current one runs. They are used in order
+            and dropped on an accept, so every candidate is still generated from an accepted state.
         '''
         start_time = time.time()
         self.threshold = threshold_overwrite
+        self.work = 0
         name = "Mutate" if mut else self.name
         pbar = tqdm(desc=f"{(name):<12} (lines_cov={c[0]:5.4f}) (branch_cov={c[1]:5.4f}) (query={len(init_query):03})")
 
@@ -174,35 +206,69 @@ class Fuzzing:
         if (self.needs_table or self.rem_table) and not updated_tables:
             return best_cov, best_c, new_query, updated_tables, self.corpus, best_msg, active, 0
 
+        state = cache.state(new_query) if cache is not None else None
+        depth = OVERLAP if LOCAL and test.BACKEND == "sqlite3" and test.SESSION else 0
+        loop = asyncio.new_event_loop() if depth else None
+        ahead = deque() # candidates generated while the previous one ran
+        propose = lambda: self.propose(updated_tables, mut, active)
+
         while tries < self.threshold:
-            if tables:
-                table = random.choice(updated_tables)
-                #while ((self.mod_table and (isinstance(table, gen.View) or (isinstance(table, gen.VirtualTable) and table.vtype == "dbstat"))) or 
-                #       (self.no_virt and isinstance(table, gen.VirtualTable))):
-                #    table = random.choice(updated_tables)
-                valid_query, node, val_active = self.gen_valid_query(table, updated_tables, mut, active)
-                valid_query = valid_query + random.choices([[gen.Optimization.random(table).sql() + ";"], []], weights=[0.05, 0.95], k=1)[0]
-            else:
-                valid_query, node, val_active = self.gen_valid_query(None, updated_tables, mut, active)
+            table, valid_query, node, val_active, parent, counts = ahead.popleft() if ahead else propose()
+            self.use(counts)
             
             if not node:
                 continue
 
+            key = cache.key(state, valid_query) if cache is not None else None
+            if cache is not None and cache.get(key):
+                tries += 1
+                pbar.update(1)
+                continue
+
+            if prefilter and not prefilter.check(valid_query):
+                if cache is not None:
+                    cache.put(key, Outcome((0, 0, 0, 0), 0, "", dropped=True))
+                tries += 1
+                pbar.update(1)
+                continue
+
             if LOCAL:
                 test_query = valid_query
             else:
                 test_query = new_query + valid_query
 
-            lines_c, branch_c, taken_c, calls_c, msg = run_coverage(test_query)
+            run_start = time.time()
+            if loop:
+                lines_c, branch_c, taken_c, calls_c, msg = loop.run_until_complete(self.overlap(test_query, ahead, propose, depth, fill=REPRODUCIBLE))
+            else:
+                lines_c, branch_c, taken_c, calls_c, msg = run_coverage(test_query)
+            cost = sum(len(q) for q in test_query) if REPRODUCIBLE else time.time() - run_start # wall time would change the draws
+            self.work += cost
             combined_cov = coverage_score(lines_c, branch_c, taken_c, calls_c)
             combined_query = new_query + valid_query
 
-            if combined_cov > best_cov:
+            bits = coverage_bits()
+            new_bits = 0
+            fresh = None
+            if bitmap is not None and bits is not None:
+                fresh = bitmap.new_indices(bits)
+                new_bits = len(fresh)
+                if new_bits:
+                    bitmap.update(bits)
+                # a bitmap carried over from other runs may already hold what a first table covers
+                interesting = new_bits > 0 or (self.gen_table and not updated_tables and combined_cov > best_cov)
+            else:
+                interesting = combined_cov > best_cov
+            if cache is not None:
+                cache.put(key, Outcome((lines_c, branch_c, taken_c, calls_c), new_bits, msg))
+            self.corpus.credit(parent, new_bits or int(interesting), cost)
+
+            if interesting:
                 best_cov = combined_cov
                 best_c = (lines_c, branch_c, taken_c, calls_c)
                 best_msg = msg
                 new_query = combined_query
-                self.corpus.append(node)
+                self.corpus.add(node, new_bits or 1, cost, bits=fresh if new_bits else None)
                 active = val_active
 
                 if "EXPLAIN" not in valid_query[0] and not mut:
@@ -213,13 +279,24 @@ class Fuzzing:
                         init_query += valid_query
 
                 tries = 0
+                ahead.clear() # generated from the state before the accept
+                if cache is not None:
+                    state = cache.state(new_query)
                 pbar.set_description(f"{(name):<12} (lines_cov={lines_c:7.4f}) (branch_cov={branch_c:7.4f}) (query={len(combined_query):03})")
+                if snapshot:
+                    snapshot.save()
+                if prefilter:
+                    prefilter.accept()
             else:
                 tries += 1
+                if snapshot:
+                    snapshot.restore()
 
             pbar.update(1)
 
         pbar.close()
+        if loop:
+            loop.close()
         end_time = time.time()
 
         runtime = end_time - start_time
@@ -229,7 +306,9 @@ class Fuzzing:
         if not self.corpus:
             return None
         
-        base_node = random.choice(self.corpus)
+        self.parent = self.corpus.choose()
+        self.picks.append(self.parent)
+        base_node = self.parent.node
 
         if hasattr(base_node, "mutate"):
             return base_node.mutate()
@@ -237,62 +316,135 @@ class Fuzzing:
         return None
 
 def run_pipeline(init_cov: int, init_query: list, init_tables: list, init_nodes: list, fuzz_pipeline: list[Fuzzing], 
-                 repeat: int = 1, save: bool = True, threshold: int = 10, desc: str = ""):
+                 repeat: int = 1, save: bool = True, threshold: int = 10, desc: str = "", bitmap: CoverageBitmap = None,
+                 sync: Callable[[CoverageBitmap, Corpus, gen.SchemaContext, bool], None] = None, checkpoint: Checkpoint = None):
     '''
     Coverage-guided Pipeline Fuzzer with query generator and mutator
+    bitmap: global line/branch bitmap, shared between calls to keep the covered bits
+    sync: called after every stage with the bitmap, corpus and schema (parallel workers), forced after each loop
+    checkpoint: saved at the end of a loop when due, if it holds one the run continues after its loop
     '''
     total_runtime = 0
     
     cov = init_cov
     c = (0, 0, 0, 0) # all coverages (lines, branches, taken, calls)
     query = init_query
-    tables = init_tables
-    corpus = init_nodes
+    tables = init_tables if isinstance(init_tables, gen.SchemaContext) else gen.SchemaContext(init_tables)
+    corpus = init_nodes if isinstance(init_nodes, Corpus) else Corpus(init_nodes)
     active = False # transation active
+    msg = ""
+    bitmap = CoverageBitmap() if bitmap is None else bitmap
+    snapshot = None
+    prefilter = Prefilter(binary_version()) if PREFILTER else None
+    cache = None
+    first_loop = 0
 
     total_valid = 0
     total_invalid = 0
 
     init_pipeline = [Fuzzing("Table", gen.Table, prob=PROB_TABLE, gen_table=True, needs_table=False, need_prob=True)] 
     test_pipeline = init_pipeline + fuzz_pipeline #random.choices(fuzz_pipeline, k = random.randint(5, len(fuzz_pipeline)))
+    stages = {stage.name: stage for stage in test_pipeline}
+    scheduler = StageScheduler(list(stages), cost="sql_length" if REPRODUCIBLE else "time") if SCHEDULER else None
 
     reset() # for local: resets the test.db and coverage information
-    for i in range(repeat):
+    db_files = [os.path.join(work_dir(), "test.db" + suffix) for suffix in DB_SUFFIXES] + [os.path.join(work_dir(), GCDA_FILE)]
+    if checkpoint and checkpoint.exists():
+        state, query, corpus = checkpoint.load()
+        first_loop = state["loop"] + 1
+        cov, c, msg, tables, active = state["cov"], state["c"], state["msg"], state["tables"], state["active"]
+        total_valid, total_invalid, total_runtime = state["total_valid"], state["total_invalid"], state["total_runtime"]
+        bitmap.update(state["bitmap"])
+        for name, (valid, invalid) in state["stages"].items():
+            stages[name].valid, stages[name].invalid = valid, invalid
+        test_pipeline = [stages[name] for name in state["pipeline"]]
+        scheduler = state["scheduler"]
+        restore_files(state["files"]) # test.db and coverage counters, the query is not replayed
+        if state["coverage"] is not None:
+            test.PYTHON_BACKEND.hits[:] = np.unpackbits(state["coverage"])[:len(test.PYTHON_BACKEND.hits)]
+        if prefilter and state["prefilter"]:
+            prefilter.db.deserialize(state["prefilter"])
+        random.setstate(state["random"])
+        print(f"Resuming {checkpoint.path} after loop {state['loop']}")
+    if LOCAL and SNAPSHOT:
+        snapshot = DBSnapshot(os.path.join(work_dir(), "test.db"))
+        snapshot.save()
+    if OUTCOME_CACHE and (snapshot is not None or not LOCAL): # test.db only holds the accepted query
+        cache = OutcomeCache(OUTCOME_CACHE)
+
+    for i in range(first_loop, repeat):
         print(f"Loop {i}")
-        for stage in test_pipeline:
-            stage.threshold = threshold
-            cov, c, query, tables, corpus, msg, active, runtime = stage.generate(cov, c, query, tables, corpus, threshold, desc=desc, active=active)
-            total_runtime += runtime
+        if scheduler and i > 0: # same expected number of stage runs as the random order
+            pulls = ((stages[arm.name], arm.mut) for arm in scheduler.pulls(2 * random.randint(5, len(fuzz_pipeline))))
+        else: # every stage generates, then mutates (gives each arm its first reward)
+            pulls = ((stage, mut) for stage in test_pipeline for mut in (False, True))
 
-            # mutation
-            cov, c, query, tables, corpus, msg, active, runtime = stage.generate(cov, c, query, tables, corpus, threshold, desc=desc, active=active, mut=True)
+        for stage, mut in pulls:
+            stage.threshold = threshold
+            bits_before, cov_before = bitmap.count(), cov
+            valid_before, invalid_before = stage.valid, stage.invalid
+            cov, c, query, tables, corpus, msg, active, runtime = stage.generate(cov, c, query, tables, corpus, threshold, desc=desc, active=active, mut=mut, bitmap=bitmap, snapshot=snapshot, prefilter=prefilter, cache=cache)
             stage.threshold = threshold
             total_runtime += runtime
+            if scheduler:
+                scheduler.update(scheduler.arm(stage.name, mut), bitmap.count() - bits_before or max(cov - cov_before, 0),
+                                 stage.work if REPRODUCIBLE else runtime)
 
-            total_valid += stage.valid
-            total_invalid += stage.invalid
-            
-        test_pipeline = init_pipeline + random.choices(fuzz_pipeline, k = random.randint(5, len(fuzz_pipeline)))
-        random.shuffle(test_pipeline)
+            total_valid += stage.valid - valid_before # the stage counts over all its runs
+            total_invalid += stage.invalid - invalid_before
 
-        pragma = set()
-        while len(pragma) < 10: # creates 10 unique pragma settings
-            pragma.add(gen.Pragma.random().sql() + ";")
+            if sync:
+                sync(bitmap, corpus, tables, False)
+            
+        if not scheduler:
+            test_pipeline = init_pipeline + random.choices(fuzz_pipeline, k = random.randint(5, len(fuzz_pipeline)))
+            random.shuffle(test_pipeline)
+
+        pragma = {} # creates 10 unique pragma settings, in the order drawn (a set's order depends on the hash seed)
+        while len(pragma) < 10:
+            pragma[gen.Pragma.random().sql() + ";"] = None
+        pragma = list(pragma)
         query.extend(pragma)
+        if prefilter:
+            prefilter.apply(pragma)
 
-        reset()
-
-        queries = []
-        for i in range(0, len(query), 250):
-             queries.append(query[i:i+250])
+        if snapshot: # test.db already holds the accepted queries, only the pragmas are new
+            queries = [pragma]
+        else:
+            reset()
+            queries = []
+            for j in range(0, len(query), 250):
+                queries.append(query[j:j+250])
 
         for q in queries:
             lines_c, branch_c, taken_c, calls_c, msg = run_coverage(q, timeout=300)
             c = (lines_c, branch_c, taken_c, calls_c)
             cov = coverage_score(lines_c, branch_c, taken_c, calls_c)
+            bitmap.update(coverage_bits())
+
+        if snapshot:
+            snapshot.save()
+
+        if sync:
+            sync(bitmap, corpus, tables, True)
+
+        if checkpoint and checkpoint.due() and i < repeat - 1:
+            checkpoint.save({
+                "loop": i, "cov": cov, "c": c, "msg": msg, "tables": tables, "active": active,
+                "total_valid": total_valid, "total_invalid": total_invalid, "total_runtime": total_runtime,
+                "bitmap": bitmap.bits,
+                "stages": {name: (stage.valid, stage.invalid) for name, stage in stages.items()},
+                "pipeline": [stage.name for stage in test_pipeline],
+                "scheduler": scheduler,
+                "files": save_files(db_files),
+                "coverage": test.PYTHON_BACKEND.bits() if test.BACKEND == "python" else None,
+                "prefilter": prefilter.db.serialize() if prefilter else None,
+                "random": random.getstate(),
+                "settings": {"repeat": repeat, "backend": test.BACKEND, "prefilter": prefilter is not None}, # checked by main on resume
+            }, query, corpus)
 
     if save and cov > 0:
-        filepath = f"pipeline_{lines_c:5.2f}_{random.randint(1, 10000000)}"
+        filepath = f"pipeline_{c[0]:5.2f}_{random.randint(1, 10000000)}"
         err = save_error(msg, f"{ERROR_FOLDER}{filepath}.txt")
         with open(f"{STATS_FOLDER}{filepath}.txt", "w") as f:
             f.write(f"Average Coverage: {cov:5.2f}\n") 
@@ -300,7 +452,16 @@ def run_pipeline(init_cov: int, init_query: list, init_tables: list, init_nodes:
             f.write(f"Branch Coverage: {c[1]}\n") 
             f.write(f"Taken Coverage: {c[2]}\n") 
             f.write(f"Calls Coverage: {c[3]}\n") 
+            f.write(f"Covered Bits: {bitmap.count()}\n")
             f.write(f"Valid/Invalid: {total_valid}/{total_invalid}\n")
+            if prefilter:
+                f.write(f"Filtered/Checked: {prefilter.dropped}/{prefilter.checked}\n")
+            if cache is not None:
+                f.write(f"Cached/Candidates: {cache.hits}/{cache.lookups}\n")
+            f.write(f"Corpus/Evicted: {len(corpus)}/{corpus.evicted}\n")
+            if scheduler:
+                for line in scheduler.summary():
+                    f.write(f"  {line}\n")
             f.write(f"Errors: {err}\n")
             f.write(f"Runtime: {total_runtime}\n")
             counter = extract_metric(query)
@@ -309,33 +470,40 @@ def run_pipeline(init_cov: int, init_query: list, init_tables: list, init_nodes:
         with open(f"{QUERY_FOLDER}{filepath}.sql", "w") as f:
             f.write("\n".join(query))
 
+    if checkpoint and os.path.isdir(checkpoint.path): # the run is complete
+        shutil.rmtree(checkpoint.path)
+
     return cov, c, query, tables, corpus
 
-def random_query(repeat: int = 3, save: bool = True, param_prob: dict[str, float] = None, cov_test: bool = True):
+def random_query(repeat: int = 3, save: bool = True, param_prob: dict[str, float] = None, cov_test: bool = True,
+                 bitmap: CoverageBitmap = None):
     '''
     Fast query generator using probability-based method
+    bitmap: global line/branch bitmap, the bits this query covers first are counted as new
     '''
     start = time.time()
     query = []
-    tables = []
+    tables = gen.SchemaContext()
     cov = 0
     c = (0, 0, 0, 0)
     msg = ""
+    new_bits = 0
 
     reset() # for local: resets the test.db and coverage information
-    query, tables = gen.randomQueryGen(param_prob=param_prob, cycle=repeat)
+    statements = gen.iterQueryGen(param_prob=param_prob, cycle=repeat, context=tables)
 
     if cov_test:
-        queries = []
-        for i in range(0, len(query), 250):
-            queries.append(query[i:i+250])
-
-        for q in queries:
+        while q := list(islice(statements, 250)): # runs each chunk as soon as it is generated
+            query.extend(q)
             lines_c, branch_c, taken_c, calls_c, msg = run_coverage(q, timeout=len(q)/10.0)
             c = (lines_c, branch_c, taken_c, calls_c)
             cov = coverage_score(lines_c, branch_c, taken_c, calls_c)
+            if bitmap is not None:
+                new_bits += bitmap.update(coverage_bits())
 
         # print(f"Average Coverage: {cov:5.2f}, Lines Coverage: {c[0]}, Branch Coverage: {c[1]} ")
+    else:
+        query.extend(statements)
     stop = time.time()
     if save:
         if cov_test:
@@ -350,6 +518,8 @@ def random_query(repeat: int = 3, save: bool = True, param_prob: dict[str, float
                 f.write(f"Branch Coverage: {c[1]}\n") 
                 f.write(f"Taken Coverage: {c[2]}\n") 
                 f.write(f"Calls Coverage: {c[3]}\n") 
+                if bitmap is not None:
+                    f.write(f"New Bits: {new_bits}/{bitmap.count()}\n")
                 f.write(f"Errors: {err}\n")
                 f.write(f"Runtime: {stop-start}\n")
             f.write(f"Metrics:\n")
@@ -361,27 +531,66 @@ def random_query(repeat: int = 3, save: bool = True, param_prob: dict[str, float
 
     return cov, c, query, tables
 
+def pipeline_prob() -> dict[str, float]:
+    '''
+    PROB_TABLE without probabilities that disable or force a feature
+    '''
+    prob = {k: (0.05 if 0 <= v and v <= 0.01 else v) for k, v in PROB_TABLE.items()}
+    prob = {k: ( 0.5 if v == 1 else v) for k, v in prob.items()}
+    prob = {k: ( 0.9 if v >= 0.95 else v) for k, v in prob.items()}
+    return prob
+
 def main(args=None, remain_args=None):
     parser = argparse.ArgumentParser(description="Fuzzing")
     parser.add_argument("repeat", help="Number of fuzzing loops", nargs="?", default=1, type=int)
     parser.add_argument("sql", help="Number of .sql files", nargs="?", default=1, type=int)
+    parser.add_argument("--workers", help="Number of parallel PIPELINE workers", default=1, type=int)
+    parser.add_argument("--prefilter", help="Drop invalid PIPELINE candidates in process before the coverage run", action="store_true")
+    parser.add_argument("--backend", help="sqlite3: instrumented binary, python: in-process stand-in", choices=["sqlite3", "python"], default="sqlite3")
+    parser.add_argument("--seed", help="Campaign seed for reproducible runs (independent substream per worker)", default=None, type=int)
+    parser.add_argument("--checkpoint", help="Checkpoint PIPELINE runs every N seconds (at the end of a loop)", default=None, type=float)
+    parser.add_argument("--resume", help="Continue the PIPELINE run of a checkpoint folder, then run the other .sql files", default=None)
     
     other_args = parser.parse_args(remain_args)
 
+    global PREFILTER, REPRODUCIBLE
+    PREFILTER = other_args.prefilter
+    test.BACKEND = other_args.backend
+
     times = other_args.sql
+    if other_args.seed is not None:
+        REPRODUCIBLE = True
+        random.seed(python_seed(worker_seed(other_args.seed, 0)))
 
     c = (0, 0, 0, 0)
+
+    if args.type == 'PIPELINE' and other_args.workers > 1 and (other_args.checkpoint is not None or other_args.resume):
+        parser.error("--checkpoint/--resume are not supported with --workers > 1")
+    if args.type == 'PIPELINE' and other_args.resume:
+        if not os.path.isdir(other_args.resume):
+            parser.error(f"no checkpoint folder {other_args.resume}")
+        settings = Checkpoint(other_args.resume).settings()
+        if settings is not None and settings != {"repeat": other_args.repeat, "backend": other_args.backend, "prefilter": other_args.prefilter}:
+            parser.error(f"{other_args.resume} was started with repeat={settings['repeat']} --backend {settings['backend']}"
+                         f"{' --prefilter' if settings['prefilter'] else ''}, resume it with the same arguments")
     
-    if args.type == 'PIPELINE': 
-        for _ in range(times):
-            prob = {k: (0.05 if 0 <= v and v <= 0.01 else v) for k, v in PROB_TABLE.items()}
-            prob = {k: ( 0.5 if v == 1 else v) for k, v in prob.items()}
-            prob = {k: ( 0.9 if v >= 0.95 else v) for k, v in prob.items()}
-            pipeline = FUZZING_PIPELINE(prob)
-            cov, c, query, tables, corpus = run_pipeline(0, [], [], [], pipeline, repeat=other_args.repeat)
+    if args.type == 'PIPELINE' and other_args.workers > 1:
+        from .parallel import run_parallel_pipeline
+        run_parallel_pipeline(other_args.workers, times, repeat=other_args.repeat, seed=other_args.seed)
+    elif args.type == 'PIPELINE': 
+        for n in range(times):
+            checkpoint = None
+            if other_args.resume and n == 0:
+                checkpoint = Checkpoint(other_args.resume, interval=INTERVAL if other_args.checkpoint is None else other_args.checkpoint)
+            elif other_args.checkpoint is not None:
+                checkpoint = Checkpoint(f"{CHECKPOINT_FOLDER}pipeline_{random.randint(1, 10000000)}", interval=other_args.checkpoint)
+                print(f"Checkpoints: {checkpoint.path}")
+            pipeline = FUZZING_PIPELINE(pipeline_prob())
+            cov, c, query, tables, corpus = run_pipeline(0, [], [], [], pipeline, repeat=other_args.repeat, checkpoint=checkpoint)
     elif args.type == 'RANDOM': 
+        bitmap = CoverageBitmap()
         for _ in tqdm(range(times), desc="Generating:"):
-            cov, c, query, table = random_query(repeat=other_args.repeat, param_prob=PROB_TABLE, cov_test=True)
+            cov, c, query, table = random_query(repeat=other_args.repeat, param_prob=PROB_TABLE, cov_test=True, bitmap=bitmap)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
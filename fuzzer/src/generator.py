@@ -1,16 +1,22 @@
 import random
 import string
+import sys
 from dataclasses import dataclass, field
-from typing import List, Optional, Union, Dict
+from functools import wraps
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Union, Dict
 from .config import SEED, OPS, SQL_TYPES, TIME, VALUES, VIRTUAL
+from .helper.random_stream import RandomStream, GROUP_BLOCK, group_seed
 import copy
 
 # random.seed(SEED)
 
+rng = random # source of every random decision, iterQueryGen(stream=...) swaps in a RandomStream
+StatementSink = Callable[[str], Any] # e.g. SQLiteSession.send, queue.put, lambda s: f.write(s + "\n")
+
 CALLABLE_VALUES = {
-    "INTEGER": lambda: random.randint(-10000, 10000),
+    "INTEGER": lambda: rng.randint(-10000, 10000),
     "TEXT": lambda: ("'" + random_name(prefix = "v", length=5) + "'"),
-    "REAL": lambda: random.uniform(-1e5, 1e5),
+    "REAL": lambda: rng.uniform(-1e5, 1e5),
 }
 
 def random_name(prefix: str = "x", length: int = 5) -> str:
@@ -24,7 +30,7 @@ def random_name(prefix: str = "x", length: int = 5) -> str:
     Returns:
         str: the random string
     """
-    suffix = ''.join(random.choices(string.ascii_lowercase, k=length))
+    suffix = ''.join(rng.choices(string.ascii_lowercase, k=length))
     return f"{prefix}_{suffix}"
 
 def random_type() -> str:
@@ -34,7 +40,7 @@ def random_type() -> str:
     Returns:
         str: the dtype
     """
-    return random.choice(SQL_TYPES)
+    return rng.choice(SQL_TYPES)
 
 def random_value(dtype:str, null_chance:float = 0.05, callable_chance:float = 0.9) -> str:
     """
@@ -52,7 +58,7 @@ def random_value(dtype:str, null_chance:float = 0.05, callable_chance:float = 0.
         return "NULL"
     
     dtype = random_type() if dtype == "TYPELESS" or dtype is None else dtype
-    return str(CALLABLE_VALUES[dtype]()) if flip(callable_chance) else str(random.choice(VALUES[dtype]))
+    return str(CALLABLE_VALUES[dtype]()) if flip(callable_chance) else str(rng.choice(VALUES[dtype]))
     
 def flip(weight:float = 0.5) -> bool:  
     """
@@ -64,10 +70,17 @@ def flip(weight:float = 0.5) -> bool:
     Returns:
         bool: success
     """
-    return random.random() < weight
+    return rng.random() < weight
+
+def mutate_random_column(columns: List["Column"]) -> List["Column"]:
+    '''
+    New list with one random column replaced by its mutation, the others are shared
+    '''
+    idx = rng.randrange(len(columns))
+    return columns[:idx] + [columns[idx].mutate()] + columns[idx + 1:]
 
 def random_chars(k):
-    return "'" + ''.join(random.choices(string.ascii_letters + ' ', k=k)) + "'"
+    return "'" + ''.join(rng.choices(string.ascii_letters + ' ', k=k)) + "'"
 
 def nonzero_random_value(dtype: str):
     val = "0"
@@ -78,7 +91,8 @@ def nonzero_random_value(dtype: str):
 def apply_random_formula(expr: str, dtype: str) -> tuple[str, str]:
     """
     Applies a random SQLite expression-compatible transformation to the given expression,
-    returning the new SQL expression and its resulting type.
+    returning the new SQL expression and its resulting type. Only the chosen transformation
+    draws its random values.
 
     Args:
         expr (str): (column name, literal, any expression)
@@ -88,92 +102,92 @@ def apply_random_formula(expr: str, dtype: str) -> tuple[str, str]:
         tuple[str, str]: (transformed expression, resulting SQL type)
     """
     transformations = [
-        (f"{expr} < {random_value(dtype, null_chance=0)}", "INTEGER"),
-        (f"{expr} <= {random_value(dtype, null_chance=0)}", "INTEGER"),
-        (f"{expr} > {random_value(dtype, null_chance=0)}", "INTEGER"),
-        (f"{expr} >= {random_value(dtype, null_chance=0)}", "INTEGER"),
-        (f"{expr} = {random_value(dtype, null_chance=0)}", "INTEGER"),
-        (f"{expr} != {random_value(dtype, null_chance=0)}", "INTEGER"),
-        (f"{random_value(dtype, null_chance=0)} > {expr}", "INTEGER"),
-        (f"{random_value(dtype, null_chance=0)} >= {expr}", "INTEGER"),
-        (f"{random_value(dtype, null_chance=0)} < {expr}", "INTEGER"),
-        (f"{random_value(dtype, null_chance=0)} <= {expr}", "INTEGER"),
-        (f"{random_value(dtype, null_chance=0)} = {expr}", "INTEGER"),
-        (f"{random_value(dtype, null_chance=0)} != {expr}", "INTEGER"),
-        (f"{expr} IS NULL", "INTEGER"),
-        (f"{expr} IS NOT NULL", "INTEGER"),
-        (f"nullif({expr}, {expr})", "NULL"),
-        (f"nullif({expr}, {random_value(dtype, null_chance=0)})", dtype),
-        (f"TYPEOF({expr})", "TEXT"),
-        (f"LIKELY({expr})", dtype),
-        (f"UNLIKELY({expr})", dtype),
-        (f"LIKELIHOOD({expr}, 0.5)", dtype),
-        (f"QUOTE({expr})", "TEXT"),
+        lambda: (f"{expr} < {random_value(dtype, null_chance=0)}", "INTEGER"),
+        lambda: (f"{expr} <= {random_value(dtype, null_chance=0)}", "INTEGER"),
+        lambda: (f"{expr} > {random_value(dtype, null_chance=0)}", "INTEGER"),
+        lambda: (f"{expr} >= {random_value(dtype, null_chance=0)}", "INTEGER"),
+        lambda: (f"{expr} = {random_value(dtype, null_chance=0)}", "INTEGER"),
+        lambda: (f"{expr} != {random_value(dtype, null_chance=0)}", "INTEGER"),
+        lambda: (f"{random_value(dtype, null_chance=0)} > {expr}", "INTEGER"),
+        lambda: (f"{random_value(dtype, null_chance=0)} >= {expr}", "INTEGER"),
+        lambda: (f"{random_value(dtype, null_chance=0)} < {expr}", "INTEGER"),
+        lambda: (f"{random_value(dtype, null_chance=0)} <= {expr}", "INTEGER"),
+        lambda: (f"{random_value(dtype, null_chance=0)} = {expr}", "INTEGER"),
+        lambda: (f"{random_value(dtype, null_chance=0)} != {expr}", "INTEGER"),
+        lambda: (f"{expr} IS NULL", "INTEGER"),
+        lambda: (f"{expr} IS NOT NULL", "INTEGER"),
+        lambda: (f"nullif({expr}, {expr})", "NULL"),
+        lambda: (f"nullif({expr}, {random_value(dtype, null_chance=0)})", dtype),
+        lambda: (f"TYPEOF({expr})", "TEXT"),
+        lambda: (f"LIKELY({expr})", dtype),
+        lambda: (f"UNLIKELY({expr})", dtype),
+        lambda: (f"LIKELIHOOD({expr}, 0.5)", dtype),
+        lambda: (f"QUOTE({expr})", "TEXT"),
     ]
 
     if dtype == "TEXT":
         transformations.extend([
-            (f"LOWER({expr})", "TEXT"),
-            (f"UPPER({expr})", "TEXT"),
-            (f"HEX({expr})", "TEXT"),
-            (f"QUOTE({expr})", "TEXT"),
-            (f"TRIM({expr}, {random_chars(1)})", "TEXT"),
-            (f"LTRIM({expr}, {random_chars(1)})", "TEXT"),
-            (f"RTRIM({expr}, {random_chars(1)})", "TEXT"),
-            (f"REPLACE({expr}, {random_chars(2)}, {random_chars(2)})", "TEXT"),
-            (f"SUBSTR({expr}, {random.randint(1, 5)}, {random.randint(1, 5)})", "TEXT"),
-            (f"{expr} || {random_chars(3)}", "TEXT"),
-            (f"{random_chars(3)} || {expr}", "TEXT"),
-            (f"INSTR({expr}, {random_chars(2)})", "INTEGER"),
-            (f"LENGTH({expr})", "INTEGER"),
-            (f"{expr} LIKE {random_chars(4)}", "INTEGER"),
-            (f"{expr} GLOB {random_chars(4)}", "INTEGER"),
-            (f"UNICODE({expr})", "INTEGER"),
-            (f"PRINTF('%10s', {expr})", "TEXT"),
-            (f"PRINTF('%-10s', {expr})", "TEXT"),
-            (f"PRINTF('%.3s', {expr})", "TEXT"),
-            (f"{expr} + {random_value('INTEGER', null_chance=0)}", "INTEGER"),
-            (f"{random_value('INTEGER', null_chance=0)} + {expr}", "INTEGER"),
-            (f"{expr} - {random_value('INTEGER', null_chance=0)}", "INTEGER"),
-            (f"{random_value('INTEGER', null_chance=0)} - {expr}", "INTEGER"),
-            (f"{expr} * {random_value('INTEGER', null_chance=0)}", "INTEGER"),
-            (f"{random_value('INTEGER', null_chance=0)} * {expr}", "INTEGER"),
-            (f"{expr} / {nonzero_random_value(dtype)}", "REAL"),
+            lambda: (f"LOWER({expr})", "TEXT"),
+            lambda: (f"UPPER({expr})", "TEXT"),
+            lambda: (f"HEX({expr})", "TEXT"),
+            lambda: (f"QUOTE({expr})", "TEXT"),
+            lambda: (f"TRIM({expr}, {random_chars(1)})", "TEXT"),
+            lambda: (f"LTRIM({expr}, {random_chars(1)})", "TEXT"),
+            lambda: (f"RTRIM({expr}, {random_chars(1)})", "TEXT"),
+            lambda: (f"REPLACE({expr}, {random_chars(2)}, {random_chars(2)})", "TEXT"),
+            lambda: (f"SUBSTR({expr}, {rng.randint(1, 5)}, {rng.randint(1, 5)})", "TEXT"),
+            lambda: (f"{expr} || {random_chars(3)}", "TEXT"),
+            lambda: (f"{random_chars(3)} || {expr}", "TEXT"),
+            lambda: (f"INSTR({expr}, {random_chars(2)})", "INTEGER"),
+            lambda: (f"LENGTH({expr})", "INTEGER"),
+            lambda: (f"{expr} LIKE {random_chars(4)}", "INTEGER"),
+            lambda: (f"{expr} GLOB {random_chars(4)}", "INTEGER"),
+            lambda: (f"UNICODE({expr})", "INTEGER"),
+            lambda: (f"PRINTF('%10s', {expr})", "TEXT"),
+            lambda: (f"PRINTF('%-10s', {expr})", "TEXT"),
+            lambda: (f"PRINTF('%.3s', {expr})", "TEXT"),
+            lambda: (f"{expr} + {random_value('INTEGER', null_chance=0)}", "INTEGER"),
+            lambda: (f"{random_value('INTEGER', null_chance=0)} + {expr}", "INTEGER"),
+            lambda: (f"{expr} - {random_value('INTEGER', null_chance=0)}", "INTEGER"),
+            lambda: (f"{random_value('INTEGER', null_chance=0)} - {expr}", "INTEGER"),
+            lambda: (f"{expr} * {random_value('INTEGER', null_chance=0)}", "INTEGER"),
+            lambda: (f"{random_value('INTEGER', null_chance=0)} * {expr}", "INTEGER"),
+            lambda: (f"{expr} / {nonzero_random_value(dtype)}", "REAL"),
         ])
     elif dtype in ("INTEGER", "REAL"): 
         transformations.extend([
-            (f"ABS({expr})", dtype),
-            (f"ROUND({expr})", dtype),
-            (f"ROUND({expr}, {random.randint(0, 3)})", dtype),
-            (f"COALESCE(NULL, {expr})", dtype),
-            (f"COALESCE(NULL, {expr}, {random_value(dtype, null_chance=0.0)})", dtype),
-            (f"COALESCE(NULL, NULL, {expr})", dtype),
-            (f"COALESCE({expr}, {random_value(dtype, null_chance=0.0)})", dtype),
-            (f"IFNULL(NULL, {expr})", dtype),
-            (f"IFNULL({expr}, {random_value(dtype, null_chance=0.0)})", dtype),
-            (f"- ({expr})", dtype),
-            (f"+ ({expr})", dtype),
-            (f"PRINTF('{'%.2f' if dtype == 'REAL' else '%d'}', {expr})", "TEXT"),
-            (f"PRINTF('%x', {expr})", "TEXT"),
-            (f"PRINTF('%o', {expr})", "TEXT"),
-            (f"PRINTF('%c', {expr})", "TEXT"),
-            (f"PRINTF('%.6e', {expr})", "TEXT"),
-            (f"PRINTF('%.1g', {expr})", "TEXT"),
-            (f"PRINTF('%.0f%%', {expr})", "TEXT"),
-            (f"{expr} + {random_value(dtype, null_chance=0)}", dtype),
-            (f"{random_value(dtype, null_chance=0)} + {expr}", dtype),
-            (f"{expr} - {random_value(dtype, null_chance=0)}", dtype),
-            (f"{random_value(dtype, null_chance=0)} - {expr}", dtype),
-            (f"{expr} * {random_value(dtype, null_chance=0)}", dtype),
-            (f"{random_value(dtype, null_chance=0)} * {expr}", dtype),
-            (f"{expr} / {nonzero_random_value(dtype)}", "REAL"),
-            (f"{expr} / NULLIF({0},{1})", "REAL"),
-            (f"{expr} / NULLIF({0},{0})", "NULL"),
+            lambda: (f"ABS({expr})", dtype),
+            lambda: (f"ROUND({expr})", dtype),
+            lambda: (f"ROUND({expr}, {rng.randint(0, 3)})", dtype),
+            lambda: (f"COALESCE(NULL, {expr})", dtype),
+            lambda: (f"COALESCE(NULL, {expr}, {random_value(dtype, null_chance=0.0)})", dtype),
+            lambda: (f"COALESCE(NULL, NULL, {expr})", dtype),
+            lambda: (f"COALESCE({expr}, {random_value(dtype, null_chance=0.0)})", dtype),
+            lambda: (f"IFNULL(NULL, {expr})", dtype),
+            lambda: (f"IFNULL({expr}, {random_value(dtype, null_chance=0.0)})", dtype),
+            lambda: (f"- ({expr})", dtype),
+            lambda: (f"+ ({expr})", dtype),
+            lambda: (f"PRINTF('{'%.2f' if dtype == 'REAL' else '%d'}', {expr})", "TEXT"),
+            lambda: (f"PRINTF('%x', {expr})", "TEXT"),
+            lambda: (f"PRINTF('%o', {expr})", "TEXT"),
+            lambda: (f"PRINTF('%c', {expr})", "TEXT"),
+            lambda: (f"PRINTF('%.6e', {expr})", "TEXT"),
+            lambda: (f"PRINTF('%.1g', {expr})", "TEXT"),
+            lambda: (f"PRINTF('%.0f%%', {expr})", "TEXT"),
+            lambda: (f"{expr} + {random_value(dtype, null_chance=0)}", dtype),
+            lambda: (f"{random_value(dtype, null_chance=0)} + {expr}", dtype),
+            lambda: (f"{expr} - {random_value(dtype, null_chance=0)}", dtype),
+            lambda: (f"{random_value(dtype, null_chance=0)} - {expr}", dtype),
+            lambda: (f"{expr} * {random_value(dtype, null_chance=0)}", dtype),
+            lambda: (f"{random_value(dtype, null_chance=0)} * {expr}", dtype),
+            lambda: (f"{expr} / {nonzero_random_value(dtype)}", "REAL"),
+            lambda: (f"{expr} / NULLIF({0},{1})", "REAL"),
+            lambda: (f"{expr} / NULLIF({0},{0})", "NULL"),
         ])
     # elif dtype == "TYPELESS":
     #     return expr, dtype
 
-    return random.choice(transformations)
+    return rng.choice(transformations)()
 
 def apply_random_aggregate_function(expr: str, dtype: str) -> tuple[str, str]:
     """
@@ -208,7 +222,7 @@ def apply_random_aggregate_function(expr: str, dtype: str) -> tuple[str, str]:
             (f"GROUP_CONCAT({expr}, ', ')", "TEXT")
         ]
 
-    return random.choice(aggregates)
+    return rng.choice(aggregates)
 
 
 def apply_random_cast(expr: str, dtype: str) -> tuple[str, str]:
@@ -229,7 +243,7 @@ def apply_random_cast(expr: str, dtype: str) -> tuple[str, str]:
         "REAL":    ["TEXT", "INTEGER"],
     }
 
-    target = random.choice(valid_casts.get(dtype, ["TEXT",]))
+    target = rng.choice(valid_casts.get(dtype, ["TEXT",]))
 
     cast_expr = f"CAST({expr} AS {target})"
     return cast_expr, target
@@ -254,23 +268,69 @@ def random_expression(dtype:str="TYPELESS") -> str:
         ]
     elif dtype == "TEXT":
         options = [
-            f"CHAR({', '.join(str(random.randint(0, 1114111)) for _ in range(random.randint(0, 4)))})",
+            f"CHAR({', '.join(str(rng.randint(0, 1114111)) for _ in range(rng.randint(0, 4)))})",
             ":myparam",
         ]
     else:
         return random_value(dtype, null_chance=0)
-    return random.choice(options)
+    return rng.choice(options)
 
 #----------------------------------------------------------------------------------------------------------------------------------------------------#
 
+# slots (python 3.10+) keep the nodes small, older versions fall back to a __dict__ per node
+NODE = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+def cached_sql(render: Callable[["SQLNode"], str]) -> Callable[["SQLNode"], str]:
+    '''
+    Wraps a sql() method: the string is rendered once and kept in the node until invalidate()
+    '''
+    @wraps(render)
+    def sql(self) -> str:
+        text = getattr(self, "_sql", None) # unset after unpickling
+        if text is None:
+            text = self._sql = render(self)
+        return text
+    sql.cached = True
+    return sql
+
 class SQLNode:
+    '''
+    mutate() never changes a node in place: it returns a shallow copy with the changed
+    fields replaced, children and lists that did not change are shared with the original.
+
+    sql() is cached per node. A copy starts without a cache, so a mutated copy renders its
+    own level again and reuses the cached strings of the subtrees it shares. Parents do not
+    need to be told about changes of a child as the path to a changed child is copied.
+    Code that changes a node in place (e.g. AlterTable.confirm_add) calls invalidate().
+    '''
+    __slots__ = ("_sql",)
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        render = cls.__dict__.get("sql")
+        if render is not None and not getattr(render, "cached", False): # dataclass(slots=True) recreates the class
+            cls.sql = cached_sql(render)
+
+    def __post_init__(self):
+        self._sql = None
+
+    def __copy__(self) -> "SQLNode":
+        node = object.__new__(type(self))
+        for name in self.__dataclass_fields__:
+            setattr(node, name, getattr(self, name))
+        node._sql = None
+        return node
+
+    def invalidate(self):
+        self._sql = None
+
     def sql(self) -> str:
         return ""
 
 
 #----------------------------------------------------------------------------------------------------------------------------------------------------#
 
-@dataclass
+@dataclass(**NODE)
 class Predicate(SQLNode):
     """
     Any predicate: Nullcheck, Comparison, InList, Between, and Like
@@ -284,7 +344,7 @@ class Predicate(SQLNode):
         if param_prob is not None:
             prob.update(param_prob)
             
-        col = random.choice(table.columns)
+        col = rng.choice(table.columns)
         
         predicate_classes = [NullCheck, Comparison, InList, Between]
         if sub_allow:
@@ -293,13 +353,13 @@ class Predicate(SQLNode):
         if col.dtype == "TEXT":
             predicate_classes.append(Like)
         
-        cls = random.choice(predicate_classes)
+        cls = rng.choice(predicate_classes)
         if cls == Exists:
             return cls.random(table, param_prob=prob)
         else:
             return cls.random(col, table_name=table.name, param_prob=prob)
     
-@dataclass
+@dataclass(**NODE)
 class Comparison(Predicate):
     '''
     column OP value
@@ -319,13 +379,13 @@ class Comparison(Predicate):
         if param_prob is not None:
             prob.update(param_prob)
         dtype = col.dtype
-        op = random.choice(OPS[dtype])
+        op = rng.choice(OPS[dtype])
         val = Expression.random(dtype=dtype, no_cols=True, param_prob=prob).sql()
         return Comparison(col, op, val, table_name)
     
     def mutate(self) -> "Comparison":
-        comparison = copy.deepcopy(self)
-        mutation_type = random.choice(["rename", "change_col", "change_op", "change_val"])
+        comparison = copy.copy(self)
+        mutation_type = rng.choice(["rename", "change_col", "change_op", "change_val"])
 
         if mutation_type == "rename":
             comparison.table_name = random_name("mut_comp")
@@ -334,14 +394,14 @@ class Comparison(Predicate):
             comparison.column = comparison.column.mutate()
 
         elif mutation_type == "change_op":
-            comparison.operator = random.choice(OPS[comparison.column.dtype])
+            comparison.operator = rng.choice(OPS[comparison.column.dtype])
 
         elif mutation_type == "change_val":
             comparison.value = random_value(comparison.column.dtype)
 
         return comparison
 
-@dataclass
+@dataclass(**NODE)
 class Between(Predicate):
     '''
     column BETWEEN low AND high
@@ -367,8 +427,8 @@ class Between(Predicate):
         return Between(col, low, high, table_name)
     
     def mutate(self) -> "Between":
-        between = copy.deepcopy(self)
-        mutation_type = random.choice(["rename", "change_col", "change_lower", "change_upper"])
+        between = copy.copy(self)
+        mutation_type = rng.choice(["rename", "change_col", "change_lower", "change_upper"])
 
         if mutation_type == "rename":
             between.table_name = random_name("mut_betw")
@@ -384,7 +444,7 @@ class Between(Predicate):
 
         return between
 
-@dataclass
+@dataclass(**NODE)
 class Like(Predicate):
     '''
     column LIKE val
@@ -411,7 +471,7 @@ class Like(Predicate):
         Helper function to create patterns for LIKE, could be more complex if we wanted
         '''
         if not base:
-            return random.choice(['%', '_', ''])
+            return rng.choice(['%', '_', ''])
         
         base = base.replace("'", "")
 
@@ -426,20 +486,20 @@ class Like(Predicate):
         patterns.append(f"{base}_")
         
         if len(base) > 2:
-            idx = random.randint(1, len(base) - 2)
+            idx = rng.randint(1, len(base) - 2)
             pattern = base[:idx] + '%' + base[idx:]
             patterns.append(pattern)
 
         if len(base) > 1:
-            idx = random.randint(0, len(base) - 1)
+            idx = rng.randint(0, len(base) - 1)
             pattern = base[:idx] + '_' + base[idx + 1:]
             patterns.append(pattern)
 
-        return "'" + random.choice(patterns) + "'"
+        return "'" + rng.choice(patterns) + "'"
     
     def mutate(self) -> "Like":
-        like = copy.deepcopy(self)
-        mutation_type = random.choice(["rename", "change_col", "change_val"])
+        like = copy.copy(self)
+        mutation_type = rng.choice(["rename", "change_col", "change_val"])
 
         if mutation_type == "rename":
             like.table_name = random_name("mut_like")
@@ -452,7 +512,7 @@ class Like(Predicate):
 
         return like
     
-@dataclass
+@dataclass(**NODE)
 class InList(Predicate):
     '''
     column in (v1, v2, v3, ...)
@@ -475,29 +535,30 @@ class InList(Predicate):
             "null_p":prob["inli_nullc"],
             "call_p":prob["inli_callc"]
         })
-        count = random.randint(2, 5)
+        count = rng.randint(2, 5)
         values = [Expression.random(dtype=col.dtype, no_cols=True, param_prob=prob).sql() for _ in range(count)]
         return InList(col, values, table_name)
     
     def mutate(self) -> "InList":
-        inlist = copy.deepcopy(self)
-        mutation_type = random.choice(["rename", "add_value", "remove_value", "change_col"])
+        inlist = copy.copy(self)
+        mutation_type = rng.choice(["rename", "add_value", "remove_value", "change_col"])
 
         if mutation_type == "rename":
             inlist.table_name = random_name("mut_inli")
 
         elif mutation_type == "add_value":
-            inlist.values.append(random_value(inlist.column.dtype))
+            inlist.values = inlist.values + [random_value(inlist.column.dtype)]
 
         elif mutation_type == "remove_value" and inlist.values:
-            inlist.values.pop(random.randint(0, len(inlist.values) - 1))
+            inlist.values = list(inlist.values)
+            inlist.values.pop(rng.randint(0, len(inlist.values) - 1))
 
         elif mutation_type == "change_col":
             inlist.column = inlist.column.mutate()
 
         return inlist
     
-@dataclass
+@dataclass(**NODE)
 class Exists(Predicate):
     '''
     EXISTS (SELECT 1 FROM ... WHERE ...)
@@ -526,12 +587,12 @@ class Exists(Predicate):
         return Exists(select)
     
     def mutate(self) -> "Exists":
-        exists = copy.deepcopy(self)
+        exists = copy.copy(self)
         exists.select = exists.select.mutate()
 
         return exists
 
-@dataclass
+@dataclass(**NODE)
 class NullCheck(Predicate):
     '''
     column IS/IS NOT NULL
@@ -556,8 +617,8 @@ class NullCheck(Predicate):
         return NullCheck(col, check, table_name)
     
     def mutate(self) -> "NullCheck":
-        null_check = copy.deepcopy(self)
-        mutation_type = random.choice(["rename", "change_col", "toggle_nullc"])
+        null_check = copy.copy(self)
+        mutation_type = rng.choice(["rename", "change_col", "toggle_nullc"])
 
         if mutation_type == "rename":
             null_check.table_name = random_name("mut_nullc")
@@ -572,7 +633,7 @@ class NullCheck(Predicate):
 
 #----------------------------------------------------------------------------------------------------------------------------------------------------#
 
-@dataclass
+@dataclass(**NODE)
 class Expression(SQLNode):
     """
     Expression is anything that computes a value.
@@ -606,7 +667,7 @@ class Expression(SQLNode):
             else:
                 return Case.random(table, column=column, dtype=dtype, param_prob=prob)
 
-@dataclass
+@dataclass(**NODE)
 class Literal(Expression):
     """
     Any Literal such as explicit values, funcitons, or formulas
@@ -635,7 +696,7 @@ class Literal(Expression):
         if flip(prob["std_p"]):
             return Literal(value=value, dtype=current_dtype)
         
-        for _ in range(random.randint(1,3)):
+        for _ in range(rng.randint(1,3)):
             if flip(prob["form_p"]):
                 value, current_dtype = apply_random_formula(value, current_dtype)
             if flip(prob["cast_p"]):
@@ -650,8 +711,8 @@ class Literal(Expression):
         return Literal(value, current_dtype)
     
     def mutate(self) -> "Literal":
-        literal = copy.deepcopy(self)
-        mutation_type = random.choice(["apply_formula", "apply_cast", "apply_agg"])
+        literal = copy.copy(self)
+        mutation_type = rng.choice(["apply_formula", "apply_cast", "apply_agg"])
 
         current_dtype = literal.dtype
 
@@ -666,7 +727,7 @@ class Literal(Expression):
 
         return literal
     
-@dataclass
+@dataclass(**NODE)
 class Time(Expression):
     """
     Time expressions
@@ -683,26 +744,26 @@ class Time(Expression):
             prob.update(param_prob)
         
         options = [
-            f"{random.choice(TIME['DATES'])}({random.choice(TIME['TIMES'])})",
-            f"{random.choice(TIME['DATES'])}({random.choice(TIME['TIMES'])}, {random.choice(TIME['TIME_MODS'])})",
-            f"strftime({random.choice(TIME['TIME_FORMATS'])}, {random.choice(TIME['TIMES'])}, {random.choice(TIME['TIME_MODS'])})",
-            f"{random.choice(TIME['CURRENT'])}"
+            f"{rng.choice(TIME['DATES'])}({rng.choice(TIME['TIMES'])})",
+            f"{rng.choice(TIME['DATES'])}({rng.choice(TIME['TIMES'])}, {rng.choice(TIME['TIME_MODS'])})",
+            f"strftime({rng.choice(TIME['TIME_FORMATS'])}, {rng.choice(TIME['TIMES'])}, {rng.choice(TIME['TIME_MODS'])})",
+            f"{rng.choice(TIME['CURRENT'])}"
         ]
-        return Time(value=random.choice(options))
+        return Time(value=rng.choice(options))
     
     def mutate(self) -> "Time":
-        time = copy.deepcopy(self)
+        time = copy.copy(self)
         options = [
-            f"{random.choice(TIME['DATES'])}({random.choice(TIME['TIMES'])})",
-            f"{random.choice(TIME['DATES'])}({random.choice(TIME['TIMES'])}, {random.choice(TIME['TIME_MODS'])})",
-            f"strftime({random.choice(TIME['TIME_FORMATS'])}, {random.choice(TIME['TIMES'])}, {random.choice(TIME['TIME_MODS'])})",
-            f"{random.choice(TIME['CURRENT'])}"
+            f"{rng.choice(TIME['DATES'])}({rng.choice(TIME['TIMES'])})",
+            f"{rng.choice(TIME['DATES'])}({rng.choice(TIME['TIMES'])}, {rng.choice(TIME['TIME_MODS'])})",
+            f"strftime({rng.choice(TIME['TIME_FORMATS'])}, {rng.choice(TIME['TIMES'])}, {rng.choice(TIME['TIME_MODS'])})",
+            f"{rng.choice(TIME['CURRENT'])}"
         ]
-        time.value = random.choice(options)
+        time.value = rng.choice(options)
 
         return time
 
-@dataclass
+@dataclass(**NODE)
 class ColumnExpression(Expression):
     """
     Expressions that explicitly include a column
@@ -720,14 +781,14 @@ class ColumnExpression(Expression):
             prob.update(param_prob)
 
         if column is None and table.columns:
-            column = random.choice(table.columns)
+            column = rng.choice(table.columns)
         current_dtype = column.dtype
         value = f"{table.name}.{column.name}"
             
         if flip(prob["std_p"]):
             return ColumnExpression(value=value, table=table)
         
-        for _ in range(random.randint(1,3)):
+        for _ in range(rng.randint(1,3)):
             if flip(prob["form_p"]):
                 value, current_dtype = apply_random_formula(value, current_dtype)
             if flip(prob["cast_p"]):
@@ -739,23 +800,23 @@ class ColumnExpression(Expression):
         return ColumnExpression(value=value, table=table)
     
     def mutate(self) -> "ColumnExpression":
-        col_expr = copy.deepcopy(self)
-        mutation_type = random.choice(["change_val", "apply_formula", "apply_cast", "apply_agg", "change_tbl"])
+        col_expr = copy.copy(self)
+        mutation_type = rng.choice(["change_val", "apply_formula", "apply_cast", "apply_agg", "change_tbl"])
 
         if mutation_type == "change_val" and col_expr.table.columns:
-            column = random.choice(col_expr.table.columns)
+            column = rng.choice(col_expr.table.columns)
             col_expr.value = f"{self.table.name}.{column.name}"
 
         elif mutation_type == "apply_formula" and col_expr.table.columns:
-            current_dtype = random.choice(col_expr.table.columns).dtype 
+            current_dtype = rng.choice(col_expr.table.columns).dtype 
             col_expr.value, _ = apply_random_formula(col_expr.value, current_dtype) 
 
         elif mutation_type == "apply_cast" and col_expr.table.columns:
-            current_dtype = random.choice(col_expr.table.columns).dtype 
+            current_dtype = rng.choice(col_expr.table.columns).dtype 
             col_expr.value, _ = apply_random_cast(col_expr.value, current_dtype)
 
         elif mutation_type == "apply_agg" and col_expr.table.columns:
-            current_dtype = random.choice(col_expr.table.columns).dtype 
+            current_dtype = rng.choice(col_expr.table.columns).dtype 
             col_expr.value, _ = apply_random_aggregate_function(col_expr.value, current_dtype)
 
         elif mutation_type == "change_tbl":
@@ -763,7 +824,7 @@ class ColumnExpression(Expression):
 
         return col_expr
         
-@dataclass
+@dataclass(**NODE)
 class Case(Expression):
     """
     Case Expressions
@@ -797,14 +858,14 @@ class Case(Expression):
         if column:
             col = f"{table.name}.{column.name}"
         else:
-            column = random.choice(table.columns)
+            column = rng.choice(table.columns)
             col = "" if flip(prob["case_col_p"]) else f"{table.name}.{column.name}"
         col_dtype = column.dtype
         
         if not dtype:
             dtype = random_type()
             
-        num_cases = random.randint(1,5)
+        num_cases = rng.randint(1,5)
         conditions = []
         values = []
         for _ in range(num_cases):
@@ -819,8 +880,8 @@ class Case(Expression):
         return Case(conditions, values, col, else_, col_dtype)
     
     def mutate(self) -> "Case":
-        case = copy.deepcopy(self)
-        mutation_type = random.choice(["change_else", "change_val", "apply_formula"])
+        case = copy.copy(self)
+        mutation_type = rng.choice(["change_else", "change_val", "apply_formula"])
 
         if mutation_type == "change_else":
             case.else_ = random_value(case.dtype) if flip() else "" 
@@ -829,14 +890,13 @@ class Case(Expression):
             case.values = [random_value(case.dtype) for _ in case.values]
         
         elif mutation_type == "apply_formula":
-            for i in range(len(case.values)):
-                case.values[i], _ = apply_random_formula(case.values[i], case.dtype)
+            case.values = [apply_random_formula(value, case.dtype)[0] for value in case.values]
 
         return case
         
 #----------------------------------------------------------------------------------------------------------------------------------------------------#   
 
-@dataclass
+@dataclass(**NODE)
 class Where(SQLNode):
     '''
     WHERE Predicate/InSubquery/WHERE
@@ -864,13 +924,13 @@ class Where(SQLNode):
         else:
             left = Where.random(table, max_depth - 1, no_sub = no_sub, param_prob=prob)
             right = Where.random(table, max_depth - 1, no_sub = no_sub, param_prob=prob)
-            op = random.choice(["AND", "OR"])
+            op = rng.choice(["AND", "OR"])
             return BooleanExpr(left, right, op)
         
     def mutate(self) -> "Where":
         return None
 
-@dataclass
+@dataclass(**NODE)
 class InSubquery(Where):
     '''
     WHERE col IN (SELECT other_col FROM other_table WHERE ...)
@@ -888,14 +948,14 @@ class InSubquery(Where):
         if param_prob is not None:
             prob.update(param_prob)
             
-        column = random.choice(table.columns)
-        other_table = random.choice(other_tables)
+        column = rng.choice(table.columns)
+        other_table = rng.choice(other_tables)
 
-        matching_columns = [col for col in other_table.columns if col.dtype == column.dtype]
+        matching_columns = other_table.columns_of(column.dtype)
         if not matching_columns:
-            sub_col = random.choice(other_table.columns)
+            sub_col = rng.choice(other_table.columns)
         else:
-            sub_col = random.choice(matching_columns)
+            sub_col = rng.choice(matching_columns)
             
         where_clause = Where.random(other_table, max_depth=max_depth, param_prob=prob) if flip(prob["where_p"]) else None
         subquery = Select(
@@ -908,8 +968,8 @@ class InSubquery(Where):
         return InSubquery(column=column, subquery=subquery, table_name=table.name)
     
     def mutate(self) -> "InSubquery":
-        in_subquery = copy.deepcopy(self)
-        mutation_type = random.choice(["rename", "change_col", "change_subquery"])
+        in_subquery = copy.copy(self)
+        mutation_type = rng.choice(["rename", "change_col", "change_subquery"])
 
         if mutation_type == "rename":
             in_subquery.table_name = random_name("mut_insub")
@@ -922,7 +982,7 @@ class InSubquery(Where):
 
         return in_subquery
 
-@dataclass
+@dataclass(**NODE)
 class BooleanExpr(Where):
     '''
     a < b
@@ -935,11 +995,11 @@ class BooleanExpr(Where):
         return f"({self.left.sql()} {self.operator} {self.right.sql()})"
     
     def mutate(self) -> "BooleanExpr":
-        bool_exp = copy.deepcopy(self)
-        mutation_type = random.choice(["change_op", "swap", "modify_left", "modify_right"])
+        bool_exp = copy.copy(self)
+        mutation_type = rng.choice(["change_op", "swap", "modify_left", "modify_right"])
 
         if mutation_type == "change_op":
-            bool_exp.operator = random.choice(["<", ">", "=", "<=", ">=", "<>", "IS", "IS NOT"])
+            bool_exp.operator = rng.choice(["<", ">", "=", "<=", ">=", "<>", "IS", "IS NOT"])
 
         elif mutation_type == "swap":
             bool_exp.left, bool_exp.right = bool_exp.right, bool_exp.left
@@ -954,8 +1014,8 @@ class BooleanExpr(Where):
 
 #----------------------------------------------------------------------------------------------------------------------------------------------------#
 
-@dataclass
-class Column:
+@dataclass(**NODE)
+class Column(SQLNode):
     '''
     name dtype primary_key nullable unique check default
     '''
@@ -1013,8 +1073,8 @@ class Column:
         return Column(name, dtype, nullable, primary_key, notnull, unique, check, default)
     
     def mutate(self) -> "Column":
-        column = copy.deepcopy(self)
-        mutation_type = random.choice(["rename", "change_dtype", "toggle_nullable", "toggle_primary_key", "toggle_unique", "toggle_check", "change_default"])
+        column = copy.copy(self)
+        mutation_type = rng.choice(["rename", "change_dtype", "toggle_nullable", "toggle_primary_key", "toggle_unique", "toggle_check", "change_default"])
 
         if mutation_type == "rename":
             column.name = random_name("col")
@@ -1045,14 +1105,15 @@ class Column:
 
         return column
 
-@dataclass
+@dataclass(**NODE)
 class Table(SQLNode):
     '''
     CREATE TABLE name (columns)
     '''
     name: str
     columns: List[Column]
-    viewed = False
+    viewed: bool = False # a view depends on it, so it is not altered or dropped
+    _dtypes: Optional[tuple] = field(default=None, init=False, repr=False, compare=False) # (columns, {dtypes: columns of these dtypes})
 
     def sql(self) -> str:
         column_defs = ", ".join([col.sql() for col in self.columns])
@@ -1060,6 +1121,19 @@ class Table(SQLNode):
 
     def get_col_names(self) -> List[str]:
         return [col.name for col in self.columns]
+
+    def columns_of(self, *dtypes: str) -> List[Column]:
+        '''
+        Columns with one of the dtypes, in table order. The lists are kept until the columns
+        list is replaced (columns are never changed in place).
+        '''
+        if self._dtypes is None or self._dtypes[0] is not self.columns:
+            self._dtypes = (self.columns, {})
+        index = self._dtypes[1]
+        cols = index.get(dtypes)
+        if cols is None:
+            cols = index[dtypes] = [c for c in self.columns if c.dtype in dtypes]
+        return cols
     
     @staticmethod
     def random(name: Optional[str] = None, min_cols: int = 1, max_cols: int = 5, param_prob:Dict[str, float] = None) -> "Table":
@@ -1068,7 +1142,7 @@ class Table(SQLNode):
             prob.update(param_prob)
         
         name = name or random_name("tbl")
-        num_cols = random.randint(min_cols, max_cols)
+        num_cols = rng.randint(min_cols, max_cols)
 
         columns = []
         for i in range(num_cols):
@@ -1079,27 +1153,26 @@ class Table(SQLNode):
         return Table(name, columns)
     
     def mutate(self) -> "Table":
-        table = copy.deepcopy(self)
-        mutation_type = random.choice(["rename", "add_col", "remove_col", "mutate_col"])
+        table = copy.copy(self)
+        mutation_type = rng.choice(["rename", "add_col", "remove_col", "mutate_col"])
 
         if mutation_type == "rename":
-            table.name += f"_{random.choice(['x', '1', 'tmp'])}"
+            table.name += f"_{rng.choice(['x', '1', 'tmp'])}"
 
         elif mutation_type == "add_col":
             new_col = Column.random()
-            table.columns.append(new_col)
+            table.columns = table.columns + [new_col]
 
         elif mutation_type == "remove_col" and len(table.columns) > 1:
-            idx = random.randrange(len(table.columns))
-            del table.columns[idx]
+            idx = rng.randrange(len(table.columns))
+            table.columns = table.columns[:idx] + table.columns[idx + 1:]
 
         elif mutation_type == "mutate_col" and table.columns:
-            col = random.choice(table.columns)
-            col.mutate()
+            table.columns = mutate_random_column(table.columns)
 
         return table
     
-@dataclass
+@dataclass(**NODE)
 class AlterTable(Table):
     '''
     ALTER TABLE name RENAME old_col TO new_col
@@ -1107,7 +1180,7 @@ class AlterTable(Table):
     ALTER TABLE old_name RENAME TO name
     '''
     name: str
-    table: Table
+    table: Table = None
     old_name: str = ""
     new_col: Optional[Column] = None
     old_col_name: str = ""
@@ -1127,32 +1200,34 @@ class AlterTable(Table):
         if table.viewed:  # modifying tables breaks views
             return None
         
-        fn = random.choice([AlterTable.random_add, AlterTable.random_col_rename, AlterTable.random_tbl_rename])
+        fn = rng.choice([AlterTable.random_add, AlterTable.random_col_rename, AlterTable.random_tbl_rename])
         return fn(table)
         
     @staticmethod
     def random_add(table: "Table") -> "AlterTable":
         new_col = Column.random(param_prob={"unq_p":0.0})
-        modified_cols = copy.deepcopy(table.columns)
-        modified_cols.append(new_col)
+        modified_cols = table.columns + [new_col]
         return AlterTable(name=table.name, table=table, new_col=new_col, columns=modified_cols)
     
     def confirm_add(self):
         self.table.columns = self.columns
+        self.table.invalidate()
     
     @staticmethod
     def random_col_rename(table: "Table") -> "AlterTable":
         if table.viewed:
             return None
-        mod_cols = copy.deepcopy(table.columns)
-        idx = random.randrange(len(mod_cols))
-        mod_col = mod_cols[idx]
+        mod_cols = list(table.columns)
+        idx = rng.randrange(len(mod_cols))
+        mod_col = copy.copy(mod_cols[idx])
         old_col_name = mod_col.name
         mod_col.name = random_name("col")
+        mod_cols[idx] = mod_col
         return AlterTable(name=table.name, table=table, new_col=mod_col, old_col_name=old_col_name, columns=mod_cols, idx=idx)
     
     def confirm_rename(self):
-        self.table.columns[self.idx] = self.new_col
+        self.table.columns = self.columns # the list may be shared with other nodes
+        self.table.invalidate()
 
     
     @staticmethod
@@ -1162,12 +1237,11 @@ class AlterTable(Table):
         return AlterTable(name=random_name("atbl"), table=table, old_name=table.name, columns=table.columns)
     
     def mutate(self) -> "AlterTable":
-        alter_table = copy.deepcopy(self)
-        return AlterTable.random(alter_table)
+        return AlterTable.random(self)
         
 #----------------------------------------------------------------------------------------------------------------------------------------------------#
 
-@dataclass
+@dataclass(**NODE)
 class Insert(SQLNode):
     """
     INSERT [OR...] (cols) VAlUES values
@@ -1213,21 +1287,21 @@ class Insert(SQLNode):
             return None
         
         default = flip(prob["dft_p"]) and all(col.nullable for col in table.columns)
-        conflict_action = random.choice(["ROLLBACK", "ABORT", "FAIL", "IGNORE", "REPLACE"]) if flip(prob["conf_p"]) else None
+        conflict_action = rng.choice(["ROLLBACK", "ABORT", "FAIL", "IGNORE", "REPLACE"]) if flip(prob["conf_p"]) else None
         full = flip(prob["full_p"]) and not non_unique
         
         if default:
            return Insert(table=table, columns=[], values=[], conflict_action=conflict_action, default=True, full=True)
         
         cols = []
-        num_rows = random.randint(1,5)
+        num_rows = rng.randint(1,5)
         vals = [[] for _ in range(num_rows)]
         
         if full:
             sample_cols = table.columns
         else:
-            num_cols = random.randint(1, len(candidate_cols))
-            sample_cols = random.sample(candidate_cols, num_cols)
+            num_cols = rng.randint(1, len(candidate_cols))
+            sample_cols = rng.sample(candidate_cols, num_cols)
 
         for col in sample_cols:
             cols.append(col)
@@ -1243,16 +1317,17 @@ class Insert(SQLNode):
         return Insert(table=table, columns=cols, values=vals, conflict_action=conflict_action, default=default, full=full)
     
     def mutate(self) -> "Insert":
-        insert = copy.deepcopy(self)
-        mutation_type = random.choice(["change_val", "change_tbl", "toggle_full", "toggle_default"])
+        insert = copy.copy(self)
+        mutation_type = rng.choice(["change_val", "change_tbl", "toggle_full", "toggle_default"])
 
         if mutation_type == "change_tbl":
             insert.table = insert.table.mutate()
 
         elif mutation_type == "change_val" and insert.values and insert.columns:
-            row_idx = random.randint(0, len(insert.values) - 1)
-            col_idx = random.randint(0, len(insert.columns) - 1)
-            insert.values[row_idx][col_idx] = random_value(insert.columns[col_idx].dtype)
+            row_idx = rng.randint(0, len(insert.values) - 1)
+            col_idx = rng.randint(0, len(insert.columns) - 1)
+            insert.values = list(insert.values)
+            insert.values[row_idx] = insert.values[row_idx][:col_idx] + [random_value(insert.columns[col_idx].dtype)] + insert.values[row_idx][col_idx + 1:]
 
         elif mutation_type == "toggle_full":
             insert.full = not insert.full
@@ -1262,7 +1337,7 @@ class Insert(SQLNode):
 
         return insert
     
-@dataclass
+@dataclass(**NODE)
 class Update(SQLNode):
     """
     UPDATE table SET columns = values WHERE ... 
@@ -1295,8 +1370,8 @@ class Update(SQLNode):
         if not candidate_cols: #no non-unique columns, update likely to crash
             candidate_cols = col
         
-        num_cols = random.randint(1, len(candidate_cols))
-        sample_cols = random.sample(candidate_cols, num_cols)
+        num_cols = rng.randint(1, len(candidate_cols))
+        sample_cols = rng.sample(candidate_cols, num_cols)
         
         for col in sample_cols: 
             cols.append(col)
@@ -1310,15 +1385,15 @@ class Update(SQLNode):
     
     
     def mutate(self) -> "Update":
-        update = copy.deepcopy(self)
-        mutation_type = random.choice(["change_val", "change_tbl", "change_where", "toggle_where"])
+        update = copy.copy(self)
+        mutation_type = rng.choice(["change_val", "change_tbl", "change_where", "toggle_where"])
 
         if mutation_type == "change_tbl":
             update.table = update.table.mutate()
 
         elif mutation_type == "change_val" and update.columns:
-            col_idx = random.randint(0, len(update.columns) - 1)
-            update.values[col_idx] = random_value(update.columns[col_idx].dtype)
+            col_idx = rng.randint(0, len(update.columns) - 1)
+            update.values = update.values[:col_idx] + [random_value(update.columns[col_idx].dtype)] + update.values[col_idx + 1:]
 
         elif mutation_type == "change_where":
             update.where = update.where.mutate() if update.where else None
@@ -1328,7 +1403,7 @@ class Update(SQLNode):
 
         return update
     
-@dataclass   
+@dataclass(**NODE)
 class Delete(SQLNode):
     """
     DELETE FROM table WHERE ...
@@ -1352,8 +1427,8 @@ class Delete(SQLNode):
         return Delete(table=table, where=where)
     
     def mutate(self) -> "Delete":
-        delete = copy.deepcopy(self)
-        mutation_type = random.choice(["change_tbl", "change_where", "toggle_where"])
+        delete = copy.copy(self)
+        mutation_type = rng.choice(["change_tbl", "change_where", "toggle_where"])
 
         if mutation_type == "change_tbl":
             delete.table = delete.table.mutate()
@@ -1366,7 +1441,7 @@ class Delete(SQLNode):
 
         return delete
     
-@dataclass
+@dataclass(**NODE)
 class Replace(SQLNode):
     """
     REPLACE INTO table (cols) VALUES values
@@ -1410,14 +1485,14 @@ class Replace(SQLNode):
            return Replace(table=table, columns=[], values=[], default=True, full=True)
         
         cols = []
-        num_rows = random.randint(1,5)
+        num_rows = rng.randint(1,5)
         vals = [[] for _ in range(num_rows)]
         
         if full:
             sample_cols = table.columns
         else:
-            num_cols = random.randint(1, len(table.columns))
-            sample_cols = random.sample(table.columns, num_cols)
+            num_cols = rng.randint(1, len(table.columns))
+            sample_cols = rng.sample(table.columns, num_cols)
 
         for col in sample_cols:
             cols.append(col)
@@ -1433,16 +1508,17 @@ class Replace(SQLNode):
         return Replace(table=table, columns=cols, values=vals, default=default, full=full)
     
     def mutate(self) -> "Replace":
-        replace = copy.deepcopy(self)
-        mutation_type = random.choice(["change_val", "change_tbl", "toggle_full", "toggle_default"])
+        replace = copy.copy(self)
+        mutation_type = rng.choice(["change_val", "change_tbl", "toggle_full", "toggle_default"])
 
         if mutation_type == "change_tbl":
             replace.table = replace.table.mutate()
 
         elif mutation_type == "change_val" and replace.values and replace.columns:
-            row_idx = random.randint(0, len(replace.values) - 1)
-            col_idx = random.randint(0, len(replace.columns) - 1)
-            replace.values[row_idx][col_idx] = random_value(replace.columns[col_idx].dtype)
+            row_idx = rng.randint(0, len(replace.values) - 1)
+            col_idx = rng.randint(0, len(replace.columns) - 1)
+            replace.values = list(replace.values)
+            replace.values[row_idx] = replace.values[row_idx][:col_idx] + [random_value(replace.columns[col_idx].dtype)] + replace.values[row_idx][col_idx + 1:]
 
         elif mutation_type == "toggle_full":
             replace.full = not replace.full
@@ -1454,7 +1530,7 @@ class Replace(SQLNode):
     
 #----------------------------------------------------------------------------------------------------------------------------------------------------#
 
-@dataclass
+@dataclass(**NODE)
 class Join(SQLNode):
     '''
     table1 INNER/LEFT/CROSS JOIN table2 
@@ -1486,20 +1562,20 @@ class Join(SQLNode):
 
     @staticmethod
     def random(left: "Table", right: "Table", join_type: str = None) -> "Join":
-        left_cols = [c for c in left.columns if c.dtype in {"INTEGER", "TEXT"}]
-        right_cols = [c for c in right.columns if c.dtype in {"INTEGER", "TEXT"}]
+        left_cols = left.columns_of("INTEGER", "TEXT")
+        right_cols = right.columns_of("INTEGER", "TEXT")
 
         alias = left.name == right.name
             
         if not left_cols or not right_cols:
-            left_col = random.choice(left.columns)
-            right_col = random.choice(right.columns)
+            left_col = rng.choice(left.columns)
+            right_col = rng.choice(right.columns)
         else:
-            left_col = random.choice(left_cols)
-            right_col = random.choice(right_cols)
+            left_col = rng.choice(left_cols)
+            right_col = rng.choice(right_cols)
 
         if not join_type:
-            join_type = random.choice(["INNER", "LEFT", "CROSS"])
+            join_type = rng.choice(["INNER", "LEFT", "CROSS"])
             
         return Join(
             left_table=left,
@@ -1511,19 +1587,19 @@ class Join(SQLNode):
         )
     
     def mutate(self) -> "Join":
-        join = copy.deepcopy(self)
-        mutation_type = random.choice(["join_type", "columns", "left_table", "right_table", "toggle_alias"])
+        join = copy.copy(self)
+        mutation_type = rng.choice(["join_type", "columns", "left_table", "right_table", "toggle_alias"])
 
         if mutation_type == "join_type":
-            join.join_type = random.choice(["INNER", "LEFT", "CROSS"])
+            join.join_type = rng.choice(["INNER", "LEFT", "CROSS"])
 
         elif mutation_type == "columns":
-            left_cols = [c for c in join.left_table.columns if c.dtype in {"INTEGER", "TEXT"}]
-            right_cols = [c for c in join.right_table.columns if c.dtype in {"INTEGER", "TEXT"}]
+            left_cols = join.left_table.columns_of("INTEGER", "TEXT")
+            right_cols = join.right_table.columns_of("INTEGER", "TEXT")
             
             if left_cols and right_cols:
-                join.left_column = random.choice(left_cols)
-                join.right_column = random.choice(right_cols)
+                join.left_column = rng.choice(left_cols)
+                join.right_column = rng.choice(right_cols)
 
         elif mutation_type == "left_table":
             join.left_table = join.left_table.mutate()
@@ -1538,7 +1614,7 @@ class Join(SQLNode):
 
         return join
 
-@dataclass
+@dataclass(**NODE)
 class Select(SQLNode):
     """
     SELECT expressions [...];
@@ -1603,21 +1679,21 @@ class Select(SQLNode):
         elif flip(prob["cols_p"]): #option 2: only cols
             asterisk = False
             omit = False
-            num = sample if sample else random.randint(1, len(cols))
-            selected_cols = random.sample(cols, num)
+            num = sample if sample else rng.randint(1, len(cols))
+            selected_cols = rng.sample(cols, num)
             expressions = [f"{table.name}.{c.name}" for c in selected_cols] 
             
         elif flip(prob["omit_p"]): #option 3: only literals because omit (SELECT _ ;)
             asterisk = False
             omit = True
-            num = sample if sample else random.randint(1, 10)
+            num = sample if sample else rng.randint(1, 10)
             selected_cols = None
             expressions = [Expression.random(table, no_cols=True, param_prob=prob).sql() for _ in range(num)]
         
         else: #option 4 any expression
             asterisk = False
             omit = False
-            num = sample if sample else random.randint(1, 10)
+            num = sample if sample else rng.randint(1, 10)
             selected_cols = []
             if flip(prob["agg_p"]):
                 expressions = [Expression.random(table, agg=True, param_prob=prob).sql() for _ in range(num)]
@@ -1632,14 +1708,14 @@ class Select(SQLNode):
 
             
         where = Where.random(table, max_depth=3, param_prob=prob, other_tables=other_tables) if flip(prob["where_p"]) else None
-        group_by = random.sample(selected_cols, k=1) if selected_cols and flip(prob["grp_p"]) else None
-        order_by = random.sample(selected_cols, k=1) if selected_cols and flip(prob["ord_p"]) else None
-        limit = random.randint(1,20) if flip(prob["lmt_p"]) else None
-        offset = random.randint(1,20) if flip(prob["offst_p"]) and limit else None
+        group_by = rng.sample(selected_cols, k=1) if selected_cols and flip(prob["grp_p"]) else None
+        order_by = rng.sample(selected_cols, k=1) if selected_cols and flip(prob["ord_p"]) else None
+        limit = rng.randint(1,20) if flip(prob["lmt_p"]) else None
+        offset = rng.randint(1,20) if flip(prob["offst_p"]) and limit else None
         
         if other_tables and flip(prob["join_p"]):
             left = table
-            right = random.choice(other_tables)
+            right = rng.choice(other_tables)
             from_clause = Join.random(left, right)
             if left.name == right.name:
                 asterisk = True
@@ -1666,21 +1742,21 @@ class Select(SQLNode):
         )
     
     def mutate(self) -> "Select":
-        select = copy.deepcopy(self)
-        mutation_type = random.choice([
+        select = copy.copy(self)
+        mutation_type = rng.choice([
             "expressions", "toggle_where", "change_where", "group_by", "order_by", "limit", "offset",
             "from_clause", "toggle_asterisk", "toggle_omit"
         ])
 
         if mutation_type == "expressions" and not select.asterisk and not select.omit and select.columns:
-            col = random.choice(select.columns)
-            expr_type = random.choice(["simple", "agg", "literal"])
+            col = rng.choice(select.columns)
+            expr_type = rng.choice(["simple", "agg", "literal"])
             if expr_type == "simple":
-                select.expressions.append(f"{col.name}")
+                select.expressions = select.expressions + [f"{col.name}"]
             elif expr_type == "agg":
-                select.expressions.append(f"MAX({col.name})")
+                select.expressions = select.expressions + [f"MAX({col.name})"]
             else:
-                select.expressions.append(str(random.randint(1, 100)))
+                select.expressions = select.expressions + [str(rng.randint(1, 100))]
 
         elif mutation_type == "toggle_where" and select.columns:
             select.where = Where.random(select.from_clause if isinstance(select.from_clause, Table) else select.from_clause.left_table) if not select.where else None
@@ -1689,16 +1765,16 @@ class Select(SQLNode):
             select.where = select.where.mutate() if select.where else None
 
         elif mutation_type == "group_by" and select.columns:
-            select.group_by = random.sample(select.columns, k=min(1, len(select.columns)))
+            select.group_by = rng.sample(select.columns, k=min(1, len(select.columns)))
 
         elif mutation_type == "order_by" and select.columns:
-            select.order_by = random.sample(select.columns, k=min(1, len(select.columns)))
+            select.order_by = rng.sample(select.columns, k=min(1, len(select.columns)))
 
         elif mutation_type == "limit":
-            select.limit = random.randint(1, 100)
+            select.limit = rng.randint(1, 100)
 
         elif mutation_type == "offset" and select.limit:
-            select.offset = random.randint(1, 50)
+            select.offset = rng.randint(1, 50)
 
         elif mutation_type == "from_clause":
             select.from_clause = select.from_clause.mutate()
@@ -1711,7 +1787,7 @@ class Select(SQLNode):
 
         return select
         
-@dataclass
+@dataclass(**NODE)
 class With(SQLNode):
     '''
     WITH name AS (
@@ -1745,34 +1821,36 @@ class With(SQLNode):
             "*_p":prob["*_with_p"],
         })
         recursive = flip(prob["rec_p"])
-        num = random.randint(1,3)
+        num = rng.randint(1,3)
         with_names = [random_name("with") for _ in range(num)]
         with_tables = [Table(with_name, table.columns) for with_name in with_names]
-        inner_selects = [Select.random(random.choice([table] + with_tables[:i]), param_prob=prob) for i in range(num)]
+        inner_selects = [Select.random(rng.choice([table] + with_tables[:i]), param_prob=prob) for i in range(num)]
         
-        idx = random.randint(0, num-1)
+        idx = rng.randint(0, num-1)
         cols = inner_selects[idx].columns
         w_table = with_tables[idx]
         if flip(prob["select_p"]) or isinstance(table, View):
             main_query = Select.random(w_table, param_cols=cols, param_prob=prob)
         else:
-            fn = random.choice([Delete.random, Insert.random, Replace.random, Update.random])
+            fn = rng.choice([Delete.random, Insert.random, Replace.random, Update.random])
             main_query = fn(table, param_prob=prob)
         
         return With(names=with_names, querys=inner_selects, main_query=main_query, recursive=recursive)
     
     def mutate(self) -> "With":
-        w = copy.deepcopy(self)
-        mutation_type = random.choice([
+        w = copy.copy(self)
+        mutation_type = rng.choice([
             "rename", "change_inner", "change_main", "toggle_recursive", "add_cte", "remove_cte"
         ])
 
         if mutation_type == "rename":
-            idx = random.randrange(len(w.names))
-            w.names[idx] += f"_{random.choice(['x', 'tmp', 'v2'])}"
+            idx = rng.randrange(len(w.names))
+            w.names = list(w.names)
+            w.names[idx] += f"_{rng.choice(['x', 'tmp', 'v2'])}"
             
         elif mutation_type == "change_inner" and w.querys:
-            idx = random.randrange(0, len(w.querys))
+            idx = rng.randrange(0, len(w.querys))
+            w.querys = list(w.querys)
             w.querys[idx] = w.querys[idx].mutate()
 
         elif mutation_type == "change_main":
@@ -1783,28 +1861,28 @@ class With(SQLNode):
 
         elif mutation_type == "add_cte" and w.querys:
             new_name = random_name("with")
-            new_query = random.choice(w.querys).mutate()
-            w.names.append(new_name)
-            w.querys.append(new_query)
+            new_query = rng.choice(w.querys).mutate()
+            w.names = w.names + [new_name]
+            w.querys = w.querys + [new_query]
 
         elif mutation_type == "remove_cte" and len(w.names) > 1:
-            idx = random.randrange(len(w.names))
-            del w.names[idx]
-            del w.querys[idx]
+            idx = rng.randrange(len(w.names))
+            w.names = w.names[:idx] + w.names[idx + 1:]
+            w.querys = w.querys[:idx] + w.querys[idx + 1:]
 
         return w
     
 #----------------------------------------------------------------------------------------------------------------------------------------------------#
 
-@dataclass
+@dataclass(**NODE)
 class View(Table):
     '''
     CREATE VIEW name AS SELECT ... 
     '''
     name: str
-    select: Select
+    select: Select = None
     columns: List[Column]
-    temp: bool
+    temp: bool = False
 
     def sql(self) -> str:
         return f"CREATE {'TEMP ' if self.temp else ''}VIEW {self.name} AS {self.select.sql()}"
@@ -1824,16 +1902,16 @@ class View(Table):
         temp = flip(prob["tmp_p"])
         view_name = random_name("view")
         
-        select = Select.random(table, other_tables=other_tables, sample=random.randint(1, len(table.columns)), param_prob=prob)
+        select = Select.random(table, other_tables=other_tables, sample=rng.randint(1, len(table.columns)), param_prob=prob)
 
         return View(name=view_name, columns=select.columns, select=select, temp=temp)
     
     def mutate(self) -> "View":
-        view = copy.deepcopy(self)
-        mutation_type = random.choice(["rename", "toggle_temp", "change_select", "change_col"])
+        view = copy.copy(self)
+        mutation_type = rng.choice(["rename", "toggle_temp", "change_select", "change_col"])
 
         if mutation_type == "rename":
-            view.name += f"_{random.choice(['v2', 'x', 'tmp'])}"
+            view.name += f"_{rng.choice(['v2', 'x', 'tmp'])}"
 
         elif mutation_type == "toggle_temp":
             view.temp = not view.temp
@@ -1842,19 +1920,18 @@ class View(Table):
             view.select = view.select.mutate()
 
         elif mutation_type == "change_col" and view.columns:
-            col = random.choice(view.columns)
-            col.mutate()
+            view.columns = mutate_random_column(view.columns)
 
         return view
 
-@dataclass
+@dataclass(**NODE)
 class VirtualTable(Table):
     """
     CREATE VIRTUAL TABLE table USING ... [(cols)]
     """
     name: str
     columns: List[Column]
-    vtype: str
+    vtype: str = ""
     viewed: bool = True 
 
     def sql(self) -> str:
@@ -1864,10 +1941,10 @@ class VirtualTable(Table):
             return f"CREATE VIRTUAL TABLE {self.name} USING {self.vtype}({', '.join([c.name for c in self.columns])})"
     
     def random() -> "VirtualTable":
-        vtype = random.choice(VIRTUAL["types"])
+        vtype = rng.choice(VIRTUAL["types"])
         col_names = VIRTUAL[vtype]
         if vtype == "fts4": 
-            cols = random.randint(2, 6)
+            cols = rng.randint(2, 6)
             columns = [Column(name=random_name("fts_col"), dtype="TEXT") for _ in range(cols)]
         else:
             columns = []
@@ -1880,17 +1957,16 @@ class VirtualTable(Table):
         return VirtualTable(name=random_name(vtype), columns=columns, vtype=vtype)
     
     def mutate(self) -> "VirtualTable":
-        vt = copy.deepcopy(self)
-        mutation_type = random.choice([
+        vt = copy.copy(self)
+        mutation_type = rng.choice([
             "rename", "change_col", "toggle_viewed"
         ])
 
         if mutation_type == "rename":
-            vt.name += f"_{random.choice(['v2', 'alt', 'x'])}"
+            vt.name += f"_{rng.choice(['v2', 'alt', 'x'])}"
 
         elif mutation_type == "change_col" and vt.vtype == "fts4" and vt.columns:
-            col = random.choice(vt.columns)
-            col.mutate()
+            vt.columns = mutate_random_column(vt.columns)
 
         elif mutation_type == "toggle_viewed":
             vt.viewed = not vt.viewed
@@ -1898,7 +1974,7 @@ class VirtualTable(Table):
         return vt
 
 
-@dataclass
+@dataclass(**NODE)
 class Index(SQLNode):
     '''
     CREATE (UNIQUE) INDEX name ON table (idx_columns) WHERE ...
@@ -1934,27 +2010,27 @@ class Index(SQLNode):
           
         name = random_name("idx")
         col_names = table.get_col_names()
-        num_cols = random.randint(1, min(len(col_names), 3))
-        cols = random.sample(col_names, num_cols)
+        num_cols = rng.randint(1, min(len(col_names), 3))
+        cols = rng.sample(col_names, num_cols)
         unique = flip(prob["uniq_p"])
         where = Where.random(table, no_sub=True, param_prob=prob) if flip(prob["where_p"]) else None
         return Index(name=name, table=table.name, columns=cols, unique=unique, where=where)
     
     def mutate(self, table: Optional["Table"] = None) -> "Index":
-        idx = copy.deepcopy(self)
-        mutation_type = random.choice(["rename", "toggle_unique", "change_col", "change_where", "toggle_where"])
+        idx = copy.copy(self)
+        mutation_type = rng.choice(["rename", "toggle_unique", "change_col", "change_where", "toggle_where"])
 
         if mutation_type == "rename":
-            idx.name += f"_{random.choice(['v2', 'alt', 'x'])}"
+            idx.name += f"_{rng.choice(['v2', 'alt', 'x'])}"
 
         elif mutation_type == "toggle_unique":
             idx.unique = not idx.unique
 
-        elif mutation_type == "change_col" and table is not None and col_names:
+        elif mutation_type == "change_col" and table is not None:
             col_names = table.get_col_names()
             if col_names:
-                num_cols = random.randint(1, min(len(col_names), 3))
-                idx.columns = random.sample(col_names, num_cols)
+                num_cols = rng.randint(1, min(len(col_names), 3))
+                idx.columns = rng.sample(col_names, num_cols)
 
         elif mutation_type == "change_where":
             idx.where = idx.where.mutate() if idx.where else None
@@ -1964,7 +2040,7 @@ class Index(SQLNode):
 
         return idx
     
-@dataclass
+@dataclass(**NODE)
 class Trigger(SQLNode):
     '''
     CREATE TRIGGER name BEFORE/AFTER INSERT/UPDATE/DELETE ON table
@@ -2017,18 +2093,18 @@ class Trigger(SQLNode):
         name = random_name("trg")
         temp = flip(prob["temp_p"])
         nexists = flip(prob["nex_p"])
-        timing = random.choice(["BEFORE", "AFTER"])
-        event = random.choice(["INSERT", "UPDATE", "DELETE"])
+        timing = rng.choice(["BEFORE", "AFTER"])
+        event = rng.choice(["INSERT", "UPDATE", "DELETE"])
         cols = None
         if event == "UPDATE" and flip(prob["upcol_p"]):
-            num_cols = random.randint(1, len(table.columns))
-            sample_cols = random.sample(table.columns, num_cols)
+            num_cols = rng.randint(1, len(table.columns))
+            sample_cols = rng.sample(table.columns, num_cols)
             cols = [col.name for col in sample_cols]
         when = Where.random(table, max_depth=3, param_prob=prob) if flip(prob["where_p"]) else None
         foreach = flip(prob["feac_p"])
 
         statements = []
-        for _ in range(random.randint(1, 3)):
+        for _ in range(rng.randint(1, 3)):
             if flip(0.25):
                 statements.append(Select.random(table, param_prob=prob).sql()+";")
                 continue
@@ -2046,14 +2122,14 @@ class Trigger(SQLNode):
         return Trigger(name=name, temp=temp, nexists=nexists, timing=timing, event=event, cols=cols, table=table, foreach=foreach, when=when, statements=statements)
 
     def mutate(self) -> "Trigger":
-        trg = copy.deepcopy(self)
-        mutation_type = random.choice([
+        trg = copy.copy(self)
+        mutation_type = rng.choice([
             "rename", "toggle_temp", "toggle_nexists", "toggle_foreach",
             "change_timing", "change_event"
         ])
 
         if mutation_type == "rename":
-            trg.name += f"_{random.choice(['v2', 'alt', 'x'])}"
+            trg.name += f"_{rng.choice(['v2', 'alt', 'x'])}"
 
         elif mutation_type == "toggle_temp":
             trg.temp = not trg.temp
@@ -2068,7 +2144,7 @@ class Trigger(SQLNode):
             trg.timing = "AFTER" if trg.timing == "BEFORE" else "BEFORE"
 
         elif mutation_type == "change_event":
-            trg.event = random.choice([e for e in ["INSERT", "UPDATE", "DELETE"] if e != trg.event])
+            trg.event = rng.choice([e for e in ["INSERT", "UPDATE", "DELETE"] if e != trg.event])
 
         #elif mutation_type == "mutate_when":
         #    trg.when = Where.random(trg.table)
@@ -2077,7 +2153,7 @@ class Trigger(SQLNode):
 
 #----------------------------------------------------------------------------------------------------------------------------------------------------#  
 
-@dataclass
+@dataclass(**NODE)
 class DropTable(SQLNode):
     """
     DROP [TABLE, VIEW,...] [IF EXISTS] name
@@ -2100,7 +2176,7 @@ class DropTable(SQLNode):
         
         if if_exists and flip(prob["fktbl_p"]):
             fake_name = random_name(prefix="faketable")
-            fake_type = random.choice(["TABLE", "TRIGGER", "VIEW", "INDEX"])
+            fake_type = rng.choice(["TABLE", "TRIGGER", "VIEW", "INDEX"])
             return DropTable(table_name=fake_name, if_exists=True, table_type=fake_type, fake_table=True)
         
         if isinstance(table, Trigger):
@@ -2116,7 +2192,7 @@ class DropTable(SQLNode):
         
 #----------------------------------------------------------------------------------------------------------------------------------------------------#  
 
-@dataclass
+@dataclass(**NODE)
 class Pragma(SQLNode):
     '''
     PRAGMA ...
@@ -2134,36 +2210,36 @@ class Pragma(SQLNode):
     @staticmethod
     def random() -> "Pragma":
         pragmas = [
-            ("foreign_keys", random.choice(["ON", "OFF"])),
-            ("cache_size", str(random.randint(5000, 100000))),
-            ("journal_mode", random.choice(["DELETE", "TRUNCATE", "PERSIST", "WAL", "MEMORY"])),
-            ("synchronous", random.choice(["0", "1", "2"])),  # OFF, NORMAL, FULL
-            ("temp_store", random.choice(["DEFAULT", "FILE", "MEMORY"])),
-            ("locking_mode", random.choice(["NORMAL", "EXCLUSIVE"])),
-            ("mmap_size", str(random.randint(10000000, 100000000))),
-            ("analysis_limit", str(random.randint(1, 20))),
-            ("automatic_index", random.choice(["True", "False"])),
-            ("busy_timeout", str(random.randint(1000, 10000))),
+            ("foreign_keys", rng.choice(["ON", "OFF"])),
+            ("cache_size", str(rng.randint(5000, 100000))),
+            ("journal_mode", rng.choice(["DELETE", "TRUNCATE", "PERSIST", "WAL", "MEMORY"])),
+            ("synchronous", rng.choice(["0", "1", "2"])),  # OFF, NORMAL, FULL
+            ("temp_store", rng.choice(["DEFAULT", "FILE", "MEMORY"])),
+            ("locking_mode", rng.choice(["NORMAL", "EXCLUSIVE"])),
+            ("mmap_size", str(rng.randint(10000000, 100000000))),
+            ("analysis_limit", str(rng.randint(1, 20))),
+            ("automatic_index", rng.choice(["True", "False"])),
+            ("busy_timeout", str(rng.randint(1000, 10000))),
             ("collation_list", ""),
             ("database_list", ""),
-            ("encoding", random.choice(["", "\'UTF-8\'", "\'UTF-16\'", "\'UTF-16le\'", "\'UTF-16be\'"])),
+            ("encoding", rng.choice(["", "\'UTF-8\'", "\'UTF-16\'", "\'UTF-16le\'", "\'UTF-16be\'"])),
             ("function_list", ""),
-            ("recursive_triggers", random.choice(["ON", "OFF"])),
-            ("case_sensitive_like", random.choice(["ON", "OFF"])),
-            ("secure_delete", random.choice(["0", "1"])),
-            ("page_size", str(random.choice([1024, 2048, 4096, 8192]))),
-            ("max_page_count", str(random.randint(1000, 100000))),
-            ("user_version", str(random.randint(0, 4294967295))),
-            ("schema_version", str(random.randint(0, 4294967295))),
-            ("wal_autocheckpoint", str(random.randint(0, 1000))),
-            ("journal_size_limit", str(random.randint(0, 104857600))),
-            ("reverse_unordered_selects", random.choice(["ON", "OFF"])),
+            ("recursive_triggers", rng.choice(["ON", "OFF"])),
+            ("case_sensitive_like", rng.choice(["ON", "OFF"])),
+            ("secure_delete", rng.choice(["0", "1"])),
+            ("page_size", str(rng.choice([1024, 2048, 4096, 8192]))),
+            ("max_page_count", str(rng.randint(1000, 100000))),
+            ("user_version", str(rng.randint(0, 4294967295))),
+            ("schema_version", str(rng.randint(0, 4294967295))),
+            ("wal_autocheckpoint", str(rng.randint(0, 1000))),
+            ("journal_size_limit", str(rng.randint(0, 104857600))),
+            ("reverse_unordered_selects", rng.choice(["ON", "OFF"])),
         ]
 
-        name, value = random.choice(pragmas)
+        name, value = rng.choice(pragmas)
         return Pragma(name=name, value=value)
     
-@dataclass
+@dataclass(**NODE)
 class TransactionControl(SQLNode):
     """
     Tansactions controls in SQL
@@ -2183,12 +2259,12 @@ class TransactionControl(SQLNode):
             prob.update(param_prob)
         
         if not transaction_active:
-            statement = random.choice(["BEGIN","BEGIN TRANSACTION"])
+            statement = rng.choice(["BEGIN","BEGIN TRANSACTION"])
             return TransactionControl(statement=statement, transaction_active=True)
         
         if flip(prob["rollback_p"]):
             if flip() and save_points:
-                return TransactionControl(statement=f"ROLLBACK TO {random.choice(save_points)}", transaction_active=False)
+                return TransactionControl(statement=f"ROLLBACK TO {rng.choice(save_points)}", transaction_active=False)
             return TransactionControl(statement="ROLLBACK", transaction_active=False)
         
         if flip(prob["save_p"]):
@@ -2196,12 +2272,12 @@ class TransactionControl(SQLNode):
             return TransactionControl(statement=f"SAVEPOINT {save_name}", transaction_active=True, save_name=save_name)
         
         if save_points and flip(prob["release_p"]):
-            save_name = random.choice(save_points)
+            save_name = rng.choice(save_points)
             return TransactionControl(statement=f"RELEASE SAVEPOINT {save_name}", transaction_active=True, release=save_name)
         
         return TransactionControl(statement="COMMIT", transaction_active=False)
 
-@dataclass
+@dataclass(**NODE)
 class Optimization(SQLNode):
     """
     Optimization statements in SQL
@@ -2213,7 +2289,7 @@ class Optimization(SQLNode):
     
     @staticmethod
     def random(table: "Table"):
-        statement = random.choice([
+        statement = rng.choice([
             "ANALYZE", 
             "VACUUM", 
             "REINDEX", 
@@ -2224,21 +2300,177 @@ class Optimization(SQLNode):
     
 #----------------------------------------------------------------------------------------------------------------------------------------------------#
 
-def randomQueryGen(query: Optional[List[str]] = None, param_prob: Dict[str, float] = None, debug: bool = False, 
-                   cycle: int = 3, context: Optional[List[Table]] = None) -> tuple[List[str], List[Table]]:
+class IndexedSet:
     """
-    Randomly generates the entire query, keeping track of the tables to pass as arguments.
-    
+    List of distinct nodes with a position index, so append, remove, `in` and rng.choice
+    are O(1). remove() moves the last node into the gap, the order is not kept.
+    """
+    __slots__ = ("items", "pos")
+
+    def __init__(self, items: Iterable[Any] = ()):
+        self.items: List[Any] = []
+        self.pos: Dict[int, int] = {} # id(node) -> index in items, nodes are not hashable
+        for item in items:
+            self.append(item)
+
+    def append(self, item: Any):
+        if id(item) not in self.pos:
+            self.pos[id(item)] = len(self.items)
+            self.items.append(item)
+
+    def remove(self, item: Any):
+        idx = self.pos.pop(id(item)) # KeyError like list.remove's ValueError
+        last = self.items.pop()
+        if last is not item:
+            self.items[idx] = last
+            self.pos[id(last)] = idx
+
+    def discard(self, item: Any) -> bool:
+        if id(item) in self.pos:
+            self.remove(item)
+            return True
+        return False
+
+    def __contains__(self, item: Any) -> bool:
+        return id(item) in self.pos
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __getitem__(self, idx):
+        return self.items[idx]
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self.items)
+
+    def __getstate__(self) -> List[Any]:
+        return self.items
+
+    def __setstate__(self, items: List[Any]): # ids change when unpickled
+        self.items, self.pos = [], {}
+        for item in items:
+            self.append(item)
+
+class SchemaContext:
+    """
+    Schema of the generated database: tables, views, indexes and triggers in IndexedSets,
+    every object by name and the names of tables a view depends on. Lookups, choices and
+    drops do not scan the schema, so their cost does not grow with the number of tables.
+
+    It also acts as the list of tables it replaces (len, [i], in, append, remove), so it
+    can be passed as other_tables and to the Fuzzing stages.
+    """
+    def __init__(self, tables: Iterable[Table] = ()):
+        self.tables = IndexedSet()
+        self.views = IndexedSet()
+        self.indexes = IndexedSet()
+        self.triggers = IndexedSet()
+        self.names: Dict[str, SQLNode] = {}
+        self.viewed: set[str] = set()
+        for table in tables:
+            self.add_table(table)
+
+    def _add(self, group: IndexedSet, node: SQLNode):
+        group.append(node)
+        self.names[node.name] = node
+        if getattr(node, "viewed", False):
+            self.viewed.add(node.name)
+
+    def add_table(self, table: Table):
+        self._add(self.tables, table)
+
+    def add_view(self, view: "View"):
+        self._add(self.views, view)
+
+    def add_index(self, index: "Index"):
+        self._add(self.indexes, index)
+
+    def add_trigger(self, trigger: "Trigger"):
+        self._add(self.triggers, trigger)
+
+    def remove(self, node: SQLNode):
+        '''
+        Removes a dropped or renamed table, view, index or trigger
+        '''
+        if not any(group.discard(node) for group in (self.tables, self.views, self.indexes, self.triggers)):
+            raise ValueError(f"{node.name} is not in the schema")
+        if self.names.get(node.name) is node:
+            del self.names[node.name]
+
+    def rename(self, table: Table, renamed: Table):
+        self.remove(table)
+        self.add_table(renamed)
+
+    def mark_viewed(self, table: Table):
+        table.viewed = True # flags table so that we dont modify it
+        self.viewed.add(table.name)
+
+    def get(self, name: str) -> Optional[SQLNode]:
+        return self.names.get(name)
+
+    def choice(self, *groups: IndexedSet) -> SQLNode:
+        '''
+        Uniform choice over the union of the groups without concatenating them
+        '''
+        idx = rng.randrange(sum(len(group) for group in groups))
+        for group in groups:
+            if idx < len(group):
+                return group[idx]
+            idx -= len(group)
+
+    # list of tables
+    append = add_table
+
+    def __contains__(self, node: SQLNode) -> bool:
+        return node in self.tables
+
+    def __len__(self) -> int:
+        return len(self.tables)
+
+    def __getitem__(self, idx):
+        return self.tables[idx]
+
+    def __iter__(self) -> Iterator[Table]:
+        return iter(self.tables)
+
+#----------------------------------------------------------------------------------------------------------------------------------------------------#
+
+def iterQueryGen(param_prob: Dict[str, float] = None, debug: bool = False, cycle: int = 3,
+                 context: Optional[Union[SchemaContext, List[Table]]] = None, stream: Optional[RandomStream] = None) -> Iterator[str]:
+    """
+    Yields the statements of randomQueryGen one by one, as soon as each is generated.
+    A SchemaContext is updated in place (a list of tables is indexed into a new one) and
+    the final schema is the generator's return value.
+
     Args:
-        prob (Dict[str, float]): Dictionary with probabilities of generating each query type
+        param_prob (Dict[str, float]): Dictionary with probabilities of generating each query type
         debug (bool, optional): helps debugging. Defaults to False.
         cycle (int, optional): number of iterations. Defaults to 3.
-        context (Table): table context to add to query. Defaults to None
+        context (SchemaContext): schema to add the query to. Defaults to None
+        stream (RandomStream): batched random numbers used instead of the random module while generating. Defaults to None
 
-    Returns:
-        str: the string of the entire query generated
-        
+    Yields:
+        str: the next statement, terminated by ";"
     """
+    global rng
+    statements = _iterQueryGen(param_prob, debug, cycle, context)
+    while True:
+        if stream is not None: # only while this generator runs, the caller keeps its own rng
+            previous, rng = rng, stream
+        try:
+            statement = next(statements)
+        except StopIteration as stop:
+            return stop.value
+        finally:
+            if stream is not None:
+                rng = previous
+        yield statement
+
+def _iterQueryGen(param_prob: Dict[str, float] = None, debug: bool = False, cycle: int = 3,
+                  context: Optional[Union[SchemaContext, List[Table]]] = None) -> Iterator[str]:
+    '''
+    Generator behind iterQueryGen, draws from the module rng
+    '''
     prob = {   
         "table"  :  0.3,
         "init_ins": 1.0,
@@ -2265,104 +2497,96 @@ def randomQueryGen(query: Optional[List[str]] = None, param_prob: Dict[str, floa
     if param_prob is not None:
         prob.update(param_prob)
     
-    if query is None:
-        query = []
-    if context is None:
-        context = []
-        
-    tables = context
-    if not context:
+    schema = context if isinstance(context, SchemaContext) else SchemaContext(context or [])
+    tables = schema.tables
+    if not tables:
         table = Table.random(param_prob=prob)
-        tables.append(table)
-        query.append(table.sql() + ";")
+        schema.add_table(table)
+        yield table.sql() + ";"
         if flip(prob["init_ins"]):
             for _ in range(1):
                 insert = Insert.random(table, param_prob=prob)
-                query.append(insert.sql() + ";")
+                yield insert.sql() + ";"
             
-    views = []
-    triggers = []
-    indexes = []
     transaction_active = False
     save_points = []
     for _ in range(cycle):
         try:
             if flip(prob["pragma"]) or debug:
                 pragma = Pragma.random()
-                query.append(pragma.sql() + ";")
+                yield pragma.sql() + ";"
                 
-            if flip(prob["table"]) or tables == [] or debug:
+            if flip(prob["table"]) or not tables or debug:
                 new_table = Table.random()
-                tables.append(new_table)
-                query.append(new_table.sql() + ";")
+                schema.add_table(new_table)
+                yield new_table.sql() + ";"
                 for i in range(1):
                     insert = Insert.random(new_table, param_prob=prob)
-                    query.append(insert.sql() + ";")
+                    yield insert.sql() + ";"
                     
-            table = random.choice(tables)
+            table = rng.choice(tables)
                 
             if flip(prob["insert"]) or debug:
                 insert = Insert.random(table, param_prob=prob)
-                query.append(insert.sql() + ";")
+                yield insert.sql() + ";"
             if flip(prob["replace"]) or debug:
                 replace = Replace.random(table, param_prob=prob)
-                query.append(replace.sql() + ";")
+                yield replace.sql() + ";"
             if flip(prob["update"]) or debug:
                 update = Update.random(table, param_prob=prob)
                 if update:
-                    query.append(update.sql() + ";")
+                    yield update.sql() + ";"
             if flip(prob["delete"]) or debug:
                 delete = Delete.random(table, param_prob=prob)
-                query.append(delete.sql() + ";")
+                yield delete.sql() + ";"
                 
-            if flip(prob["alt_ren"]) or debug and not table.viewed:
+            if flip(prob["alt_ren"]) or debug and table.name not in schema.viewed:
                 new_table = AlterTable.random_tbl_rename(table)
                 if new_table:
-                    tables.remove(table) # renamed table -> table does not exist
-                    tables.append(new_table)
-                    query.append(new_table.sql() + ";")
-                    table = random.choice(tables)
-            if flip(prob["alt_add"]) or debug and not table.viewed:
+                    schema.rename(table, new_table) # renamed table -> table does not exist
+                    yield new_table.sql() + ";"
+                    table = rng.choice(tables)
+            if flip(prob["alt_add"]) or debug and table.name not in schema.viewed:
                 new_table = AlterTable.random_add(table)
                 if new_table:
                     new_table.confirm_add()
-                    query.append(new_table.sql() + ";")
-            if flip(prob["alt_col"]) or debug and not table.viewed:
+                    yield new_table.sql() + ";"
+            if flip(prob["alt_col"]) or debug and table.name not in schema.viewed:
                 new_table = AlterTable.random_col_rename(table)
                 if new_table:
                     new_table.confirm_rename()
-                    query.append(new_table.sql() + ";")
+                    yield new_table.sql() + ";"
             
             if flip(prob["index"]) or debug:
                 index = Index.random(table, param_prob=prob)
                 if index:
-                    indexes.append(index)
-                    query.append(index.sql() + ";")
+                    schema.add_index(index)
+                    yield index.sql() + ";"
             if flip(prob["trigger"]) or debug:
                 trigger = Trigger.random(table, param_prob=prob)
-                triggers.append(trigger)
-                query.append(trigger.sql() + ";")
+                schema.add_trigger(trigger)
+                yield trigger.sql() + ";"
             if flip(prob["vtable"]) or debug:
                 vtable = VirtualTable.random()
-                query.append(vtable.sql() + ";")
+                yield vtable.sql() + ";"
             
-            table = random.choice(tables + views)
+            table = schema.choice(tables, schema.views)
             if flip(prob["view"]) or debug:
-                table.viewed = True #flags table so that we dont modify it
+                schema.mark_viewed(table)
                 view = View.random(table, param_prob=prob)
-                views.append(view)
-                query.append(view.sql() + ";")
+                schema.add_view(view)
+                yield view.sql() + ";"
                 
             if flip(prob["with"]) or debug:
                 with_ = With.random(table, param_prob=prob)
-                query.append(with_.sql() + ";")
+                yield with_.sql() + ";"
             
             if flip(prob["select1"]) or debug:
                 select = Select.random(table, param_prob=prob)
-                query.append(select.sql() + ";")
+                yield select.sql() + ";"
             if (flip(prob["select2"]) and len(tables) > 1) or debug:
                 select2 = Select.random(table, other_tables=tables, param_prob=prob)
-                query.append(select2.sql() + ";")
+                yield select2.sql() + ";"
                 
             if flip(prob["control"]) or debug:
                 transaction = TransactionControl.random(transaction_active=transaction_active, save_points=save_points, param_prob=prob)
@@ -2371,34 +2595,73 @@ def randomQueryGen(query: Optional[List[str]] = None, param_prob: Dict[str, floa
                     save_points.append(transaction.save_name)
                 if transaction.release:
                     save_points.remove(transaction.release)
-                query.append(transaction.sql() + ";")
+                yield transaction.sql() + ";"
                 
             if (flip(prob["optimize"]) or debug) and not transaction_active:
                 optimization = Optimization.random(table)
-                query.append(optimization.sql() + ";")
+                yield optimization.sql() + ";"
                 
             if flip(prob["drop_tbl"]):
-                table = random.choice(tables + views + triggers + indexes)
-                if getattr(table, "viewed", False):
+                table = schema.choice(tables, schema.views, schema.triggers, schema.indexes)
+                if table.name in schema.viewed:
                     continue
                 droptable = DropTable.random(table, param_prob=prob)
-                query.append(droptable.sql() + ";")
+                yield droptable.sql() + ";"
                 if not droptable.fake_table:
-                    if droptable.table_type == "VIEW":
-                        views.remove(table)
-                    elif droptable.table_type == "TRIGGER":
-                        triggers.remove(table)
-                    elif droptable.table_type == "INDEX":
-                        indexes.remove(table)
-                    else:
-                        tables.remove(table)
+                    schema.remove(table)
                 
         
         except Exception as e:
             continue
 
+    return schema
+
+def randomQueryGen(query: Optional[List[str]] = None, param_prob: Dict[str, float] = None, debug: bool = False, 
+                   cycle: int = 3, context: Optional[Union[SchemaContext, List[Table]]] = None, stream: Optional[RandomStream] = None,
+                   sink: Optional[StatementSink] = None) -> tuple[List[str], SchemaContext]:
+    """
+    Randomly generates the entire query, keeping track of the tables to pass as arguments.
+    
+    Args:
+        prob (Dict[str, float]): Dictionary with probabilities of generating each query type
+        debug (bool, optional): helps debugging. Defaults to False.
+        cycle (int, optional): number of iterations. Defaults to 3.
+        context (SchemaContext): schema to add the query to. Defaults to None
+        stream (RandomStream): batched random numbers used instead of the random module for this call. Defaults to None
+        sink (StatementSink): receives every statement as it is generated instead of the query list. Defaults to None
+
+    Returns:
+        str: the string of the entire query generated
+        
+    """
+    if query is None:
+        query = []
+    tables = context if isinstance(context, SchemaContext) else SchemaContext(context or [])
+    statements = iterQueryGen(param_prob, debug, cycle, tables, stream)
+    if sink is None:
+        query.extend(statements)
+    else:
+        for statement in statements:
+            sink(statement)
     return query, tables
         
+def regenerate(seed: int, worker: int, index: int, param_prob: Dict[str, float] = None, cycle: int = 3) -> List[str]:
+    """
+    Regenerates one query group of a seeded campaign (evaluation/parallelized_gen.py).
+
+    Args:
+        seed (int): campaign seed
+        worker (int): worker that generated the group
+        index (int): position of the group in the worker's output
+        param_prob (Dict[str, float], optional): probabilities of the campaign. Defaults to None.
+        cycle (int, optional): cycle of the campaign. Defaults to 3.
+
+    Returns:
+        List[str]: the statements of the group
+    """
+    stream = RandomStream(group_seed(seed, worker, index), block=GROUP_BLOCK)
+    return randomQueryGen(param_prob=param_prob, cycle=cycle, stream=stream)[0]
+
 if __name__ == "__main__":
     print(randomQueryGen(debug=False, cycle=1))
 
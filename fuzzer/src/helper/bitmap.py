@@ -0,0 +1,73 @@
+import numpy as np
+
+class CoverageBitmap:
+    """
+    Global set of covered lines/branches as a packed bit array (see GcovReader.bits).
+    A run is interesting if it sets a bit that is not in the bitmap yet.
+    """
+    def __init__(self, size: int = 0):
+        self.size = size
+        self.bits = np.zeros((size + 7) // 8, dtype=np.uint8)
+
+    def _fit(self, bits: np.ndarray):
+        if len(bits) > len(self.bits): # sized by the first run
+            self.bits = np.concatenate([self.bits, np.zeros(len(bits) - len(self.bits), dtype=np.uint8)])
+            self.size = len(self.bits) * 8
+
+    def has_new(self, bits: np.ndarray) -> bool:
+        '''
+        True if bits covers anything the bitmap does not
+        '''
+        if bits is None:
+            return False
+        self._fit(bits)
+        return bool(np.any(bits & ~self.bits[:len(bits)]))
+
+    def new_bits(self, bits: np.ndarray) -> int:
+        if bits is None:
+            return 0
+        self._fit(bits)
+        return int(np.unpackbits(bits & ~self.bits[:len(bits)]).sum())
+
+    def new_indices(self, bits: np.ndarray) -> np.ndarray:
+        '''
+        Positions of the bits that are not in the bitmap yet, a sparse record of what a run found
+        '''
+        if bits is None:
+            return np.zeros(0, dtype=np.uint32)
+        self._fit(bits)
+        return np.flatnonzero(np.unpackbits(bits & ~self.bits[:len(bits)])).astype(np.uint32)
+
+    def set_indices(self, indices: np.ndarray) -> int:
+        '''
+        Sets the bits at the positions (see new_indices), returns the number that were not set
+        '''
+        if indices is None or not len(indices):
+            return 0
+        self._fit(np.zeros(int(indices.max()) // 8 + 1, dtype=np.uint8))
+        unpacked = np.unpackbits(self.bits)
+        new = int(len(indices) - unpacked[indices].sum())
+        if new:
+            unpacked[indices] = 1
+            self.bits = np.packbits(unpacked)
+        return new
+
+    def update(self, bits: np.ndarray) -> int:
+        '''
+        Merges bits (or another CoverageBitmap) into the bitmap, returns the number of new bits
+        '''
+        if isinstance(bits, CoverageBitmap):
+            bits = bits.bits
+        new = self.new_bits(bits)
+        if new:
+            self.bits[:len(bits)] |= bits
+        return new
+
+    def count(self) -> int:
+        return int(np.unpackbits(self.bits).sum())
+
+    def copy(self) -> "CoverageBitmap":
+        bitmap = CoverageBitmap()
+        bitmap.size = self.size
+        bitmap.bits = self.bits.copy()
+        return bitmap
@@ -0,0 +1,92 @@
+import json, os
+import numpy as np
+from dataclasses import dataclass
+
+TOLERANCE = 0.02 # tables whose probabilities all differ by at most this much share their results (L-infinity distance)
+
+@dataclass
+class Evaluation:
+    '''
+    Coverage of one random_query run with a probability table
+    '''
+    prob: dict[str, float]
+    coverage: float
+    runtime: float
+    seed: int
+    setup: str # what the coverage was measured with, only equal setups are compared
+
+class EvalStore:
+    """
+    Persistent results of the CMA-ES evaluations, one JSON object per line. Evaluations
+    are grouped by probability vector: a table within the tolerance of a stored one (in
+    every probability) gets its results, so a near-identical table evaluated in this or an
+    earlier session is not run again. The vectors are kept in one array, a lookup
+    compares the table with all of them at once.
+    """
+    def __init__(self, path: str, keys: list[str], setup: str, tolerance: float = TOLERANCE):
+        self.path = path
+        self.keys = keys
+        self.setup = setup
+        self.tolerance = tolerance
+        self.results: list[list[Evaluation]] = [] # per group, the first evaluation's table stands for it
+        self.vectors = np.zeros((64, len(keys))) # first len(results) rows are used, doubled when full
+        self.loaded = 0
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        evaluation = Evaluation(**json.loads(line))
+                    except (ValueError, TypeError): # cut off line of an interrupted run
+                        continue
+                    if evaluation.setup == setup and all(k in evaluation.prob for k in keys):
+                        self._index(evaluation)
+                        self.loaded += 1
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.file = open(path, "a", encoding="utf-8")
+
+    def vector(self, prob: dict[str, float]) -> np.ndarray:
+        return np.array([prob[k] for k in self.keys], dtype=float)
+
+    def nearest(self, prob: dict[str, float]) -> int:
+        '''
+        Group of the stored table closest to prob, None if none is within the tolerance
+        '''
+        if not self.results:
+            return None
+        distance = np.abs(self.vectors[:len(self.results)] - self.vector(prob)).max(axis=1)
+        group = int(distance.argmin())
+        return group if distance[group] <= self.tolerance else None
+
+    def _index(self, evaluation: Evaluation):
+        group = self.nearest(evaluation.prob)
+        if group is None:
+            if len(self.results) == len(self.vectors):
+                self.vectors = np.concatenate([self.vectors, np.zeros_like(self.vectors)])
+            self.vectors[len(self.results)] = self.vector(evaluation.prob)
+            self.results.append([evaluation])
+        else:
+            self.results[group].append(evaluation)
+
+    def get(self, prob: dict[str, float]) -> list[Evaluation]:
+        group = self.nearest(prob)
+        return [] if group is None else self.results[group]
+
+    def add(self, prob: dict[str, float], coverage: float, runtime: float, seed: int) -> Evaluation:
+        evaluation = Evaluation({k: float(prob[k]) for k in self.keys}, float(coverage), runtime, seed, self.setup)
+        self._index(evaluation)
+        self.file.write(json.dumps(vars(evaluation)) + "\n")
+        self.file.flush()
+        return evaluation
+
+    def best(self, n: int = 1) -> list[tuple[float, dict[str, float]]]:
+        '''
+        The n probability tables with the highest mean coverage, as (coverage, table)
+        '''
+        means = [(sum(e.coverage for e in runs) / len(runs), runs[0].prob) for runs in self.results]
+        return sorted(means, key=lambda m: m[0], reverse=True)[:n]
+
+    def close(self):
+        self.file.close()
+
+    def __len__(self) -> int:
+        return sum(len(runs) for runs in self.results)
@@ -0,0 +1,336 @@
+import os, struct
+import numpy as np
+
+# gcov-io.h
+GCNO_MAGIC = 0x67636e6f # "gcno"
+GCDA_MAGIC = 0x67636461 # "gcda"
+TAG_FUNCTION = 0x01000000
+TAG_BLOCKS = 0x01410000
+TAG_ARCS = 0x01430000
+TAG_LINES = 0x01450000
+TAG_COUNTER_ARCS = 0x01a10000
+
+ARC_ON_TREE = 1 # count is not instrumented, derived from the other arcs
+ARC_FAKE = 2 # call that may not return / non-local goto
+ARC_FALLTHROUGH = 4
+
+def gcc_major(version: int) -> int:
+    '''
+    GCOV_VERSION is stored as 4 chars, e.g. "B22*" for gcc 12.2 or "A93*" for gcc 9.3
+    '''
+    c0, c1 = chr((version >> 24) & 0xff), chr((version >> 16) & 0xff)
+    if c0 >= "A":
+        return (ord(c0) - ord("A")) * 10 + int(c1)
+    return int(c0)
+
+class _Words:
+    """
+    Sequential reader over the 32-bit words of a gcov file
+    """
+    def __init__(self, data: bytes, magic: int):
+        self.data = data
+        self.endian = "<" if struct.unpack_from("<I", data, 0)[0] == magic else ">"
+        if struct.unpack_from(self.endian + "I", data, 0)[0] != magic:
+            raise ValueError("Error: not a gcov file")
+        self.pos = 4
+        self.version = self.word()
+        self.major = gcc_major(self.version)
+        self.byte_lengths = self.major >= 12 # lengths in bytes and unaligned strings since gcc 12
+
+    def word(self) -> int:
+        value = struct.unpack_from(self.endian + "I", self.data, self.pos)[0]
+        self.pos += 4
+        return value
+
+    def string(self) -> str:
+        length = self.word()
+        size = length if self.byte_lengths else length * 4
+        raw = self.data[self.pos:self.pos + size]
+        self.pos += size if self.byte_lengths else (size + 3) & ~3 # gcc 12+ does not pad strings
+        return raw.split(b"\0", 1)[0].decode("utf-8", errors="ignore")
+
+    def record_bytes(self, length: int) -> int:
+        return length if self.byte_lengths else length * 4
+
+    def done(self) -> bool:
+        return self.pos + 8 > len(self.data)
+
+class GcovReader:
+    """
+    Reads the .gcno graph once and turns every .gcda read into the four gcov -b
+    percentages (lines, branches executed, taken at least once, calls) without
+    running gcov or writing .gcov files.
+
+    Counters live in flat numpy arrays indexed by global arc/block/counter ids.
+    Only the arcs without ON_TREE are instrumented; the others are derived with a
+    flow-conservation schedule that is computed once from the graph and only
+    re-evaluated for functions whose counters changed since the last read.
+    """
+    def __init__(self, gcno_path: str, source: str = "sqlite3.c"):
+        self.gcno_path = gcno_path
+        self.source = source
+        self.functions = [] # (ident, name, block_offset, n_blocks, arc_offset, n_arcs, counter_offset, n_counters)
+        self.index = {} # ident -> function number
+        self._load_graph()
+        self.reset()
+
+    def reset(self):
+        '''
+        Forgets the last read, e.g. after the .gcda files were deleted
+        '''
+        self.counters = np.zeros(self.n_counters, dtype=np.int64)
+        self.arc_count = np.zeros(self.n_arcs, dtype=np.int64)
+        self.block_count = np.zeros(self.n_blocks, dtype=np.int64)
+
+    def _load_graph(self):
+        with open(self.gcno_path, "rb") as f:
+            r = _Words(f.read(), GCNO_MAGIC)
+        r.word() # stamp
+        if r.major >= 12:
+            r.word() # checksum
+        if r.major >= 9:
+            r.string() # cwd
+        if r.major >= 8:
+            r.word() # has_unexecuted_blocks
+
+        arc_src, arc_dst, arc_flags, arc_func = [], [], [], []
+        line_block, line_no, line_last = [], [], []
+        n_blocks = n_counters = 0
+        fn = None
+
+        while not r.done():
+            tag, length = r.word(), r.word()
+            start = r.pos
+            if tag == TAG_FUNCTION:
+                ident = r.word()
+                r.word(); r.word() # lineno_checksum, cfg_checksum
+                name = r.string()
+                if r.major >= 12:
+                    r.word() # artificial
+                    r.string() # source file
+                    r.pos += 16 # start line/column, end line/column
+                else:
+                    if r.major >= 8:
+                        r.word()
+                    r.string() # source file
+                    r.pos = start + r.record_bytes(length)
+                fn = [ident, name, n_blocks, 0, len(arc_src), 0, n_counters, 0]
+                self.index[ident] = len(self.functions)
+                self.functions.append(fn)
+                continue
+            if tag == TAG_BLOCKS:
+                count = r.word() if r.major >= 8 else r.record_bytes(length) // 4
+                fn[3] = count
+                n_blocks += count
+            elif tag == TAG_ARCS:
+                src = r.word()
+                for _ in range((r.record_bytes(length) // 4 - 1) // 2):
+                    dst, flags = r.word(), r.word()
+                    arc_src.append(fn[2] + src)
+                    arc_dst.append(fn[2] + dst)
+                    arc_flags.append(flags)
+                    arc_func.append(len(self.functions) - 1)
+                    if not flags & ARC_ON_TREE:
+                        fn[7] += 1
+                        n_counters += 1
+                fn[5] = len(arc_src) - fn[4]
+                continue
+            elif tag == TAG_LINES:
+                block = fn[2] + r.word()
+                current = ""
+                last = None
+                while True:
+                    line = r.word()
+                    if line == 0:
+                        current = r.string()
+                        if not current:
+                            break
+                        last = None
+                    elif os.path.basename(current) == self.source:
+                        line_block.append(block)
+                        line_no.append(line)
+                        line_last.append(False)
+                        last = len(line_last) - 1
+                    else:
+                        last = None
+                if last is not None: # gcov attaches the block to its last line
+                    line_last[last] = True
+                continue
+            r.pos = start + r.record_bytes(length)
+
+        self.n_blocks = n_blocks
+        self.n_arcs = len(arc_src)
+        self.n_counters = n_counters
+        self.arc_src = np.array(arc_src, dtype=np.int64)
+        self.arc_dst = np.array(arc_dst, dtype=np.int64)
+        self.arc_flags = np.array(arc_flags, dtype=np.int64)
+
+        # instrumented arcs in counter order, counter -> function
+        self.counter_arc = np.flatnonzero((self.arc_flags & ARC_ON_TREE) == 0)
+        self.counter_func = np.array(arc_func, dtype=np.int64)[self.counter_arc]
+        self.schedules = [self._schedule(fn) for fn in self.functions]
+
+        # lines: every (block, line) pair of the source file, lines deduplicated. A line that
+        # ends a block only counts the blocks ending on it, like gcov's accumulate_line_info
+        self.lines, self.line_index = np.unique(np.array(line_no, dtype=np.int64), return_inverse=True)
+        self.line_block = np.array(line_block, dtype=np.int64)
+        self.line_last = np.array(line_last, dtype=bool)
+        self.line_has_last = np.zeros(len(self.lines), dtype=bool)
+        self.line_has_last[self.line_index[self.line_last]] = True
+
+        # branches/calls of the blocks attached to a source line: fake arcs leaving a call site
+        # are calls, every other arc not being the only non-fake exit of its block is a branch
+        attached = np.zeros(self.n_blocks, dtype=bool)
+        attached[self.line_block[self.line_last]] = True
+        fake = (self.arc_flags & ARC_FAKE) != 0
+        entry = np.array([f[2] for f in self.functions], dtype=np.int64)[np.array(arc_func, dtype=np.int64)]
+        non_fake_succ = np.bincount(self.arc_src[~fake], minlength=self.n_blocks)
+        call = fake & (self.arc_src != entry)
+        unconditional = ~fake & (non_fake_succ[self.arc_src] == 1)
+        self.branch_arcs = np.flatnonzero(~call & ~unconditional & attached[self.arc_src])
+        self.call_arcs = np.flatnonzero(call & attached[self.arc_src])
+
+    def _schedule(self, fn: list) -> list[tuple]:
+        '''
+        Order in which the non instrumented arcs of a function can be solved:
+            (False, block, arcs): block count = sum of arcs
+            (True, arc, block, arcs): arc count = block count - sum of the other arcs
+        '''
+        b0, nb, a0, na = fn[2], fn[3], fn[4], fn[5]
+        succ = [[] for _ in range(nb)]
+        pred = [[] for _ in range(nb)]
+        known = [False] * na
+        for a in range(na):
+            succ[self.arc_src[a0 + a] - b0].append(a)
+            pred[self.arc_dst[a0 + a] - b0].append(a)
+            known[a] = not self.arc_flags[a0 + a] & ARC_ON_TREE
+        unknown_succ = [sum(not known[a] for a in arcs) for arcs in succ]
+        unknown_pred = [sum(not known[a] for a in arcs) for arcs in pred]
+        block_known = [False] * nb
+
+        steps = []
+        todo = list(range(nb))
+        while todo:
+            b = todo.pop()
+            if not block_known[b]:
+                if succ[b] and not unknown_succ[b]:
+                    steps.append((False, b, tuple(succ[b])))
+                elif pred[b] and not unknown_pred[b]:
+                    steps.append((False, b, tuple(pred[b])))
+                else:
+                    continue
+                block_known[b] = True
+            for arcs, unknown in [(succ[b], unknown_succ), (pred[b], unknown_pred)]:
+                if unknown[b] != 1:
+                    continue
+                a = next(a for a in arcs if not known[a])
+                steps.append((True, a, b, tuple(o for o in arcs if o != a)))
+                known[a] = True
+                src, dst = self.arc_src[a0 + a] - b0, self.arc_dst[a0 + a] - b0
+                unknown_succ[src] -= 1
+                unknown_pred[dst] -= 1
+                todo.extend((src, dst))
+        return steps
+
+    def _solve(self, f: int):
+        _, _, b0, nb, a0, na, c0, nc = self.functions[f]
+        arcs = [0] * na
+        blocks = [0] * nb
+        local = self.counter_arc[c0:c0 + nc] - a0
+        for a, count in zip(local.tolist(), self.counters[c0:c0 + nc].tolist()):
+            arcs[a] = count
+        for step in self.schedules[f]:
+            if step[0]:
+                _, a, b, others = step
+                arcs[a] = blocks[b] - sum(arcs[o] for o in others)
+            else:
+                _, b, ids = step
+                blocks[b] = sum(arcs[o] for o in ids)
+        self.arc_count[a0:a0 + na] = arcs
+        self.block_count[b0:b0 + nb] = blocks
+
+    def read(self, gcda_path: str) -> bool:
+        '''
+        Loads the counters of a .gcda file, returns False if the file does not exist
+        '''
+        if not os.path.exists(gcda_path):
+            counters = np.zeros(self.n_counters, dtype=np.int64)
+        else:
+            with open(gcda_path, "rb") as f:
+                counters = self._read_counters(f.read())
+
+        changed = np.unique(self.counter_func[counters != self.counters])
+        self.counters = counters
+        for f in changed.tolist():
+            self._solve(f)
+        return os.path.exists(gcda_path)
+
+    def _read_counters(self, data: bytes) -> np.ndarray:
+        r = _Words(data, GCDA_MAGIC)
+        r.word() # stamp
+        if r.major >= 12:
+            r.word() # checksum
+        counters = np.zeros(self.n_counters, dtype=np.int64)
+        dtype = np.dtype(np.int64).newbyteorder(r.endian)
+        fn = None
+        while not r.done():
+            tag, length = r.word(), r.word()
+            if length & 0x80000000: # gcc 12+: all counters zero, no payload
+                length = 0
+            size = r.record_bytes(length)
+            if tag == TAG_FUNCTION and size:
+                ident = struct.unpack_from(r.endian + "I", data, r.pos)[0]
+                fn = self.functions[self.index[ident]] if ident in self.index else None
+                r.pos += size
+                continue
+            if tag == TAG_COUNTER_ARCS and fn is not None and size:
+                n = min(size // 8, fn[7])
+                # counters are written as (lo, hi) word pairs, i.e. native 64-bit integers
+                counters[fn[6]:fn[6] + n] = np.frombuffer(data, dtype=dtype, count=n, offset=r.pos)
+            r.pos += size
+        return counters
+
+    def executed_lines(self) -> np.ndarray:
+        hit = self.block_count[self.line_block] > 0
+        executed = np.zeros(len(self.lines), dtype=bool)
+        executed[self.line_index[hit & self.line_last]] = True
+        executed[self.line_index[hit & ~self.line_has_last[self.line_index]]] = True
+        return executed
+
+    def bits(self) -> np.ndarray:
+        '''
+        Packed bitset of the last read: one bit per line, then one bit per branch arc taken
+        '''
+        return np.packbits(np.concatenate([self.executed_lines(), self.arc_count[self.branch_arcs] > 0]))
+
+    def coverage(self) -> tuple[float, float, float, float]:
+        '''
+        gcov -b percentages of the last read: lines, branches executed, taken at least once, calls
+        '''
+        executed = self.executed_lines()
+        branch_src = self.block_count[self.arc_src[self.branch_arcs]] > 0
+        branch_taken = self.arc_count[self.branch_arcs] > 0
+        call_src = self.block_count[self.arc_src[self.call_arcs]] > 0
+
+        def pct(hit, total):
+            return round(100.0 * hit / total, 2) if total else 0.0
+
+        return (
+            pct(int(executed.sum()), len(self.lines)),
+            pct(int(branch_src.sum()), len(self.branch_arcs)),
+            pct(int(branch_taken.sum()), len(self.branch_arcs)),
+            pct(int(call_src.sum()), len(self.call_arcs)),
+        )
+
+    def summary(self) -> str:
+        '''
+        Same text as gcov -b prints for the source file, so get_coverage can parse it
+        '''
+        lines, branches, taken, calls = self.coverage()
+        return (
+            f"File '{self.source}'\n"
+            f"Lines executed:{lines:.2f}% of {len(self.lines)}\n"
+            f"Branches executed:{branches:.2f}% of {len(self.branch_arcs)}\n"
+            f"Taken at least once:{taken:.2f}% of {len(self.branch_arcs)}\n"
+            f"Calls executed:{calls:.2f}% of {len(self.call_arcs)}\n"
+        )
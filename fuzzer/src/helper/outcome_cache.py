@@ -0,0 +1,67 @@
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+@dataclass
+class Outcome:
+    '''
+    Result of one candidate run
+    '''
+    coverage: tuple[float, float, float, float] # lines, branches, taken, calls
+    new_bits: int # bits it added to the bitmap
+    error: str
+    dropped: bool = False # by the prefilter, not run
+
+def normalize(statement: str) -> str:
+    '''
+    Collapses whitespace outside of string literals
+    '''
+    parts = statement.strip().split("'")
+    parts[::2] = [" ".join(p.split()) for p in parts[::2]]
+    return "'".join(parts)
+
+def digest(statements: list[str], prefix: bytes = b"") -> bytes:
+    h = hashlib.blake2b(prefix, digest_size=16)
+    for statement in statements:
+        h.update(normalize(statement).encode("utf-8"))
+        h.update(b"\0")
+    return h.digest()
+
+class OutcomeCache:
+    """
+    LRU of candidate outcomes keyed by the state the candidate ran on (hash of the accepted
+    query, which determines test.db) and the normalized candidate. On the same state a
+    candidate covers the same bits, and the bitmap only grows, so an exact repeat would
+    not be interesting either and is not run again.
+    """
+    def __init__(self, maxsize: int = 100000):
+        self.maxsize = maxsize
+        self.entries: OrderedDict[bytes, Outcome] = OrderedDict()
+        self.lookups = 0
+        self.hits = 0
+
+    @staticmethod
+    def state(query: list[str]) -> bytes:
+        return digest(query)
+
+    @staticmethod
+    def key(state: bytes, candidate: list[str]) -> bytes:
+        return digest(candidate, state)
+
+    def get(self, key: bytes) -> Optional[Outcome]:
+        self.lookups += 1
+        outcome = self.entries.get(key)
+        if outcome is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+        return outcome
+
+    def put(self, key: bytes, outcome: Outcome):
+        self.entries[key] = outcome
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self.entries)
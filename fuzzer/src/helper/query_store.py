@@ -0,0 +1,150 @@
+import glob, gzip, hashlib, os
+from bisect import bisect_right
+import numpy as np
+
+BLOCK_GROUPS = 1000 # groups per gzip member, the unit of random access
+CHUNK_GROUPS = 100000 # groups per chunk file of a worker
+COMPRESSLEVEL = 6
+
+def group_hash(group: str) -> int:
+    return int.from_bytes(hashlib.blake2b(group.encode("utf-8"), digest_size=8).digest(), "little")
+
+class ChunkWriter:
+    """
+    Writes the query groups of one worker, one line per group, to gzip chunk files
+    <prefix>_0000.gz, <prefix>_0001.gz, ... Every BLOCK_GROUPS groups form an independent
+    gzip member, so a chunk is still a normal .gz file. The sidecar <prefix>_0000.npz holds
+    the hash of every group and the (compressed length, groups) of every member, the merge
+    uses them without decompressing anything.
+    """
+    def __init__(self, prefix: str, block_groups: int = BLOCK_GROUPS, chunk_groups: int = CHUNK_GROUPS,
+                 compresslevel: int = COMPRESSLEVEL):
+        self.prefix = prefix
+        self.block_groups = block_groups
+        self.chunk_groups = chunk_groups
+        self.compresslevel = compresslevel
+        self.chunk = 0
+        self.file = None
+        self.block: list[str] = []
+        self.hashes: list[int] = []
+        self.members: list[tuple[int, int]] = []
+        self.groups = 0 # written so far, over all chunks
+        self.bytes = 0 # compressed
+
+    def write(self, group: str):
+        group = group.replace("\n", " ") # one line per group
+        self.block.append(group + "\n")
+        self.hashes.append(group_hash(group))
+        if len(self.block) >= self.block_groups:
+            self._flush_block()
+
+    def _flush_block(self):
+        if not self.block:
+            return
+        if self.file is None:
+            self.file = open(f"{self.prefix}_{self.chunk:04d}.gz", "wb")
+        member = gzip.compress("".join(self.block).encode("utf-8"), self.compresslevel, mtime=0)
+        self.file.write(member)
+        self.members.append((len(member), len(self.block)))
+        self.groups += len(self.block)
+        self.bytes += len(member)
+        self.block = []
+        if len(self.hashes) >= self.chunk_groups:
+            self._close_chunk()
+
+    def _close_chunk(self):
+        if self.file is None:
+            return
+        self.file.close()
+        np.savez(f"{self.prefix}_{self.chunk:04d}.npz", hashes=np.array(self.hashes, dtype=np.uint64),
+                 members=np.array(self.members, dtype=np.int64).reshape(-1, 2))
+        self.file = None
+        self.hashes = []
+        self.members = []
+        self.chunk += 1
+
+    def close(self):
+        self._flush_block()
+        self._close_chunk()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def chunk_files(folder: str, pattern: str = "worker_*") -> list[str]:
+    '''
+    Chunk files (.gz with a .npz sidecar) in merge order: worker by worker, chunk by chunk
+    '''
+    def key(path: str) -> tuple:
+        return tuple(int(p) if p.isdigit() else p for p in os.path.basename(path)[:-3].split("_"))
+    return sorted((p for p in glob.glob(os.path.join(folder, pattern + ".gz")) if os.path.exists(p[:-3] + ".npz")), key=key)
+
+def index_path(path: str) -> str:
+    return path + ".idx.npz"
+
+def merge_chunks(paths: list[str], output: str, compresslevel: int = COMPRESSLEVEL) -> tuple[int, int]:
+    '''
+    Concatenates the chunks into one gzip file and drops every group whose hash was seen
+    before. The first occurrences are found with one np.unique over all hashes (8 bytes a
+    group instead of a set of ints), members without duplicates are copied as they are and
+    only members with duplicates are decompressed and compressed again.
+    The index (offset, length, first group, groups of every member and the hashes of the
+    kept groups) is written next to the output for random access with read_group().
+    Returns the number of kept and dropped groups.
+    '''
+    sidecars = [np.load(p[:-3] + ".npz") for p in paths]
+    hashes = np.concatenate([s["hashes"] for s in sidecars]) if sidecars else np.zeros(0, dtype=np.uint64)
+    keep = np.zeros(len(hashes), dtype=bool)
+    keep[np.unique(hashes, return_index=True)[1]] = True
+
+    blocks = [] # offset, length, first group, groups
+    offset = pos = kept = 0
+    with open(output, "wb") as out:
+        for path, sidecar in zip(paths, sidecars):
+            with open(path, "rb") as f:
+                for length, groups in sidecar["members"].tolist():
+                    member = f.read(length)
+                    mask = keep[pos:pos + groups]
+                    pos += groups
+                    n = int(mask.sum())
+                    if n == 0:
+                        continue
+                    if n < groups:
+                        lines = gzip.decompress(member).decode("utf-8").splitlines(keepends=True)
+                        member = gzip.compress("".join(l for l, k in zip(lines, mask.tolist()) if k).encode("utf-8"), compresslevel, mtime=0)
+                    out.write(member)
+                    blocks.append((offset, len(member), kept, n))
+                    offset += len(member)
+                    kept += n
+
+    np.savez(index_path(output), blocks=np.array(blocks, dtype=np.int64).reshape(-1, 4), hashes=hashes[keep])
+    return kept, len(hashes) - kept
+
+class QueryStore:
+    """
+    Random access to the groups of a merged file through its index: only the member that
+    holds the group is read and decompressed.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        index = np.load(index_path(path))
+        self.blocks = index["blocks"]
+        self.hashes = index["hashes"]
+        self.first = self.blocks[:, 2].tolist()
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def read_block(self, i: int) -> list[str]:
+        offset, length, _, _ = self.blocks[i].tolist()
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return gzip.decompress(f.read(length)).decode("utf-8").splitlines()
+
+    def __getitem__(self, n: int) -> str:
+        if not 0 <= n < len(self):
+            raise IndexError(f"group {n} out of range")
+        i = bisect_right(self.first, n) - 1
+        return self.read_block(i)[n - self.first[i]]
@@ -0,0 +1,79 @@
+from bisect import bisect
+from itertools import accumulate, chain
+import numpy as np
+
+class RandomStream:
+    """
+    Drop-in for the `random` module calls of the generator. Uniforms are drawn from a NumPy
+    generator in blocks and handed out one by one through a C-level iterator, integers,
+    reals and choices are derived from them without the Python code of `random`.
+    """
+    def __init__(self, seed=None, block: int = 1 << 16):
+        self.rng = np.random.default_rng(seed)
+        self.block = block
+        uniforms = chain.from_iterable(iter(lambda: self.rng.random(self.block).tolist(), None))
+        self.random = uniforms.__next__ # float in [0, 1)
+
+    def randrange(self, start: int, stop: int = None) -> int:
+        if stop is None:
+            start, stop = 0, start
+        if stop <= start:
+            raise ValueError(f"empty range in randrange({start}, {stop})")
+        return start + int((stop - start) * self.random())
+
+    def randint(self, a: int, b: int) -> int:
+        if b < a:
+            raise ValueError(f"empty range in randint({a}, {b})")
+        return a + int((b - a + 1) * self.random())
+
+    def uniform(self, a: float, b: float) -> float:
+        return a + (b - a) * self.random()
+
+    def choice(self, seq):
+        if not seq:
+            raise IndexError("Cannot choose from an empty sequence")
+        return seq[int(len(seq) * self.random())]
+
+    def choices(self, population, weights=None, k: int = 1) -> list:
+        n, random = len(population), self.random
+        if weights is None:
+            return [population[int(n * random())] for _ in range(k)]
+        cum_weights = list(accumulate(weights))
+        total = cum_weights[-1]
+        return [population[bisect(cum_weights, random() * total, 0, n - 1)] for _ in range(k)]
+
+    def sample(self, population, k: int) -> list:
+        pool = list(population)
+        n = len(pool)
+        if not 0 <= k <= n:
+            raise ValueError("Sample larger than population or is negative")
+        for i in range(k): # partial Fisher-Yates
+            j = i + int((n - i) * self.random())
+            pool[i], pool[j] = pool[j], pool[i]
+        return pool[:k]
+
+    def shuffle(self, x: list):
+        for i in range(len(x) - 1, 0, -1):
+            j = int((i + 1) * self.random())
+            x[i], x[j] = x[j], x[i]
+
+GROUP_BLOCK = 1024 # a query group of randomQueryGen(cycle=3) draws ~600 numbers
+
+def worker_seed(seed: int, worker: int) -> np.random.SeedSequence:
+    '''
+    Seed of one worker of a campaign, independent of the other workers
+    '''
+    return np.random.SeedSequence(seed, spawn_key=(worker,))
+
+def group_seed(seed: int, worker: int, index: int) -> np.random.SeedSequence:
+    '''
+    Seed of the index-th query group of a worker. It only depends on (seed, worker, index),
+    so a group can be regenerated without the groups before it.
+    '''
+    return np.random.SeedSequence(seed, spawn_key=(worker, index))
+
+def python_seed(seq: np.random.SeedSequence) -> int:
+    '''
+    Integer seed for random.seed() drawn from a SeedSequence
+    '''
+    return int.from_bytes(seq.generate_state(4).tobytes(), "little")
@@ -0,0 +1,92 @@
+# Same file as fuzzer/src/helper/results.py and reducer/src/results.py, the reducer is a
+# separate image and keeps its own copy: change both.
+import json, os, sqlite3
+from contextlib import closing
+from dataclasses import dataclass, asdict
+
+@dataclass
+class ResultRecord:
+    '''
+    Output of one statement on one sqlite version
+    '''
+    name: str # test/file the statement belongs to
+    index: int # position of the statement in the test
+    query: str
+    version: str
+    stdout: str
+    stderr: str
+    returncode: int
+    duration: float
+
+class ResultSink:
+    """
+    Buffered writer of ResultRecords, one JSON object per line (.jsonl) or one row per
+    record in a `results` table (.db/.sqlite). The file stays open and records are
+    written in batches instead of opening the log for every statement.
+    """
+    def __init__(self, path: str, batch: int = 500):
+        self.path = path
+        self.batch = batch
+        self.buffer: list[ResultRecord] = []
+        self.sqlite = os.path.splitext(path)[1] in [".db", ".sqlite", ".sqlite3"]
+        if self.sqlite:
+            self.conn = sqlite3.connect(path)
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS results "
+                "(name TEXT, idx INTEGER, query TEXT, version TEXT, stdout TEXT, stderr TEXT, returncode INTEGER, duration REAL)"
+            )
+        else:
+            self.file = open(path, "a", encoding="utf-8")
+        self.count = 0
+
+    def add(self, name: str, index: int, query: str, version: str, stdout: str, stderr: str, returncode: int, duration: float):
+        self.buffer.append(ResultRecord(name, index, query, version, stdout, stderr, returncode, duration))
+        if len(self.buffer) >= self.batch:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        if self.sqlite:
+            self.conn.executemany("INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)", [
+                (r.name, r.index, r.query, r.version, r.stdout, r.stderr, r.returncode, r.duration) for r in self.buffer
+            ])
+            self.conn.commit()
+        else:
+            self.file.write("".join(json.dumps(asdict(r)) + "\n" for r in self.buffer))
+            self.file.flush()
+        self.count += len(self.buffer)
+        self.buffer = []
+
+    def close(self):
+        self.flush()
+        if self.sqlite:
+            self.conn.close()
+        else:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def read_results(path: str) -> list[ResultRecord]:
+    if os.path.splitext(path)[1] in [".db", ".sqlite", ".sqlite3"]:
+        with closing(sqlite3.connect(path)) as conn: # the connection's own context manager only commits
+            rows = conn.execute("SELECT name, idx, query, version, stdout, stderr, returncode, duration FROM results ORDER BY rowid")
+            return [ResultRecord(*row) for row in rows]
+    with open(path, encoding="utf-8") as f:
+        return [ResultRecord(**json.loads(line)) for line in f if line.strip()]
+
+def write_text_view(records: list[ResultRecord], version: str, path: str):
+    '''
+    Old text log of one version: each query followed by its output (error, else stdout) as comments
+    '''
+    with open(path, "w") as f:
+        for r in records:
+            if r.version != version:
+                continue
+            f.write(r.query + "\n")
+            for line in (r.stderr or r.stdout).splitlines():
+                f.write(f"-- {line}\n")
@@ -0,0 +1,64 @@
+import random, re
+from .config import SQL_KEYWORDS, SQL_OPERATORS
+
+def alternation(words: list[str]) -> str:
+    # longest first, so that e.g. "<=" wins over "<" at the same offset
+    return "|".join(re.escape(w) if not w[:1].isalpha() else rf"\b{re.escape(w)}\b"
+                    for w in sorted(set(words), key=len, reverse=True) if w)
+
+KEYWORD = re.compile(alternation([w for keyword in SQL_KEYWORDS for w in keyword.split()]))
+VALUE = re.compile(r"'(?:[^']|'')*'|\b(?:[a-z_][a-z0-9_]*\.[a-z_][a-z0-9_]*|[a-z_][a-z0-9_]*|\d+)\b")
+OPERATOR = re.compile(alternation(SQL_OPERATORS))
+BOUNDARY = re.compile(r"\s|$")
+
+def random_match(pattern: re.Pattern, query: str) -> re.Match:
+    '''
+    Match of pattern at or after a random offset, wrapping around to the start. Only the
+    text between the offset and the match is scanned, not the whole query, at the price
+    of preferring tokens that follow a long gap.
+    '''
+    pos = random.randint(0, len(query))
+    return pattern.search(query, pos) or pattern.search(query)
+
+def splice(query: str, start: int, end: int, text: str) -> str:
+    '''
+    Replaces query[start:end] by text, keeping words apart
+    '''
+    before, after = query[:start], query[end:]
+    if not text:
+        return (before.rstrip() + " " + after.lstrip()).strip()
+    if before[-1:].isalnum() or after[:1].isalnum():
+        return f"{before.rstrip()} {text} {after.lstrip()}".strip()
+    return before + text + after
+
+def mutate_query(query: str) -> str:
+    mutations = [mutate_keyword, mutate_values, mutate_operator]
+    mutation = random.choice(mutations)
+    return mutation(query)
+
+def mutate_keyword(query: str) -> str:
+    mutation_type = random.choice(["replace", "remove", "add"])
+
+    if mutation_type in ("replace", "remove"):
+        m = random_match(KEYWORD, query)
+        if m:
+            return splice(query, m.start(), m.end(), random.choice(SQL_KEYWORDS) if mutation_type == "replace" else "")
+
+    elif mutation_type == "add":
+        pos = BOUNDARY.search(query, random.randint(0, len(query))).start() # not inside a word
+        return splice(query, pos, pos, random.choice(SQL_KEYWORDS))
+
+    return query
+
+def mutate_values(query: str) -> str:
+    old = random_match(VALUE, query)
+    if old:
+        new = random_match(VALUE, query)
+        return splice(query, old.start(), old.end(), new.group())
+    return query
+
+def mutate_operator(query: str) -> str:
+    m = random_match(OPERATOR, query)
+    if m:
+        return splice(query, m.start(), m.end(), random.choice(SQL_OPERATORS))
+    return query
@@ -0,0 +1,176 @@
+import multiprocessing as mp
+import os, pickle, queue, random, sys, time
+import numpy as np
+from collections import deque
+from . import test
+from . import generator as gen
+from .config import WORKSPACE_FOLDER, STATS_FOLDER
+from .fuzzing import FUZZING_PIPELINE, run_pipeline, pipeline_prob
+from .corpus import Corpus
+from .helper.bitmap import CoverageBitmap
+from .helper.random_stream import worker_seed, python_seed
+from tqdm import tqdm
+
+SYNC_INTERVAL = 10 # seconds between two syncs of a worker
+SHARE_MAX = 50 # corpus entries a worker takes from the others per sync
+
+def referenced_tables(node: gen.SQLNode) -> set[str]:
+    '''
+    Names of the tables, views and indexes a node refers to, not the one it creates
+    '''
+    names = set()
+    seen = set()
+    stack = [node]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, (list, tuple)):
+            stack.extend(value)
+        elif isinstance(value, gen.Table) and value is not node:
+            names.add(value.name)
+        elif isinstance(value, gen.SQLNode) and id(value) not in seen: # nodes can refer back to a parent
+            seen.add(id(value))
+            for name in value.__dataclass_fields__:
+                child = getattr(value, name)
+                if name in ("table", "table_name") and isinstance(child, str): # Index, Select
+                    names.add(child)
+                else:
+                    stack.append(child)
+    return names
+
+class Sync:
+    """
+    Worker side of the coordinator, used as the sync hook of run_pipeline: sends the
+    worker's bitmap and the corpus entries added since the last sync with their new bits,
+    merges the campaign bitmap the coordinator sends back and adds the entries other
+    workers found interesting to the corpus. Entries that refer to tables this worker's
+    schema does not have are dropped, at most SHARE_MAX are taken per sync and the rest
+    waits for the next one.
+    """
+    def __init__(self, worker: int, outbox: mp.Queue, inbox: mp.Queue, interval: float = SYNC_INTERVAL):
+        self.worker = worker
+        self.outbox = outbox
+        self.inbox = inbox
+        self.interval = interval
+        self.last = 0
+        self.corpus = None
+        self.sent = 0 # corpus entries already sent or received
+        self.pending = deque() # received entries not taken yet
+        self.taken = 0
+        self.dropped = 0
+
+    def __call__(self, bitmap: CoverageBitmap, corpus: Corpus, tables: gen.SchemaContext, force: bool = False):
+        if corpus is not self.corpus: # new run_pipeline
+            self.corpus = corpus
+            self.sent = 0
+        if not force and time.time() - self.last < self.interval:
+            return
+        self.last = time.time()
+
+        try:
+            entries = pickle.dumps([(e.node, e.bits) for e in corpus.since(self.sent)])
+        except (pickle.PicklingError, TypeError, AttributeError, RecursionError):
+            entries = None
+        self.outbox.put((self.worker, "sync", (bitmap.bits.copy(), entries)))
+
+        while len(self.pending) < SHARE_MAX:
+            try:
+                kind, payload = self.inbox.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "bits": # campaign bitmap, bits other workers covered are not new here
+                bitmap.update(payload)
+            else:
+                self.pending.extend(pickle.loads(payload))
+
+        received = []
+        while self.pending and len(received) < SHARE_MAX:
+            node = self.pending.popleft()
+            if all(tables.get(name) is not None for name in referenced_tables(node)):
+                received.append(node)
+            else:
+                self.dropped += 1
+        corpus.extend(received)
+        self.taken += len(received)
+        self.sent = corpus.added
+
+def _worker(worker: int, files: int, repeat: int, threshold: int, outbox: mp.Queue, inbox: mp.Queue, seed: int = None):
+    workspace = os.path.join(WORKSPACE_FOLDER, f"worker_{worker}")
+    test.set_workspace(workspace)
+    sys.stdout = sys.stderr = open(os.path.join(workspace, "worker.log"), "w", buffering=1)
+    # forked workers share the parent's random state: fresh entropy, or an independent substream of the campaign seed
+    random.seed(None if seed is None else python_seed(worker_seed(seed, worker)))
+
+    sync = Sync(worker, outbox, inbox)
+    bitmap = CoverageBitmap() # kept over the files, holds the campaign bits of the last sync
+    for _ in range(files):
+        pipeline = FUZZING_PIPELINE(pipeline_prob())
+        run_pipeline(0, [], [], [], pipeline, repeat=repeat, threshold=threshold, bitmap=bitmap, sync=sync)
+        outbox.put((worker, "done", None))
+    print(f"Shared entries: {sync.taken} taken, {sync.dropped} dropped (unknown tables)")
+    test.POOL.close_all()
+
+def run_parallel_pipeline(workers: int, files: int, repeat: int = 1, threshold: int = 10, seed: int = None) -> CoverageBitmap:
+    '''
+    Runs the PIPELINE on several processes, each in its own workspace (database and .gcda files).
+    The coordinator merges the workers' bitmaps into the campaign bitmap, sends it back to the
+    worker and forwards the corpus entries whose new bits are new to the campaign to the others.
+    seed: campaign seed, every worker gets its own substream of it
+    '''
+    start = time.time()
+    workers = max(1, min(workers, files))
+    test.native_gcov() # parse the .gcno once before forking
+
+    ctx = mp.get_context("fork")
+    outbox = ctx.Queue()
+    inboxes = [ctx.Queue() for _ in range(workers)]
+    for inbox in inboxes:
+        inbox.cancel_join_thread() # entries for finished workers are dropped
+
+    procs = []
+    for worker in range(workers):
+        share = len(range(worker, files, workers))
+        proc = ctx.Process(target=_worker, args=(worker, share, repeat, threshold, outbox, inboxes[worker], seed))
+        proc.start()
+        procs.append(proc)
+
+    bitmap = CoverageBitmap()
+    shared = 0
+    pbar = tqdm(total=files, desc=f"Fuzzing ({workers} workers) (bits={0:06})")
+    while any(p.is_alive() for p in procs) or not outbox.empty():
+        try:
+            worker, kind, payload = outbox.get(timeout=1)
+        except queue.Empty:
+            continue
+        if kind == "done":
+            pbar.update(1)
+            continue
+        bits, entries = payload
+        fresh = [] # entries whose new bits are new to the campaign too
+        if entries is not None:
+            for node, indices in pickle.loads(entries):
+                if bitmap.set_indices(indices):
+                    fresh.append(node)
+        bitmap.update(bits)
+        if fresh:
+            fresh = pickle.dumps(fresh)
+            for other, inbox in enumerate(inboxes):
+                if other != worker and procs[other].is_alive():
+                    inbox.put(("entries", fresh))
+            shared += 1
+        if bitmap.count() > int(np.unpackbits(bits).sum()) and procs[worker].is_alive():
+            inboxes[worker].put(("bits", bitmap.bits.copy()))
+        pbar.set_description(f"Fuzzing ({workers} workers) (bits={bitmap.count():06})")
+    pbar.close()
+
+    for proc in procs:
+        proc.join()
+
+    with open(f"{STATS_FOLDER}campaign_{random.randint(1, 10000000)}.txt", "w") as f:
+        f.write(f"Workers: {workers}\n")
+        f.write(f"Seed: {seed}\n")
+        f.write(f"Files: {files}\n")
+        f.write(f"Covered Bits: {bitmap.count()}\n")
+        f.write(f"Shared Syncs: {shared}\n")
+        f.write(f"Runtime: {time.time() - start}\n")
+
+    return bitmap
@@ -0,0 +1,184 @@
+import re, sqlite3, time, zlib
+import numpy as np
+
+SYNTAX_ERRORS = ["syntax error", "incomplete input", "unrecognized token"]
+SCHEMA_ERRORS = ["no such table", "no such column", "no such index", "no such view", "no such trigger",
+                 "already exists", "has no column named", "ambiguous column name"]
+TRANSACTION = re.compile(r"^\s*(BEGIN|COMMIT|END|ROLLBACK|SAVEPOINT|RELEASE)\b", re.IGNORECASE)
+EPONYMOUS = ["dbstat", "json_each", "json_tree", "generate_series", "sqlite_dbpage", "sqlite_stmt"]
+CREATE = re.compile(r"CREATE\s+(?:TEMP\w*\s+)?(?:UNIQUE\s+)?(?:VIRTUAL\s+)?(?:TABLE|VIEW|INDEX|TRIGGER)\s+"
+                    r"(?:IF\s+NOT\s+EXISTS\s+)?([^\s(]+)", re.IGNORECASE)
+
+def split_statements(query: str) -> list[str]:
+    '''
+    Splits a string into complete statements, an unterminated rest is kept as last statement
+    '''
+    statements, buf = [], ""
+    for part in query.split(";"):
+        buf += part + ";"
+        if sqlite3.complete_statement(buf):
+            if buf.strip(" ;\n\t"):
+                statements.append(buf.strip())
+            buf = ""
+    if buf.strip(" ;\n\t"):
+        statements.append(buf.strip())
+    return statements
+
+def execute(conn: sqlite3.Connection, statement: str, deadline: float) -> str:
+    '''
+    Runs one statement to the end, returns the error message or "" on success
+    '''
+    conn.set_progress_handler(lambda: int(time.time() > deadline), 1000)
+    try:
+        for _ in conn.execute(statement):
+            pass
+        return ""
+    except sqlite3.Warning: # more than one statement, e.g. a trailing comment
+        return ""
+    except (sqlite3.Error, ValueError, OverflowError) as e:
+        return str(e) or type(e).__name__
+    finally:
+        conn.set_progress_handler(None, 0)
+
+def end_session(conn: sqlite3.Connection):
+    '''
+    The sqlite3 shell rolls an open transaction back when it exits
+    '''
+    if conn.in_transaction:
+        try:
+            conn.execute("ROLLBACK")
+        except sqlite3.Error:
+            pass
+
+class Prefilter:
+    """
+    Runs candidates in process on an in-memory mirror of the accepted database before they
+    go to the instrumented binary. A candidate is dropped if all its statements (besides
+    transaction control) fail with a syntax or schema error. Other errors (constraints,
+    type mismatches, unknown functions/modules) pass, they exercise the binary as well.
+
+    Syntax errors are only trusted if the python sqlite is at least as new as the target.
+    Names that the mirror could not create (e.g. missing virtual table modules) are
+    remembered and statements using them are never dropped.
+    """
+    def __init__(self, target_version: tuple[int, ...] = None, timeout: float = 0.5):
+        self.db = self._connect()
+        self.scratch = None
+        self.timeout = timeout
+        self.trust_syntax = target_version is not None and sqlite3.sqlite_version_info >= tuple(target_version)
+        self.unknown: set[str] = set() # lower case names missing in the mirror
+        for name in EPONYMOUS: # table-valued functions the python sqlite may be built without
+            if execute(self.db, f"SELECT 1 FROM {name} LIMIT 0", time.time() + 1):
+                self.unknown.add(name)
+        self.checked = 0
+        self.dropped = 0
+
+    @staticmethod
+    def _connect() -> sqlite3.Connection:
+        return sqlite3.connect(":memory:", isolation_level=None, check_same_thread=False)
+
+    def _droppable(self, statement: str, error: str) -> bool:
+        if any(e in error for e in SYNTAX_ERRORS):
+            return self.trust_syntax
+        if any(e in error for e in SCHEMA_ERRORS):
+            lowered = statement.lower()
+            return not any(re.search(rf"\b{re.escape(name)}\b", lowered) for name in self.unknown)
+        return False
+
+    def _run(self, conn: sqlite3.Connection, queries: list[str]) -> bool:
+        deadline = time.time() + self.timeout
+        interesting = False
+        for query in queries:
+            for statement in split_statements(query):
+                error = execute(conn, statement, deadline)
+                if error and (create := CREATE.search(statement)) and "already exists" not in error:
+                    self.unknown.add(create.group(1).strip("\"'`[]").split(".")[-1].lower())
+                if TRANSACTION.match(statement):
+                    continue
+                if not error or "interrupted" in error or not self._droppable(statement, error):
+                    interesting = True
+        end_session(conn)
+        return interesting
+
+    def check(self, queries: list[str]) -> bool:
+        '''
+        True if the candidate should be run on the instrumented binary
+        '''
+        self.scratch = self._connect()
+        self.db.backup(self.scratch)
+        self.checked += 1
+        if self._run(self.scratch, queries):
+            return True
+        self.dropped += 1
+        return False
+
+    def accept(self):
+        '''
+        The last checked candidate was accepted: its state becomes the mirror
+        '''
+        if self.scratch is not None:
+            self.db.close()
+            self.db = self.scratch
+            self.scratch = None
+
+    def apply(self, queries: list[str]):
+        '''
+        Runs statements that are added without a check (e.g. pragmas at the end of a loop)
+        '''
+        self._run(self.db, queries)
+
+class InProcessBackend:
+    """
+    Stand-in for the instrumented binary to test the pipeline without the Docker image.
+    Statements run through the python sqlite3 module on the database file, and the
+    "coverage" is pseudo coverage of the VDBE programs: opcodes (lines) and opcode
+    pairs plus error kinds (branches) hashed into a bitmap. Like the .gcda files it
+    accumulates until reset().
+    """
+    UNIGRAMS = 1 << 12
+    BIGRAMS = 1 << 16
+
+    def __init__(self):
+        self.hits = np.zeros(self.UNIGRAMS + self.BIGRAMS, dtype=bool)
+
+    def reset(self):
+        self.hits[:] = False
+
+    def _hit(self, feature: str, bigram: bool):
+        h = zlib.crc32(feature.encode("utf-8"))
+        self.hits[self.UNIGRAMS + h % self.BIGRAMS if bigram else h % self.UNIGRAMS] = True
+
+    def run(self, path: str, queries: list[str], timeout: float = 1) -> tuple[float, float, float, float, str]:
+        deadline = time.time() + timeout
+        conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        errors = []
+        try:
+            for query in queries:
+                for statement in split_statements(query):
+                    if time.time() > deadline:
+                        return 0, 0, 0, 0, "\n".join(errors + ["Error: timeout"])
+                    try:
+                        program = [row[1] for row in conn.execute(statement if statement.upper().startswith("EXPLAIN") else "EXPLAIN " + statement)]
+                    except (sqlite3.Error, sqlite3.Warning, ValueError, OverflowError):
+                        program = []
+                    for i, opcode in enumerate(program):
+                        self._hit(opcode, False)
+                        if i:
+                            self._hit(program[i - 1] + ">" + opcode, True)
+                    error = execute(conn, statement, deadline)
+                    if "interrupted" in error:
+                        return 0, 0, 0, 0, "\n".join(errors + ["Error: timeout"])
+                    if error:
+                        self._hit("error:" + re.sub(r":.*", "", error), True)
+                        errors.append(f"Error: {error}")
+            end_session(conn)
+        finally:
+            conn.close()
+
+        lines = 100.0 * self.hits[:self.UNIGRAMS].sum() / self.UNIGRAMS
+        branches = 100.0 * self.hits[self.UNIGRAMS:].sum() / self.BIGRAMS
+        lines, branches = float(round(lines, 2)), float(round(branches, 2)) # plain floats, np.float64 shows in the stats files
+        return lines, branches, branches, lines, "\n".join(errors)
+
+    def bits(self) -> np.ndarray:
+        return np.packbits(self.hits)
@@ -0,0 +1,81 @@
+import math, random
+from dataclasses import dataclass
+
+EXPLORATION = 0.1 # weight of the UCB confidence term
+DISCOUNT = 0.99 # per pull, old rewards fade so that stages that stopped paying off lose their budget
+
+@dataclass(eq=False)
+class Arm:
+    name: str
+    mut: bool # mutation instead of generation
+    pulls: float = 0 # discounted
+    reward: float = 0 # discounted sum of normalized rewards
+    total_pulls: int = 0
+    total_gain: float = 0
+    total_time: float = 0
+
+class StageScheduler:
+    """
+    Discounted UCB1 bandit over the (stage, generation/mutation) pairs of the pipeline.
+    The reward of a pull is the coverage gained per second of the stage relative to the
+    average rate of all pulls so far, rate / (rate + average), in [0, 1) and 0.5 on
+    average. Every pull all statistics are discounted, so an arm that stops gaining
+    coverage falls back to its exploration bonus and productive arms get the pulls.
+    As the rate is measured in wall time, the choice of stages depends on timing;
+    seeded runs pass a deterministic cost (SQL length) as runtime instead.
+    """
+    def __init__(self, names: list[str], exploration: float = EXPLORATION, discount: float = DISCOUNT, cost: str = "time"):
+        '''
+        cost: what update() gets as runtime, "time" (seconds) or e.g. "sql_length", for the summary
+        '''
+        self.arms = [Arm(name, mut) for name in names for mut in (False, True)]
+        self.cost = cost
+        self.exploration = exploration
+        self.discount = discount
+        self.gain = 0
+        self.time = 0
+
+    def arm(self, name: str, mut: bool) -> Arm:
+        return next(a for a in self.arms if a.name == name and a.mut == mut)
+
+    def score(self, arm: Arm, total: float) -> float:
+        if arm.pulls <= 0:
+            return math.inf
+        return arm.reward / arm.pulls + self.exploration * math.sqrt(2 * math.log(max(total, 1)) / arm.pulls)
+
+    def select(self) -> Arm:
+        total = sum(a.pulls for a in self.arms)
+        scores = [self.score(a, total) for a in self.arms]
+        best = max(scores)
+        return random.choice([a for a, s in zip(self.arms, scores) if s == best])
+
+    def pulls(self, n: int):
+        '''
+        Yields n arms, each chosen after the update of the one before
+        '''
+        for _ in range(n):
+            yield self.select()
+
+    def update(self, arm: Arm, gain: float, runtime: float):
+        '''
+        gain: new bits (or coverage increase) of the pull, runtime: its seconds
+        '''
+        runtime = max(runtime, 1e-3)
+        rate = gain / runtime
+        self.gain += gain
+        self.time += runtime
+        average = self.gain / self.time
+        reward = rate / (rate + average) if rate > 0 else 0
+        for a in self.arms:
+            a.pulls *= self.discount
+            a.reward *= self.discount
+        arm.pulls += 1
+        arm.reward += reward
+        arm.total_pulls += 1
+        arm.total_gain += gain
+        arm.total_time += runtime
+
+    def summary(self) -> list[str]:
+        return [f"{a.name + (' (mut)' if a.mut else ''):<20} pulls={a.total_pulls} gain={a.total_gain:g} "
+                + (f"time={a.total_time:.2f}" if self.cost == "time" else f"{self.cost}={a.total_time:g}")
+                for a in sorted(self.arms, key=lambda a: -a.total_gain)]
@@ -0,0 +1,225 @@
+import itertools, os, queue, sqlite3, subprocess, threading, time
+from dataclasses import dataclass
+
+_SENTINEL_IDS = itertools.count()
+
+@dataclass
+class StatementResult:
+    '''
+    Output of a single statement executed in a SQLiteSession
+    '''
+    query: str
+    stdout: str
+    stderr: str
+    returncode: int # 0 ok, 1 error, -1 timeout, < -1 killed by signal
+    duration: float
+
+@dataclass
+class PendingStatement:
+    '''
+    Statement sent to a SQLiteSession whose output was not read yet
+    '''
+    query: str
+    mark: str # None: statement was sent last, the session ends with it
+    start: float
+    broken: bool = False # the shell was gone when sending
+
+def _reader(stream, lines: queue.Queue):
+    for line in iter(stream.readline, b""):
+        lines.put(line.decode("utf-8", errors="ignore").rstrip("\n"))
+    lines.put(None) # EOF
+
+class SQLiteSession:
+    """
+    Long-lived sqlite3 shell process. Statements are fed through stdin and after each
+    statement two sentinels are sent: `.print <mark>` ends the statement on stdout and
+    the unknown dot-command `.<mark>` ends it on stderr. This avoids one process spawn
+    and one database open per statement.
+
+    The shell only writes its .gcda counters on a normal exit, so callers that need
+    coverage have to close() the session before running gcov. The next execute()
+    starts a new process on the same database.
+    """
+    def __init__(self, binary: str = "./sqlite3", db: str = "test.db", cwd: str = None, env: dict = None):
+        self.binary = binary
+        self.db = db
+        self.cwd = cwd
+        self.env = env
+        self.proc = None
+        self.stdout = None
+        self.stderr = None
+        self.spawns = 0
+
+    def start(self):
+        env = None
+        if self.env:
+            env = os.environ.copy()
+            env.update(self.env)
+        self.proc = subprocess.Popen(
+            [self.binary, self.db],
+            cwd=self.cwd,
+            env=env,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            bufsize=0
+        )
+        self.stdout = queue.Queue()
+        self.stderr = queue.Queue()
+        for stream, lines in [(self.proc.stdout, self.stdout), (self.proc.stderr, self.stderr)]:
+            threading.Thread(target=_reader, args=(stream, lines), daemon=True).start()
+        self.spawns += 1
+
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+    def send(self, query: str) -> PendingStatement:
+        '''
+        Writes one statement (or a group of statements in one string) without waiting for it,
+        so that several sessions can run statements at the same time
+        '''
+        if not self.alive():
+            self.start()
+
+        start = time.time()
+        query = query.strip()
+        if not sqlite3.complete_statement(query):
+            query += ";"
+        if not sqlite3.complete_statement(query):
+            # unterminated string/comment: the shell would swallow the sentinels, so the
+            # statement is sent last and the session ends on EOF like `sqlite3 db "<stmt>"`
+            return self._send(PendingStatement(query, None, start), f"{query}\n")
+
+        mark = f"__ast_sentinel_{os.getpid()}_{next(_SENTINEL_IDS)}__"
+        return self._send(PendingStatement(query, mark, start), f"{query}\n.print {mark}\n.{mark}\n")
+
+    def _send(self, pending: PendingStatement, text: str) -> PendingStatement:
+        try:
+            self.proc.stdin.write(text.encode("utf-8"))
+            self.proc.stdin.flush()
+        except (BrokenPipeError, OSError):
+            pending.broken = True
+        return pending
+
+    def receive(self, pending: PendingStatement, timeout: float = 1) -> StatementResult:
+        '''
+        Waits for the output of a statement sent with send(), timeout counts from send()
+        '''
+        query, mark, start = pending.query, pending.mark, pending.start
+        if mark is None:
+            out, err = self.close(timeout=max(start + timeout - time.time(), 0))
+            return StatementResult(query, out, err, 1 if err else 0, time.time() - start)
+        if pending.broken:
+            return self._crashed(query, start)
+
+        deadline = start + timeout
+        out, out_done = self._collect(self.stdout, lambda line: line == mark, deadline)
+        err, err_done = self._collect(self.stderr, lambda line: mark in line, deadline) if out_done else ([], False)
+
+        if out_done and err_done:
+            stderr = "\n".join(err)
+            return StatementResult(query, "\n".join(out), stderr, 1 if stderr else 0, time.time() - start)
+
+        if self.alive(): # still running the statement
+            self.close(timeout=0)
+            return StatementResult(query, "\n".join(out), "\n".join(err + ["Error: timeout"]), -1, time.time() - start)
+        return self._crashed(query, start, out, err)
+
+    def execute(self, query: str, timeout: float = 1) -> StatementResult:
+        '''
+        Runs one statement (or a group of statements in one string) and returns its output
+        '''
+        return self.receive(self.send(query), timeout)
+
+    def run(self, queries: list[str], timeout: float = 1) -> list[StatementResult]:
+        '''
+        Runs all statements sharing one time budget, stops at the first timeout
+        '''
+        results = []
+        deadline = time.time() + timeout
+        for query in queries:
+            result = self.execute(query, timeout=max(deadline - time.time(), 0.001))
+            results.append(result)
+            if result.returncode == -1:
+                break
+        return results
+
+    def close(self, timeout: float = 5) -> tuple[str, str]:
+        '''
+        Ends the shell with EOF so that it exits normally (flushes gcov counters).
+        Returns any output that was not consumed by a statement.
+        '''
+        if self.proc is None:
+            return "", ""
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+        out = self._drain(self.stdout)
+        err = self._drain(self.stderr)
+        self.proc = None
+        return "\n".join(out), "\n".join(err)
+
+    def _crashed(self, query: str, start: float, out: list[str] = None, err: list[str] = None) -> StatementResult:
+        returncode = self.proc.wait()
+        rest_out, rest_err = self.close(timeout=0)
+        out = (out or []) + ([rest_out] if rest_out else [])
+        err = (err or []) + ([rest_err] if rest_err else [])
+        if returncode == -11:
+            err.append("Error: segmentation fault (core dumped)")
+        elif returncode < 0:
+            err.append(f"Terminated by signal {returncode}")
+        returncode = returncode if returncode < -1 else (1 if err else 0)
+        return StatementResult(query, "\n".join(out), "\n".join(err), returncode, time.time() - start)
+
+    @staticmethod
+    def _collect(lines: queue.Queue, is_mark, deadline: float) -> tuple[list[str], bool]:
+        collected = []
+        while True:
+            try:
+                line = lines.get(timeout=max(deadline - time.time(), 0))
+            except queue.Empty:
+                return collected, False
+            if line is None:
+                lines.put(None) # keep EOF visible for the next reader
+                return collected, False
+            if is_mark(line):
+                return collected, True
+            collected.append(line)
+
+    @staticmethod
+    def _drain(lines: queue.Queue) -> list[str]:
+        drained = []
+        if lines is None:
+            return drained
+        while True:
+            try:
+                line = lines.get(timeout=1)
+            except queue.Empty:
+                return drained
+            if line is None:
+                return drained
+            drained.append(line)
+
+class SessionPool:
+    """
+    Keeps one SQLiteSession per (binary, database, working directory)
+    """
+    def __init__(self, env: dict = None):
+        self.env = env
+        self.sessions: dict[tuple[str, str, str], SQLiteSession] = {}
+
+    def get(self, binary: str, db: str, cwd: str = None) -> SQLiteSession:
+        key = (binary, db, cwd)
+        if key not in self.sessions:
+            self.sessions[key] = SQLiteSession(binary, db, cwd=cwd, env=self.env)
+        return self.sessions[key]
+
+    def close_all(self):
+        for session in self.sessions.values():
+            session.close()
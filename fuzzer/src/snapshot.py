@@ -0,0 +1,55 @@
+import os
+
+DB_SUFFIXES = ["", "-journal", "-wal", "-shm"]
+
+class DBSnapshot:
+    """
+    In-memory copy of a database file (and its journal/WAL files) taken between two
+    sqlite3 sessions. The pages are copied as bytes so the snapshot does not depend on
+    the sqlite version of the python module being able to read the database.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.files: dict[str, bytes] = {} # suffix -> content, missing files are not saved
+        self.saves = 0
+        self.restores = 0
+
+    def save(self):
+        '''
+        Takes the current state of the database, e.g. after an accepted candidate
+        '''
+        self.files = {}
+        for suffix in DB_SUFFIXES:
+            try:
+                with open(self.path + suffix, "rb") as f:
+                    self.files[suffix] = f.read()
+            except FileNotFoundError:
+                pass
+        self.saves += 1
+
+    def restore(self):
+        '''
+        Puts the database back to the last saved state, e.g. after a rejected candidate
+        '''
+        for suffix in DB_SUFFIXES:
+            path = self.path + suffix
+            if suffix in self.files:
+                if self._changed(path, self.files[suffix]):
+                    with open(path, "wb") as f:
+                        f.write(self.files[suffix])
+            elif os.path.exists(path):
+                os.remove(path)
+        self.restores += 1
+
+    @staticmethod
+    def _changed(path: str, content: bytes) -> bool:
+        try:
+            if os.path.getsize(path) != len(content):
+                return True
+            with open(path, "rb") as f:
+                return f.read() != content
+        except FileNotFoundError:
+            return True
+
+    def size(self) -> int:
+        return sum(len(content) for content in self.files.values())
@@ -1,25 +1,214 @@
 import subprocess
 from .helper.helper import get_coverage, sql_cleaner
 from .helper.metric import parse_metric, avg_counter, avg_metric
+from .helper.gcov import GcovReader
+from .session import SessionPool
+from .prefilter import InProcessBackend
+from .differential import DifferentialRunner, version_db
+from .helper.results import read_results, write_text_view
 from pathlib import Path
-from .config import TEST_FOLDER, BUGS_FOLDER, STATS_FOLDER, SQLITE_VERSIONS, DB1, DB2, QUERY_FOLDER
+from .config import TEST_FOLDER, BUGS_FOLDER, STATS_FOLDER, SQLITE_VERSIONS, QUERY_FOLDER, DB, SQLITE_DIR, SQLITE_BIN, GCNO_FILE, GCDA_FILE
 from tqdm import tqdm
-import os, argparse
+import multiprocessing as mp
+import asyncio, os, argparse, shutil, sqlite3, tempfile, time
 
 LOCAL = True
+SESSION = True # run statements through a persistent sqlite3 shell instead of one process each
+NATIVE_GCOV = True # read the .gcda counters directly instead of running gcov
+TEXT_LOGS = True # TEST: also write the per-version .sql logs of the structured results
+BACKEND = "sqlite3" # sqlite3: instrumented binary, python: in-process stand-in (pseudo coverage, no Docker image needed)
+
+POOL = SessionPool()
+GCOV = None # GcovReader, loaded on first use
+PYTHON_BACKEND = InProcessBackend()
+LAST_BITS = None # coverage bitset of the last run_coverage call
+DONE_MARK = "__ast_statement_done__" # printed after each statement by run_coverage_async
+WORKSPACE = None # own test.db and .gcda files of a parallel worker, None: SQLITE_DIR
+WORKSPACE_ENV = None # GCOV_PREFIX settings of the workspace
+
+def work_dir() -> str:
+    if WORKSPACE:
+        return WORKSPACE
+    return SQLITE_DIR if BACKEND == "sqlite3" else os.path.dirname(DB)
+
+def sqlite_bin() -> str:
+    return os.path.join(SQLITE_DIR, SQLITE_BIN)
+
+def work_env() -> dict:
+    return {**os.environ, **WORKSPACE_ENV} if WORKSPACE_ENV else None
+
+def set_workspace(path: str):
+    '''
+    Runs the instrumented binary in path: the database is created there and GCOV_PREFIX
+    redirects the .gcda files (compiled for SQLITE_DIR) into it
+    '''
+    global WORKSPACE, WORKSPACE_ENV, POOL
+    POOL.close_all()
+    path = os.path.abspath(path)
+    os.makedirs(path, exist_ok=True)
+    for name in [GCNO_FILE, "sqlite3.c"]: # for the gcov fallback
+        link = os.path.join(path, name)
+        if not os.path.lexists(link) and os.path.exists(os.path.join(SQLITE_DIR, name)):
+            os.symlink(os.path.join(SQLITE_DIR, name), link)
+    WORKSPACE = path
+    WORKSPACE_ENV = {
+        "GCOV_PREFIX": path,
+        "GCOV_PREFIX_STRIP": str(len(Path(os.path.abspath(SQLITE_DIR)).parts) - 1),
+    }
+    POOL = SessionPool(env=WORKSPACE_ENV)
+
+def coverage_bits():
+    '''
+    Line/branch bitset of the last run_coverage call, None if it timed out or gcov was used
+    '''
+    return LAST_BITS
+
+def binary_version() -> tuple[int, ...]:
+    '''
+    Version of the sqlite3 the coverage is measured on, None if unknown
+    '''
+    if BACKEND == "python":
+        return sqlite3.sqlite_version_info
+    try:
+        result = subprocess.run([sqlite_bin(), "-version"], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=5)
+        return tuple(int(v) for v in result.stdout.split()[0].split("."))
+    except (OSError, IndexError, ValueError, subprocess.TimeoutExpired):
+        return None
+
+def native_gcov() -> GcovReader:
+    '''
+    Parses the .gcno graph once, returns None if it is not available
+    '''
+    global GCOV
+    if GCOV is None:
+        gcno = os.path.join(SQLITE_DIR, GCNO_FILE)
+        if not os.path.exists(gcno):
+            return None
+        GCOV = GcovReader(gcno)
+    return GCOV
 
 def run_coverage(sql_query, db="test.db", timeout=1):
     """
     Local version of coverage_test
     """
-    commands = [f'./sqlite3 {db} "{query}"' for query in sql_query]
+    global LAST_BITS
+    LAST_BITS = None
+    if BACKEND == "python":
+        result = PYTHON_BACKEND.run(os.path.join(work_dir(), db), sql_query, timeout=timeout)
+        if result[:4] != (0, 0, 0, 0):
+            LAST_BITS = PYTHON_BACKEND.bits()
+        return result
+    if not SESSION:
+        return run_coverage_bash(sql_query, db=db, timeout=timeout)
+
+    deadline = time.time() + timeout
+    session = POOL.get(sqlite_bin(), db, cwd=work_dir())
+    results = session.run(sql_query, timeout=timeout)
+    rest_out, rest_err = session.close() # gcov counters are only written when the shell exits
+
+    stderr = [r.stderr for r in results if r.stderr] + [rest_err]
+    stdout = [r.stdout for r in results if r.stdout] + [rest_out]
+    if any(r.returncode == -1 for r in results):
+        return 0, 0, 0, 0, "\n".join(stderr)
+    return read_coverage(stdout, stderr, deadline)
+
+def read_coverage(stdout: list[str], stderr: list[str], deadline: float):
+    """
+    Coverage of the shell that just exited, from the .gcda counters or gcov
+    """
+    global LAST_BITS
+    gcov = native_gcov() if NATIVE_GCOV else None
+    if gcov is not None:
+        gcov.read(os.path.join(work_dir(), GCDA_FILE))
+        LAST_BITS = gcov.bits()
+        return get_coverage("\n".join(stderr) + "\n" + gcov.summary())
+
+    try:
+        result = subprocess.run(
+            ["gcov", "-b", "-o", ".", "sqlite3-sqlite3.c"],
+            cwd=work_dir(),
+            env=work_env(),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=False,
+            check=True,
+            timeout=max(deadline - time.time(), 0.001)
+        )
+        stderr.append(result.stderr.decode('utf-8', errors='ignore'))
+        stdout.append(result.stdout.decode('utf-8', errors='ignore'))
+        return get_coverage("\n".join(stderr) + "\n" + "\n".join(stdout))
+    except subprocess.TimeoutExpired as e:
+        return 0, 0, 0, 0, str(e.stderr)
+    except subprocess.CalledProcessError as e:
+        return 0, 0, 0, 0, str(e.stderr)
+
+async def run_coverage_async(sql_query, db="test.db", timeout=1):
+    """
+    run_coverage with the sqlite3 shell as asyncio subprocess, the caller can generate the
+    next candidates while it runs. Statements share one time budget like in a session and
+    a `.print` mark after each one tells where a crashed shell stopped: like a session it
+    is restarted with the statements after the one that crashed.
+    The python backend runs in process and returns when it is done.
+    """
+    global LAST_BITS
+    if BACKEND == "python" or not SESSION:
+        return run_coverage(sql_query, db=db, timeout=timeout)
+    LAST_BITS = None
+
+    deadline = time.time() + timeout
+    POOL.close_all() # test.db must not be open in a shell of the pool
+    statements = []
+    for query in sql_query:
+        query = query.strip()
+        if not sqlite3.complete_statement(query):
+            query += ";"
+        statements.append(query)
+        if not sqlite3.complete_statement(query): # unterminated string/comment swallows the rest
+            break
+
+    stdout, stderr = [], []
+    while statements:
+        proc = await asyncio.create_subprocess_exec(
+            sqlite_bin(), db,
+            cwd=work_dir(),
+            env=work_env(),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        text = "".join(f"{query}\n.print {DONE_MARK}\n" for query in statements)
+        try:
+            out, err = await asyncio.wait_for(proc.communicate(text.encode("utf-8")), max(deadline - time.time(), 0.001))
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            return 0, 0, 0, 0, "Error: timeout"
+
+        lines = out.decode("utf-8", errors="ignore").split("\n")
+        stdout.append("\n".join(line for line in lines if line != DONE_MARK))
+        stderr.append(err.decode("utf-8", errors="ignore"))
+        if proc.returncode >= 0:
+            break
+        if proc.returncode == -11:
+            stderr.append("Error: segmentation fault (core dumped)")
+        else:
+            stderr.append(f"Terminated by signal {proc.returncode}")
+        statements = statements[lines.count(DONE_MARK) + 1:] # the statement after the last mark crashed
+    return read_coverage(stdout, stderr, deadline)
+
+def run_coverage_bash(sql_query, db="test.db", timeout=1):
+    """
+    One sqlite3 process per statement, followed by gcov
+    """
+    commands = [f'{sqlite_bin()} {db} "{query}"' for query in sql_query]
     commands.append("gcov -b -o . sqlite3-sqlite3.c")
     command_str = " ; ".join(commands)
 
     try:
         result = subprocess.run(
             ["bash", "-c", command_str],
-            cwd="/home/test/sqlite",
+            cwd=work_dir(),
+            env=work_env(),
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             text=False,
@@ -33,6 +222,12 @@ def run_coverage(sql_query, db="test.db", timeout=1):
         return 0, 0, 0, 0, str(e.stderr)
 
 def reset():
+    POOL.close_all() # the shell must not keep the deleted test.db open
+    if BACKEND == "python":
+        PYTHON_BACKEND.reset()
+        if os.path.exists(os.path.join(work_dir(), "test.db")):
+            os.remove(os.path.join(work_dir(), "test.db"))
+        return 0, 0, 0, 0, ""
     reset_cmd = [
         f"rm -f test.db", 
         "find . -name '*.gcda' -delete",  
@@ -43,7 +238,8 @@ def reset():
     try:
         result = subprocess.run(
             ["bash", "-c", command_str],
-            cwd="/home/test/sqlite",
+            cwd=work_dir(),
+            env=work_env(),
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             text=True,
@@ -53,120 +249,111 @@ def reset():
     except subprocess.CalledProcessError as e:
         return 0, 0, 0, 0, str(e.stderr)
     
-def run_query(cmd):
-    try:
-        result = subprocess.run(
-            ["bash", "-c", cmd],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            check=True
-        )
-        return result.stdout.strip(), ""
-    except subprocess.CalledProcessError as e:
-        return "", e.stderr.strip()
-
-def log_output(filepath, query, output):
-    with open(filepath, "a") as f:
-        f.write(query + "\n")
-        if output:
-            for line in output.splitlines():
-                f.write(f"-- {line}\n")
-    
-def run_test(queries, name):
-    reset_db() # resets the database
-
-    file1 = os.path.join(BUGS_FOLDER, f"{name}_{SQLITE_VERSIONS[0]}.sql")
-    file2 = os.path.join(BUGS_FOLDER, f"{name}_{SQLITE_VERSIONS[1]}.sql")
-    file_diff = os.path.join(BUGS_FOLDER, f"{name}_diff.txt")
-
-    bugs = 0
-
-    r1 = 0
-    r2 = 0
-
-    for query in queries:
-        cmd1 = f"/usr/bin/{SQLITE_VERSIONS[0]} {DB1} \"{query}\""
-        cmd2 = f"/usr/bin/{SQLITE_VERSIONS[1]} {DB2} \"{query}\""
-
-        out1, err1 = run_query(cmd1)
-        out2, err2 = run_query(cmd2)
-
-        if err1:
-            r1 += 1
-        if err2:
-            r2 += 1
-
-        log_output(file1, query, err1 or out1)
-        log_output(file2, query, err2 or out2)
-
-        # log different outputs
-        if not err1 and not err2 and out1 != out2:
-            with open(file_diff, "a") as f:
-                f.write(query + "\n")
-                f.write(f"{SQLITE_VERSIONS[0]} Output:\n")
-                for line in out1.splitlines():
-                    f.write(f"-- {line}\n")
-                f.write("\n")
-                f.write(f"{SQLITE_VERSIONS[1]} Output:\n")
-                for line in out2.splitlines():
-                    f.write(f"-- {line}\n")
-            bugs += 1
-
-        if err2 and out1:
-            with open(file_diff, "a") as f:
-                f.write(query + "\n")
-                f.write(f"{SQLITE_VERSIONS[0]} Output:\n")
-                for line in out1.splitlines():
-                    f.write(f"-- {line}\n")
-                f.write("\n")
-                f.write(f"{SQLITE_VERSIONS[1]} Output:\n")
-                for line in err2.splitlines():
-                    f.write(f"-- {line}\n")
-            bugs += 1
-
-        if err1 and out2:
-            with open(file_diff, "a") as f:
-                f.write(query + "\n")
-                f.write(f"{SQLITE_VERSIONS[0]} Output:\n")
-                for line in err1.splitlines():
-                    f.write(f"-- {line}\n")
-                f.write("\n")
-                f.write(f"{SQLITE_VERSIONS[1]} Output:\n")
-                for line in out2.splitlines():
-                    f.write(f"-- {line}\n")
-            bugs += 1
+def run_test(queries, name, dbs=None, folder=BUGS_FOLDER, verbose=True) -> int:
+    """
+    Differential test of one query file, returns the number of differences
+    dbs: one database per version (default data/db/test<i>.db), folder: where the bug files go
+    """
+    reset_db(dbs) # resets the database
+
+    results = os.path.join(folder, f"{name}_results.jsonl")
+    file_diff = os.path.join(folder, f"{name}_diff.txt")
+    if os.path.exists(results):
+        os.remove(results)
+
+    with DifferentialRunner(SQLITE_VERSIONS, dbs=dbs) as runner:
+        runner.open_logs(results, file_diff, name=name)
+        for query in queries:
+            runner.check(query)
+    bugs = runner.bugs
 
     if bugs == 0:
-        for f in [file1, file2]:
-            if os.path.exists(f):
-                os.remove(f)
+        if os.path.exists(results):
+            os.remove(results)
     else:
-        print(f"Bug found in {name}.sql")
-        file = os.path.join(BUGS_FOLDER, f"{name}_clean.sql")
+        if TEXT_LOGS:
+            records = read_results(results)
+            for version in SQLITE_VERSIONS:
+                write_text_view(records, version, os.path.join(folder, f"{name}_{version}.sql"))
+        if verbose:
+            print(f"Bug found in {name}.sql")
+        file = os.path.join(folder, f"{name}_clean.sql")
         with open(file, "w") as f:
             for q in queries:
                 f.write(q + "\n")
+    return bugs
 
-def reset_db():
-    for db in [DB1, DB2]:
+def reset_db(dbs=None):
+    for db in dbs or [version_db(i) for i in range(len(SQLITE_VERSIONS))]:
         if os.path.exists(db):
             os.remove(db)
 
+TEST_WORKER_DIR = None # databases and bug files of a TEST worker process
+
+def _init_test_worker(root: str):
+    global TEST_WORKER_DIR
+    TEST_WORKER_DIR = os.path.join(root, f"worker_{os.getpid()}")
+    os.makedirs(os.path.join(TEST_WORKER_DIR, "bugs"), exist_ok=True)
+
+def _test_file(sql_file: Path) -> tuple[str, int]:
+    with sql_file.open('r', encoding='utf-8') as f:
+        query = sql_cleaner(f.read())
+    dbs = [os.path.join(TEST_WORKER_DIR, f"test{i + 1}.db") for i in range(len(SQLITE_VERSIONS))]
+    bugs = run_test(query, sql_file.stem, dbs=dbs, folder=os.path.join(TEST_WORKER_DIR, "bugs"), verbose=False)
+    return sql_file.stem, bugs
+
+def run_tests_parallel(sql_files: list[Path], workers: int) -> list[tuple[str, int]]:
+    '''
+    Tests the files on a process pool. Every worker has its own databases and bug folder in a
+    temporary directory of this run, the bug files are moved to BUGS_FOLDER at the end.
+    '''
+    root = tempfile.mkdtemp(prefix="test_", dir=os.path.dirname(DB))
+    results = []
+    try:
+        with mp.get_context("fork").Pool(workers, initializer=_init_test_worker, initargs=(root,)) as pool:
+            for name, bugs in tqdm(pool.imap_unordered(_test_file, sql_files), total=len(sql_files), desc=f"Testing for bugs ({workers} workers)"):
+                if bugs:
+                    tqdm.write(f"Bug found in {name}.sql")
+                results.append((name, bugs))
+        for shard in Path(root).glob("worker_*/bugs"):
+            for file in shard.iterdir():
+                os.replace(file, os.path.join(BUGS_FOLDER, file.name))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return results
+
+def write_bug_index(results: list[tuple[str, int]]):
+    '''
+    One line per file with differences: name, number of differences, diff and clean files
+    (the statement outputs are in <name>_results.jsonl)
+    '''
+    found = sorted((name, bugs) for name, bugs in results if bugs)
+    with open(os.path.join(BUGS_FOLDER, "index.txt"), "w") as f:
+        f.write(f"Files: {len(results)}\n")
+        f.write(f"Files with bugs: {len(found)}\n")
+        for name, bugs in found:
+            f.write(f"{name}: {bugs} {name}_diff.txt {name}_clean.sql\n")
+
 def main(args=None):
-    #parser = argparse.ArgumentParser(description="Testing")
+    parser = argparse.ArgumentParser(description="Testing")
+    parser.add_argument("--workers", help="Number of parallel test processes", default=1, type=int)
     #parser.add_argument("type", help="Select testing: BUGS, DATA", nargs="?", default="BUGS")
     
-    #args = parser.parse_args(args)
+    args = parser.parse_args(args)
 
     #if args.type == "BUGS":
     reset()
     sql_folder = Path(QUERY_FOLDER)
     sql_files = list(sql_folder.glob('*.sql'))  
-    for i, sql_file in enumerate(tqdm(sql_files, desc="Testing for bugs")):
-        with sql_file.open('r', encoding='utf-8') as f:
-            query = sql_cleaner(f.read())
-            run_test(query, sql_file.stem)
+    if args.workers > 1:
+        results = run_tests_parallel(sql_files, args.workers)
+    else:
+        results = []
+        for i, sql_file in enumerate(tqdm(sql_files, desc="Testing for bugs")):
+            with sql_file.open('r', encoding='utf-8') as f:
+                query = sql_cleaner(f.read())
+                results.append((sql_file.stem, run_test(query, sql_file.stem)))
+    write_bug_index(results)
 
     '''
     elif args.type == "DATA":
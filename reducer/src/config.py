@@ -4,4 +4,5 @@ DB1 = "./db/test1.db"
 DB2 = "./db/test2.db"
 BUGS_FOLDER = QUERY_TEST_FOLDER + "test2/" #"bugs/"
 INFO_OUTPUT = QUERY_TEST_FOLDER + "info/"
-TEMP_OUTPUT = QUERY_TEST_FOLDER + "temp/"
\ No newline at end of file
+TEMP_OUTPUT = QUERY_TEST_FOLDER + "temp/"
+TEXT_LOGS = True # also write the per-version .sql logs of the structured results
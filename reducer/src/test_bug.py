@@ -1,5 +1,6 @@
-import subprocess, os
-from config import SQLITE_VERSIONS, DB1, DB2, TEMP_OUTPUT, INFO_OUTPUT
+import subprocess, os, time
+from config import SQLITE_VERSIONS, DB1, DB2, TEMP_OUTPUT, TEXT_LOGS, INFO_OUTPUT
+from results import ResultSink, read_results, write_text_view
 from helper import read_info, group_queries, get_queries
 
 def run_query(cmd: str) -> tuple[str, str]:
@@ -19,12 +20,14 @@ def run_query(cmd: str) -> tuple[str, str]:
     except subprocess.CalledProcessError as e:
         return "", e.stderr.strip()
 
-def log_output(filepath: str, query: str, output: str):
-    with open(filepath, "a") as f:
-        f.write(query + "\n")
-        if output:
-            for line in output.splitlines():
-                f.write(f"-- {line}\n")
+def timed_query(cmd: str) -> tuple[str, str, float]:
+    start = time.time()
+    out, err = run_query(cmd)
+    return out, err, time.time() - start
+
+def log_output(sink: ResultSink, name: str, index: int, query: str, version: str, out: str, err: str, duration: float):
+    # the shell exits with 1 on an error, signals are already turned into an error message
+    sink.add(name, index, query, version, out, err, 1 if err else 0, duration)
 
 def run_test(queries: list[str], path: str, oracle: str, full: bool = False) -> tuple[int, list[str], tuple[str, str]]:
     """
@@ -44,102 +47,112 @@ def run_test(queries: list[str], path: str, oracle: str, full: bool = False) ->
     file1 = os.path.join(TEMP_OUTPUT, f"{path}_{SQLITE_VERSIONS[0]}.sql")
     file2 = os.path.join(TEMP_OUTPUT, f"{path}_{SQLITE_VERSIONS[1]}.sql")
     file_diff = os.path.join(TEMP_OUTPUT, f"{path}_diff.txt")
+    results = os.path.join(TEMP_OUTPUT, f"{path}_results.jsonl")
 
-    for f in [file1, file2, file_diff]:
+    for f in [file1, file2, file_diff, results]:
         if os.path.exists(f):
             os.remove(f)
 
-    bugs: int = 0
-    errlist: list[str] = []
-    msg: tuple[str, str] = ("", "")
-    v1 = SQLITE_VERSIONS[0]
-    v2 = SQLITE_VERSIONS[1]
-
-    if full:
-        queries = group_queries(queries) #[" ".join(queries)]
-
-    if oracle == "DIFF":
-        out1 = out2 = err1 = err2 = None
-
-        for i, query in enumerate(queries):       
-            cmd1 = f"/usr/bin/{v1} {DB1} \"{query}\""
-            cmd2 = f"/usr/bin/{v2} {DB2} \"{query}\""
-            out1, err1 = run_query(cmd1)
-            out2, err2 = run_query(cmd2)
-
-            log_output(file1, query, err1 or out1)
-            log_output(file2, query, err2 or out2)
-
-            if not err1 and not err2 and out1 != out2:
-                with open(file_diff, "a") as f:
-                    f.write(query + "\n")
-                    f.write(f"{v1} Output:\n")
-                    for line in out1.splitlines():
-                        f.write(f"-- {line}\n")
-                    f.write("\n")
-                    f.write(f"{v2} Output:\n")
-                    for line in out2.splitlines():
-                        f.write(f"-- {line}\n")
-                bugs += 1
-                msg = (out1, out2)
-                return i, errlist, msg
-            elif (err1 or err2) and "NOT NULL constraint failed" not in err1 and "NOT NULL constraint failed" not in err2:
-                errlist.append(query)
-
-            if err2 and not err1:
-                with open(file_diff, "a") as f:
-                    f.write(query + "\n")
-                    f.write(f"{SQLITE_VERSIONS[0]} Output:\n")
-                    for line in out1.splitlines():
-                        f.write(f"-- {line}\n")
-                    f.write("\n")
-                    f.write(f"{SQLITE_VERSIONS[1]} Output:\n")
-                    for line in err2.splitlines():
-                        f.write(f"-- {line}\n")
-                bugs += 1
-                msg = (out1, err2)
-                return i, errlist, msg
-
-            if err1 and not err2:
-                with open(file_diff, "a") as f:
-                    f.write(query + "\n")
-                    f.write(f"{SQLITE_VERSIONS[0]} Output:\n")
-                    for line in err1.splitlines():
-                        f.write(f"-- {line}\n")
-                    f.write("\n")
-                    f.write(f"{SQLITE_VERSIONS[1]} Output:\n")
-                    for line in out2.splitlines():
-                        f.write(f"-- {line}\n")
-                bugs += 1
-                msg = (err1, out2)
-                return i, errlist, msg
-
-    elif oracle == "CRASH(3.26.0)":
-        for i, query in enumerate(queries):     
-            cmd1 = f"/usr/bin/{v1} {DB1} \"{query}\""
-            out1, err1 = run_query(cmd1)
-            log_output(file1, query, err1 or out1)
-
-            if err1:
-                bugs += 1
-                msg = (err1, "")
-                return i, errlist, msg
-
-    elif oracle == "CRASH(3.39.4)":
-        for i, query in enumerate(queries):  
-            cmd2 = f"/usr/bin/{v2} {DB2} \"{query}\""
-            out2, err2 = run_query(cmd2)
-            log_output(file2, query, err2 or out2)
-
-            if err2:
-                bugs += 1
-                msg = ("", err2)
-                return i, errlist, msg
-
-        else:
-            raise ValueError(f"Unknown oracle: {oracle}")
-
-    return len(queries) - 1, errlist, msg
+    sink = ResultSink(results)
+    try:
+        bugs: int = 0
+        errlist: list[str] = []
+        msg: tuple[str, str] = ("", "")
+        v1 = SQLITE_VERSIONS[0]
+        v2 = SQLITE_VERSIONS[1]
+
+        if full:
+            queries = group_queries(queries) #[" ".join(queries)]
+
+        if oracle == "DIFF":
+            out1 = out2 = err1 = err2 = None
+
+            for i, query in enumerate(queries):       
+                cmd1 = f"/usr/bin/{v1} {DB1} \"{query}\""
+                cmd2 = f"/usr/bin/{v2} {DB2} \"{query}\""
+                out1, err1, t1 = timed_query(cmd1)
+                out2, err2, t2 = timed_query(cmd2)
+
+                log_output(sink, path, i, query, v1, out1, err1, t1)
+                log_output(sink, path, i, query, v2, out2, err2, t2)
+
+                if not err1 and not err2 and out1 != out2:
+                    with open(file_diff, "a") as f:
+                        f.write(query + "\n")
+                        f.write(f"{v1} Output:\n")
+                        for line in out1.splitlines():
+                            f.write(f"-- {line}\n")
+                        f.write("\n")
+                        f.write(f"{v2} Output:\n")
+                        for line in out2.splitlines():
+                            f.write(f"-- {line}\n")
+                    bugs += 1
+                    msg = (out1, out2)
+                    return i, errlist, msg
+                elif (err1 or err2) and "NOT NULL constraint failed" not in err1 and "NOT NULL constraint failed" not in err2:
+                    errlist.append(query)
+
+                if err2 and not err1:
+                    with open(file_diff, "a") as f:
+                        f.write(query + "\n")
+                        f.write(f"{SQLITE_VERSIONS[0]} Output:\n")
+                        for line in out1.splitlines():
+                            f.write(f"-- {line}\n")
+                        f.write("\n")
+                        f.write(f"{SQLITE_VERSIONS[1]} Output:\n")
+                        for line in err2.splitlines():
+                            f.write(f"-- {line}\n")
+                    bugs += 1
+                    msg = (out1, err2)
+                    return i, errlist, msg
+
+                if err1 and not err2:
+                    with open(file_diff, "a") as f:
+                        f.write(query + "\n")
+                        f.write(f"{SQLITE_VERSIONS[0]} Output:\n")
+                        for line in err1.splitlines():
+                            f.write(f"-- {line}\n")
+                        f.write("\n")
+                        f.write(f"{SQLITE_VERSIONS[1]} Output:\n")
+                        for line in out2.splitlines():
+                            f.write(f"-- {line}\n")
+                    bugs += 1
+                    msg = (err1, out2)
+                    return i, errlist, msg
+
+        elif oracle == "CRASH(3.26.0)":
+            for i, query in enumerate(queries):     
+                cmd1 = f"/usr/bin/{v1} {DB1} \"{query}\""
+                out1, err1, t1 = timed_query(cmd1)
+                log_output(sink, path, i, query, v1, out1, err1, t1)
+
+                if err1:
+                    bugs += 1
+                    msg = (err1, "")
+                    return i, errlist, msg
+
+        elif oracle == "CRASH(3.39.4)":
+            for i, query in enumerate(queries):  
+                cmd2 = f"/usr/bin/{v2} {DB2} \"{query}\""
+                out2, err2, t2 = timed_query(cmd2)
+                log_output(sink, path, i, query, v2, out2, err2, t2)
+
+                if err2:
+                    bugs += 1
+                    msg = ("", err2)
+                    return i, errlist, msg
+
+            else:
+                raise ValueError(f"Unknown oracle: {oracle}")
+
+        return len(queries) - 1, errlist, msg
+    finally:
+        sink.close()
+        if TEXT_LOGS:
+            records = read_results(results)
+            for version, file in zip(SQLITE_VERSIONS, [file1, file2]):
+                if any(r.version == version for r in records): # the CRASH oracles run one version
+                    write_text_view(records, version, file)
 
 def reset_db():
     for db in [DB1, DB2]: